@@ -2,10 +2,110 @@
 Backend
 """
 
-from flask import Flask, render_template, send_from_directory
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from flask import (
+    Flask,
+    Response,
+    abort,
+    jsonify,
+    render_template,
+    request,
+    send_file,
+    send_from_directory,
+    url_for,
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "utils"))
+
+from client_utils import get_client, load_clients  # noqa: E402
+from db_utils import ALL_ZONES, get_metric_store, shift_date, utc_today  # noqa: E402
+from event_utils import get_event_broker  # noqa: E402
+from general_utils import range_generator  # noqa: E402
+from job_utils import get_job_queue  # noqa: E402
+from report_utils import find_report  # noqa: E402
 
 app = Flask(__name__)
 
+# Client key of the dashboard aggregates over every client
+ALL_CLIENTS = "todos"
+DASHBOARD_DAYS = 7
+HOURLY_HOURS = 48
+
+
+def _error(status: int, message: str):
+    return jsonify({"error": message}), status
+
+
+def _send_artifact(path: str, download_name: str):
+    # Artifacts are named after their key, which changes with their content
+    return send_file(
+        os.path.abspath(path),
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=os.path.splitext(os.path.basename(path))[0],
+        max_age=0,
+    )
+
+
+def _metrics_scope(client_key: str):
+    # Zone and window of a dashboard request, or the error response
+    if client_key == ALL_CLIENTS:
+        zone_tag = ALL_ZONES
+    else:
+        client = load_clients().get(client_key)
+        if client is None:
+            return None, _error(404, f"Unknown client: '{client_key}'.")
+        zone_tag = client.get("zone_tag")
+        if not zone_tag:
+            return None, _error(409, f"Client '{client_key}' has no zone configured.")
+    try:
+        days = int(request.args.get("days", DASHBOARD_DAYS))
+    except ValueError:
+        return None, _error(400, "days must be an integer.")
+    if days < 1:
+        return None, _error(400, "days must be at least 1.")
+    until = request.args.get("until") or utc_today()
+    try:
+        since = shift_date(until, 1 - days)
+    except ValueError:
+        return None, _error(400, f"Invalid until: '{until}'. Use 'YYYY-MM-DD'.")
+    return (zone_tag, since, until), None
+
+
+def _report_window(params, client: dict):
+    # leq_date and periods of a report request, or the error response
+    periods = params.get("periods")
+    try:
+        periods = client["periods"] if periods is None else int(periods)
+    except (TypeError, ValueError):
+        return None, _error(400, "periods must be an integer.")
+    if periods < 1:
+        return None, _error(400, "periods must be at least 1.")
+    leq_date = params.get("leq_date")
+    if leq_date is None:
+        leq_date = utc_today()
+    elif not isinstance(leq_date, str):
+        return None, _error(400, "leq_date must be a 'YYYY-MM-DD' string.")
+    try:
+        range_generator(leq_date, periods)
+    except ValueError as e:
+        return None, _error(400, str(e))
+    return (leq_date, periods), None
+
+
+def _job_response(job: dict) -> dict:
+    job = dict(job)
+    job.pop("result_path", None)
+    job["status_url"] = url_for("report_status", job_id=job["id"])
+    if job["status"] == "done":
+        job["download_url"] = url_for("report_download", job_id=job["id"])
+    return job
+
 
 @app.route("/")
 def homeTEST():
@@ -33,8 +133,221 @@ def user():
 
 @app.route("/download/report")
 def download_report():
-    return send_from_directory(
-        directory="assets", path="report.pdf", as_attachment=True
+    """
+    Report of ?client= for ?leq_date= and ?periods=, served from the artifact
+    cache. When its data changed the report is queued instead and the answer is
+    202 with the job, see /reports/<id>. Without client, the sample report.
+    """
+    client_key = request.args.get("client")
+    if not client_key:
+        return send_from_directory(
+            directory="assets", path="report.pdf", as_attachment=True
+        )
+    try:
+        client = get_client(client_key)
+    except KeyError as e:
+        return _error(404, str(e.args[0]))
+    if not client.get("zone_tag"):
+        return _error(409, f"Client '{client_key}' has no zone configured.")
+    window, error = _report_window(request.args, client)
+    if error:
+        return error
+    leq_date, periods = window
+    try:
+        _, path = find_report(
+            client["name"],
+            client["logo"],
+            client["zone_tag"],
+            leq_date,
+            periods,
+            layout=client.get("layout"),
+        )
+    except ValueError as e:
+        return _error(400, str(e))
+    if path is None:
+        queue = get_job_queue()
+        job_id = queue.enqueue(client_key, client["zone_tag"], leq_date, periods)
+        return jsonify(_job_response(queue.get(job_id))), 202
+    return _send_artifact(path, f"{client_key}_report_{leq_date}.pdf")
+
+
+@app.route("/api/clients")
+def api_clients():
+    """
+    Registered clients for the dashboard selector
+    """
+    return jsonify(
+        [{"key": key, "name": client["name"]} for key, client in load_clients().items()]
+    )
+
+
+@app.route("/api/metrics/<client_key>/totals")
+def api_metric_totals(client_key: str):
+    """
+    Totals of a client, or of every client with "todos", over the last ?days=
+    Read from the local store only, never from the Cloudflare API
+    """
+    scope, error = _metrics_scope(client_key)
+    if error:
+        return error
+    zone_tag, since, until = scope
+    reports = get_job_queue().count(None if client_key == ALL_CLIENTS else client_key)
+    return jsonify(
+        {
+            "client": client_key,
+            "since": since,
+            "until": until,
+            "totals": get_metric_store().totals(zone_tag, since, until),
+            "reports": reports,
+        }
+    )
+
+
+@app.route("/api/metrics/<client_key>/series/<metric>")
+def api_metric_series(client_key: str, metric: str):
+    """
+    Daily or weekly (?period=week) series of a metric over the last ?days=
+    """
+    scope, error = _metrics_scope(client_key)
+    if error:
+        return error
+    zone_tag, since, until = scope
+    period = request.args.get("period", "day")
+    try:
+        series = get_metric_store().rollup(zone_tag, metric, since, until, period)
+    except ValueError as e:
+        return _error(400, str(e))
+    return jsonify(
+        {
+            "client": client_key,
+            "metric": metric,
+            "period": period,
+            "since": since,
+            "until": until,
+            "series": series,
+        }
+    )
+
+
+@app.route("/api/metrics/<client_key>/hourly/<metric>")
+def api_metric_hourly(client_key: str, metric: str):
+    """
+    Hourly series of a metric over the last ?hours=, filled by the hourly collector
+    """
+    if client_key == ALL_CLIENTS:
+        return _error(400, "Hourly series are only available per client.")
+    scope, error = _metrics_scope(client_key)
+    if error:
+        return error
+    zone_tag = scope[0]
+    try:
+        hours = int(request.args.get("hours", HOURLY_HOURS))
+    except ValueError:
+        return _error(400, "hours must be an integer.")
+    now = datetime.now(timezone.utc)
+    since = (now - timedelta(hours=hours)).strftime("%Y-%m-%dT%H:00:00Z")
+    until = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return jsonify(
+        {
+            "client": client_key,
+            "metric": metric,
+            "since": since,
+            "until": until,
+            "series": get_metric_store().hourly_series(zone_tag, metric, since, until),
+        }
+    )
+
+
+@app.route("/api/events")
+def api_events():
+    """
+    Server-sent events with the metric changes of every ingest, for the zones of
+    ?client= (repeatable, "todos" or none for every client). Reconnections
+    resume after the Last-Event-ID header.
+    """
+    client_keys = request.args.getlist("client")
+    zone_tags = None
+    if client_keys and ALL_CLIENTS not in client_keys:
+        clients = load_clients()
+        unknown = [key for key in client_keys if key not in clients]
+        if unknown:
+            return _error(404, f"Unknown client: '{unknown[0]}'.")
+        zone_tags = [clients[key]["zone_tag"] for key in client_keys]
+    last_event_id = request.headers.get("Last-Event-ID")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return _error(400, "Last-Event-ID must be an integer.")
+    return Response(
+        get_event_broker().stream(zone_tags, last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/reports", methods=["POST"])
+def report_enqueue():
+    """
+    Queue a report, body: client and optionally leq_date (YYYY-MM-DD) and periods
+    """
+    params = request.get_json(silent=True) or request.form
+    clients = load_clients()
+    client_key = params.get("client")
+    if client_key not in clients:
+        return _error(404, f"Unknown client: '{client_key}'.")
+    client = clients[client_key]
+    zone_tag = client.get("zone_tag")
+    if not zone_tag:
+        return _error(409, f"Client '{client_key}' has no zone configured.")
+    window, error = _report_window(params, client)
+    if error:
+        return error
+    leq_date, periods = window
+    job_id = get_job_queue().enqueue(client_key, zone_tag, leq_date, periods)
+    return jsonify(_job_response(get_job_queue().get(job_id))), 202
+
+
+@app.route("/reports")
+def report_list():
+    """
+    Most recent report jobs, optionally filtered by ?client=
+    """
+    jobs = get_job_queue().list_jobs(request.args.get("client"))
+    return jsonify([_job_response(job) for job in jobs])
+
+
+@app.route("/reports/<job_id>")
+def report_status(job_id: str):
+    """
+    Status of a report job
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return _error(404, f"Unknown report job: '{job_id}'.")
+    return jsonify(_job_response(job))
+
+
+@app.route("/reports/<job_id>/download")
+def report_download(job_id: str):
+    """
+    PDF of a finished report job. When the artifact store already evicted it,
+    the report is queued again and the answer is 410 with the new job.
+    """
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None:
+        abort(404)
+    if job["status"] != "done":
+        return _error(409, f"Report is {job['status']}.")
+    if not job["result_path"] or not os.path.exists(job["result_path"]):
+        new_id = queue.enqueue(
+            job["client"], job["zone_tag"], job["leq_date"], job["periods"]
+        )
+        response = _job_response(queue.get(new_id))
+        response["error"] = "Report expired from the cache, it is being rebuilt."
+        return jsonify(response), 410
+    return _send_artifact(
+        job["result_path"], f"{job['client']}_report_{job['leq_date']}.pdf"
     )
 
 
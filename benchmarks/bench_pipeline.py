@@ -0,0 +1,264 @@
+"""
+V1 benchmark of the report pipeline (query, parse, charts, PDF) against the recorded fixtures
+
+    python benchmarks/bench_pipeline.py --zones 1 10 100 --days 7 30
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/<previous>.json
+"""
+
+__version__ = "1.1.0"
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "utils"))
+
+ZONES = (1, 10, 100)
+DAYS = (7, 30)
+# Closed dates, so Cloudflare would never return different data for them
+LEQ_DATE = "2025-02-28"
+# Reports (charts and PDF) built per case, they cost the same for every zone
+REPORTS = 3
+REPEAT = 3
+# A stage is flagged by --compare when it gets slower than this ratio
+THRESHOLD = 1.2
+LOGO = "assets/ACME_logo.png"
+
+
+def _setup(latency: float) -> object:
+    # The utils read their settings at import time, so the stand-in goes first
+    import stand_in
+
+    _, replay, url = stand_in.start(latency=latency)
+    workdir = tempfile.mkdtemp(prefix="cf-bench-")
+    os.environ["CF_API_URL"] = url
+    os.environ.setdefault("CF_API_TOKEN", "benchmark")
+    os.environ["CF_METRICS_DB"] = os.path.join(workdir, "metrics.db")
+    os.environ["CF_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["CF_ARTIFACTS_DIR"] = os.path.join(workdir, "artifacts")
+    return replay
+
+
+def run_case(zones: int, days: int, reports: int, replay) -> dict:
+    """
+    Time every stage of the pipeline once.
+    Args:
+        zones (int): Synthetic zones to fetch.
+        days (int): Days in the window.
+        reports (int): Zones whose charts and PDF are built.
+        replay (Replay): The stand-in, to count the queries.
+    Returns:
+        dict: Stage names as keys and seconds as values, plus "queries".
+    """
+    import cloudflare_utils
+    from cloudflare_utils import (
+        ZONE_SNAPSHOT_QUERY,
+        build_zone_snapshots,
+        plan_snapshot_queries,
+    )
+    from config_utils import get_cloudflare_client
+    from image_utils import render_job
+    from metrics_utils import derive_metrics
+    from pdf_utils import create_pdf_report
+    from report_utils import chart_jobs
+    from vector_utils import VECTOR_FUNCTIONS, vector_chart
+
+    client = get_cloudflare_client()
+    zone_tags = [f"bench{i:04d}" for i in range(zones)]
+    timings = defaultdict(float)
+    queries = replay.queries
+
+    start = time.perf_counter()
+    plan = plan_snapshot_queries(zone_tags, LEQ_DATE, days)
+    responses = [
+        client.query(ZONE_SNAPSHOT_QUERY, variables, use_cache=False)
+        for variables in plan
+    ]
+    timings["query"] = time.perf_counter() - start
+
+    cloudflare_utils._snapshot_memo.clear()
+    start = time.perf_counter()
+    snapshots = build_zone_snapshots(zone_tags, LEQ_DATE, days, plan, responses)
+    timings["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for snapshot in snapshots.values():
+        snapshot.frame
+    timings["frame"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    derive_metrics(snapshots)
+    timings["derive"] = time.perf_counter() - start
+
+    for zone_tag in zone_tags[:reports]:
+        start = time.perf_counter()
+        jobs = chart_jobs(snapshots[zone_tag])
+        timings["chart_plan"] += time.perf_counter() - start
+        charts = {}
+        for job in jobs:
+            start = time.perf_counter()
+            # As in render_report_charts, line and bar charts are drawn by the PDF stage
+            if job.kind in VECTOR_FUNCTIONS:
+                charts[job.output_path] = vector_chart(job)
+            else:
+                charts[job.output_path] = render_job(job, to_buffer=True)
+            timings[f"chart_{job.kind}"] += time.perf_counter() - start
+        start = time.perf_counter()
+        create_pdf_report(zone_tag, LOGO, charts)
+        timings["pdf"] += time.perf_counter() - start
+
+    timings["total"] = sum(timings.values())
+    timings["queries"] = replay.queries - queries
+    return dict(timings)
+
+
+def summarize(runs: list) -> dict:
+    """
+    Min, median and every run of each stage.
+    Args:
+        runs (list): run_case results.
+    Returns:
+        dict: Stage names as keys and {"min", "median", "runs"} as values.
+    """
+    stages = {}
+    for stage in runs[0]:
+        if stage == "queries":
+            continue
+        values = [run[stage] for run in runs]
+        stages[stage] = {
+            "min": min(values),
+            "median": statistics.median(values),
+            "runs": values,
+        }
+    return stages
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, threshold: float = THRESHOLD) -> list:
+    """
+    Stages of the current results slower than the baseline ones, by median.
+    Args:
+        current (dict): Results of this run.
+        baseline (dict): Results of a previous run.
+        threshold (float): Ratio over which a stage counts as a regression.
+    Returns:
+        list: (case, stage, baseline median, current median, ratio) tuples.
+    """
+    previous = {case["case"]: case["stages"] for case in baseline["cases"]}
+    regressions = []
+    for case in current["cases"]:
+        for stage, timing in case["stages"].items():
+            before = previous.get(case["case"], {}).get(stage)
+            if not before or not before["median"]:
+                continue
+            ratio = timing["median"] / before["median"]
+            print(
+                f"{case['case']:>14} {stage:<12} {before['median']:9.4f}s -> "
+                f"{timing['median']:9.4f}s  x{ratio:.2f}"
+            )
+            if ratio > threshold:
+                regressions.append(
+                    (case["case"], stage, before["median"], timing["median"], ratio)
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--zones", type=int, nargs="+", default=list(ZONES))
+    parser.add_argument("--days", type=int, nargs="+", default=list(DAYS))
+    parser.add_argument("--reports", type=int, default=REPORTS)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--output", help="Results file, benchmarks/results/ by default")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    # The PDF builder reads the header logos relative to the repository root
+    os.chdir(ROOT_DIR)
+    replay = _setup(args.latency)
+    started = datetime.now(timezone.utc)
+    # Warm-up: imports, fonts and the world geometry are loaded once per process
+    run_case(1, min(args.days), 1, replay)
+
+    cases = []
+    for zones in args.zones:
+        for days in args.days:
+            runs = [
+                run_case(zones, days, args.reports, replay) for _ in range(args.repeat)
+            ]
+            case = {
+                "case": f"{zones}z/{days}d",
+                "zones": zones,
+                "days": days,
+                "reports": min(zones, args.reports),
+                "queries": runs[0]["queries"],
+                "stages": summarize(runs),
+            }
+            cases.append(case)
+            print(
+                f"{case['case']:>14}  queries {case['queries']:4d}  "
+                + "  ".join(
+                    f"{stage} {timing['median']:.4f}s"
+                    for stage, timing in case["stages"].items()
+                )
+            )
+
+    results = {
+        "meta": {
+            "started": started.isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "latency": args.latency,
+            "leq_date": LEQ_DATE,
+        },
+        "cases": cases,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"pipeline-{started.strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for case, stage, before, after, ratio in regressions:
+            print(
+                f"Regression {case} {stage}: {before:.4f}s -> {after:.4f}s (x{ratio:.2f})"
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+V1 benchmark of the import time of the app and the utils, each one in a fresh interpreter
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --compare benchmarks/results/<previous>.json
+"""
+
+__version__ = "1.1.0"
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+sys.path.insert(0, BENCH_DIR)
+
+from bench_pipeline import THRESHOLD, _git_commit, compare  # noqa: E402
+
+MODULES = (
+    "general_utils",
+    "db_utils",
+    "cloudflare_utils",
+    "metrics_utils",
+    "image_utils",
+    "pdf_utils",
+    "report_utils",
+    "job_utils",
+    "collector_utils",
+    "async_utils",
+    "app",
+)
+# Libraries that should only load when a chart or a PDF is drawn, or the
+# collectors run
+HEAVY_MODULES = (
+    "matplotlib",
+    "geopandas",
+    "pyproj",
+    "shapely",
+    "pyogrio",
+    "fpdf",
+    "aiohttp",
+)
+REPEAT = 5
+
+PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "heavy": sorted(name for name in {heavy!r} if name in sys.modules),
+    "files": sorted(os.listdir(".")),
+}}))
+"""
+
+
+def probe(module: str) -> dict:
+    """
+    Import a module in a new interpreter, without the token or any .env, from an
+    empty directory so files written at import time show up.
+    Args:
+        module (str): Module name, e.g. "cloudflare_utils".
+    Returns:
+        dict: "seconds" the import took, the "heavy" modules it loaded and the
+        "files" it created, or "error" with the traceback if it failed.
+    """
+    workdir = tempfile.mkdtemp(prefix="cf-startup-")
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith("CF_") and key != "PYTHONPATH"
+    }
+    env["PYTHONPATH"] = os.pathsep.join([ROOT_DIR, os.path.join(ROOT_DIR, "utils")])
+    env["CF_METRICS_DB"] = os.path.join(workdir, "data", "metrics.db")
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=workdir,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        return {"error": result.stderr.strip().splitlines()[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", nargs="+", default=list(MODULES))
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help="Results file, benchmarks/results/ by default")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    started = datetime.now(timezone.utc)
+    cases = []
+    for module in args.modules:
+        probes = [probe(module) for _ in range(args.repeat)]
+        errors = [run["error"] for run in probes if "error" in run]
+        if errors:
+            print(f"{module:>18}  import failed: {errors[0]}")
+            cases.append({"case": module, "error": errors[0], "stages": {}})
+            continue
+        values = [run["seconds"] for run in probes]
+        case = {
+            "case": module,
+            "heavy": probes[0]["heavy"],
+            "files": probes[0]["files"],
+            "stages": {
+                "import": {
+                    "min": min(values),
+                    "median": statistics.median(values),
+                    "runs": values,
+                }
+            },
+        }
+        cases.append(case)
+        print(
+            f"{module:>18}  {case['stages']['import']['median']:.4f}s"
+            f"  heavy: {', '.join(case['heavy']) or '-'}"
+            f"  files: {', '.join(case['files']) or '-'}"
+        )
+
+    results = {
+        "meta": {
+            "started": started.isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "cases": cases,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"startup-{started.strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    failed = any("error" in case for case in cases)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for case, stage, before, after, ratio in regressions:
+            print(
+                f"Regression {case} {stage}: {before:.4f}s -> {after:.4f}s (x{ratio:.2f})"
+            )
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+V1 records a GetZoneSnapshots response of a live zone as a benchmark fixture
+"""
+
+__version__ = "1.0.0"
+import argparse
+import json
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "utils"))
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+
+
+def record(zone_tag: str, leq_date: str, periods: int, output_path: str) -> int:
+    """
+    Fetch a zone window from the live API (CF_API_TOKEN) and save the raw response,
+    with the zone tag replaced so the fixture can be committed.
+    Args:
+        zone_tag (str): Unique identifier for the Cloudflare zone.
+        leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+        periods (int): Number of days before the end date to include in the range.
+        output_path (str): Where the fixture is written.
+    Returns:
+        int: Number of recorded days.
+    """
+    from cloudflare_utils import ZONE_SNAPSHOT_QUERY, plan_snapshot_queries
+    from config_utils import get_cloudflare_client
+
+    client = get_cloudflare_client()
+    groups = []
+    for variables in plan_snapshot_queries([zone_tag], leq_date, periods):
+        response = client.query(ZONE_SNAPSHOT_QUERY, variables, use_cache=False)
+        for zone in response["data"]["viewer"]["zones"] or []:
+            groups.extend(zone.get("httpRequests1dGroups") or [])
+    fixture = {
+        "data": {
+            "viewer": {
+                "zones": [{"zoneTag": "recorded", "httpRequests1dGroups": groups}]
+            }
+        },
+        "errors": None,
+    }
+    with open(output_path, "w") as f:
+        json.dump(fixture, f, indent=1)
+    return len(groups)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("zone_tag")
+    parser.add_argument("leq_date")
+    parser.add_argument("--periods", type=int, default=7)
+    parser.add_argument(
+        "--output", default=os.path.join(FIXTURES_DIR, "zone_snapshot.json")
+    )
+    args = parser.parse_args()
+    days = record(args.zone_tag, args.leq_date, args.periods, args.output)
+    print(f"Recorded {days} days into {args.output}")
@@ -0,0 +1,167 @@
+"""
+V1 local stand-in for the Cloudflare GraphQL API, replays the recorded fixtures
+"""
+
+__version__ = "1.0.0"
+import argparse
+import copy
+import glob
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# Fields of the *Map entries that hold counts, the rest are keys
+MAP_VALUE_FIELDS = ("requests", "bytes")
+
+
+def load_groups(fixtures_dir: str = FIXTURES_DIR) -> list:
+    """
+    Every httpRequests1dGroups row of the recorded responses.
+    Args:
+        fixtures_dir (str): Directory with the recorded JSON responses.
+    Returns:
+        list: The recorded groups.
+    Raises:
+        FileNotFoundError: If the directory has no recorded groups.
+    """
+    groups = []
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.json"))):
+        with open(path) as f:
+            response = json.load(f)
+        for zone in response["data"]["viewer"]["zones"] or []:
+            groups.extend(zone.get("httpRequests1dGroups") or [])
+    if not groups:
+        raise FileNotFoundError(f"No recorded groups in {fixtures_dir}.")
+    return groups
+
+
+def _scale(group: dict, factor: int) -> dict:
+    sums = group["sum"]
+    for name, value in sums.items():
+        if isinstance(value, int):
+            sums[name] = value * factor
+        elif isinstance(value, list):
+            for entry in value:
+                for field in MAP_VALUE_FIELDS:
+                    if field in entry:
+                        entry[field] *= factor
+    group["uniq"]["uniques"] *= factor
+    return group
+
+
+class Replay:
+    """
+    Synthetic zones built from the recorded groups: the group of a zone and day
+    is picked by a hash of both and scaled by a per zone factor, so any number
+    of zones and days can be served and every run gets the same bytes.
+    """
+
+    def __init__(self, groups: list, latency: float = 0.0):
+        self.groups = groups
+        self.latency = latency
+        self.queries = 0
+        self.lock = threading.Lock()
+
+    def group(self, zone_tag: str, day: str) -> dict:
+        index = zlib.crc32(f"{zone_tag}/{day}".encode()) % len(self.groups)
+        group = copy.deepcopy(self.groups[index])
+        group["dimensions"]["date"] = day
+        return _scale(group, 1 + zlib.crc32(zone_tag.encode()) % 4)
+
+    def answer(self, variables: dict) -> dict:
+        """
+        Response of a GetZoneSnapshots query.
+        Args:
+            variables (dict): Query variables, zoneTags, since and until.
+        Returns:
+            dict: The decoded GraphQL response.
+        """
+        with self.lock:
+            self.queries += 1
+        since = date.fromisoformat(variables["since"])
+        until = date.fromisoformat(variables["until"])
+        days = [
+            (since + timedelta(days=i)).isoformat()
+            for i in range((until - since).days + 1)
+        ]
+        return {
+            "data": {
+                "viewer": {
+                    "zones": [
+                        {
+                            "zoneTag": zone_tag,
+                            "httpRequests1dGroups": [
+                                self.group(zone_tag, day) for day in days
+                            ],
+                        }
+                        for zone_tag in variables["zoneTags"]
+                    ]
+                }
+            },
+            "errors": None,
+        }
+
+
+def _handler(replay: Replay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if replay.latency:
+                time.sleep(replay.latency)
+            try:
+                body = replay.answer(payload["variables"])
+                status = 200
+            except (KeyError, ValueError) as e:
+                body = {"data": None, "errors": [{"message": f"Bad query: {e}"}]}
+                status = 400
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def start(
+    fixtures_dir: str = FIXTURES_DIR, latency: float = 0.0, port: int = 0
+) -> tuple:
+    """
+    Serve the replay in a background thread.
+    Args:
+        fixtures_dir (str): Directory with the recorded JSON responses.
+        latency (float): Seconds added to every response, to emulate the network.
+        port (int): Port to listen on, a free one if 0.
+    Returns:
+        tuple: The server, its Replay (queries counts the answered queries) and
+        the API URL to put in CF_API_URL.
+    """
+    replay = Replay(load_groups(fixtures_dir), latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(replay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, replay, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    args = parser.parse_args()
+    server, _, url = start(args.fixtures, args.latency, args.port)
+    print(f"Replaying {args.fixtures} on {url}, set CF_API_URL={url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
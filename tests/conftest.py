@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "utils")]
+
+# Fixtures of the manual scripts, not tests
+collect_ignore = ["test.py", "test_data.py"]
+
+
+@pytest.fixture
+def environ(monkeypatch):
+    """
+    Private copy of the environment, with the .env file not read yet.
+    """
+    import config_utils
+
+    monkeypatch.setattr(os, "environ", dict(os.environ))
+    monkeypatch.setattr(config_utils, "_settings_loaded", False)
+    return os.environ
@@ -0,0 +1,69 @@
+import adaptive_utils
+from config_utils import CloudflareClient
+
+EVENTS = [
+    {"action": "block", "clientCountryName": "MX", "clientIP": f"10.0.0.{i}"}
+    for i in range(50)
+] + [{"action": "log", "clientCountryName": "US", "clientIP": "10.0.1.1"}]
+
+
+class FakeClient(CloudflareClient):
+    """
+    Groups EVENTS by the dimensions of the query, at most "limit" rows.
+    """
+
+    def query(self, query, variables, timeout=None, use_cache=True):
+        block = query.split("dimensions {")[1].split("}")[0]
+        dimensions = block.split()
+        self.calls.append(tuple(dimensions))
+        groups = {}
+        for event in EVENTS:
+            key = tuple(event[dimension] for dimension in dimensions)
+            groups[key] = groups.get(key, 0) + 1
+        rows = [
+            {"count": count, "dimensions": dict(zip(dimensions, key))}
+            for key, count in groups.items()
+        ]
+        node = {"firewallEventsAdaptiveGroups": rows[: variables["limit"]]}
+        return {"data": {"viewer": {"zones": [node]}}}
+
+
+def _client() -> FakeClient:
+    client = FakeClient("token")
+    object.__setattr__(client, "calls", [])
+    return client
+
+
+def test_default_dimensions_are_queried_one_by_one(monkeypatch):
+    client = _client()
+    monkeypatch.setattr(adaptive_utils, "get_cloudflare_client", lambda: client)
+    monkeypatch.setitem(
+        adaptive_utils.DATASETS,
+        "firewall",
+        ("firewallEventsAdaptiveGroups", ("action", "clientCountryName", "clientIP")),
+    )
+
+    top = adaptive_utils.top_adaptive(
+        "z", "2025-03-01T00:00:00Z", "2025-03-02T00:00:00Z", n=3
+    )
+
+    assert client.calls == [("action",), ("clientCountryName",), ("clientIP",)]
+    assert top["total"] == len(EVENTS)
+    assert top["action"] == {"block": 50, "log": 1}
+    assert top["clientCountryName"] == {"MX": 50, "US": 1}
+    assert len(top["clientIP"]) == 3
+
+
+def test_explicit_dimensions_share_one_query(monkeypatch):
+    client = _client()
+    monkeypatch.setattr(adaptive_utils, "get_cloudflare_client", lambda: client)
+
+    top = adaptive_utils.top_adaptive(
+        "z",
+        "2025-03-01T00:00:00Z",
+        "2025-03-02T00:00:00Z",
+        dimensions=("action", "clientCountryName"),
+    )
+
+    assert client.calls == [("action", "clientCountryName")]
+    assert top["action"] == {"block": 50, "log": 1}
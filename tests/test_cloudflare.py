@@ -0,0 +1,40 @@
+from cloudflare_utils import plan_snapshot_queries, plan_window_queries
+from db_utils import MetricStore, date_range
+
+
+def _planned_days(plan: list) -> list:
+    return sorted(
+        (zone_tag, date)
+        for variables in plan
+        for zone_tag in variables["zoneTags"]
+        for date in date_range(variables["since"], variables["until"])
+    )
+
+
+def test_overlapping_windows_plan_each_day_once():
+    store = MetricStore(":memory:")
+    plan = plan_window_queries(
+        ["a", "b"], [("2025-02-28", 7), ("2025-02-28", 30)], store
+    )
+
+    days = _planned_days(plan)
+    assert len(days) == len(set(days)) == 2 * 30
+    assert days == _planned_days(plan_snapshot_queries(["a", "b"], "2025-02-28", 30))
+
+
+def test_disjoint_windows_skip_the_gap():
+    plan = plan_window_queries(["a"], [("2025-02-10", 3), ("2025-02-28", 2)])
+
+    assert [(v["since"], v["until"]) for v in plan] == [
+        ("2025-02-08", "2025-02-10"),
+        ("2025-02-27", "2025-02-28"),
+    ]
+
+
+def test_collected_days_are_not_planned():
+    store = MetricStore(":memory:")
+    store.upsert_days("a", {}, date_range("2025-02-01", "2025-02-20"), "2025-03-01")
+
+    plan = plan_window_queries(["a"], [("2025-02-20", 7), ("2025-02-28", 14)], store)
+
+    assert [(v["since"], v["until"]) for v in plan] == [("2025-02-21", "2025-02-28")]
@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta
+
+import collector_utils
+import db_utils
+import pytest
+from cloudflare_utils import ZONE_UNIQUES_QUERY
+from config_utils import CloudflareClient, set_cloudflare_client
+from db_utils import MetricStore, date_range, final_before
+
+HOURLY_REQUESTS = 10
+HOURLY_UNIQUES = 40
+DAILY_UNIQUES = 999
+
+
+def _sum(requests: int) -> dict:
+    return {
+        "requests": requests,
+        "bytes": 5 * requests,
+        "cachedRequests": requests // 2,
+        "cachedBytes": requests,
+        "encryptedRequests": requests // 2,
+        "encryptedBytes": requests,
+        "pageViews": requests // 10,
+        "countryMap": [
+            {"clientCountryName": "MX", "requests": requests, "bytes": requests // 2}
+        ],
+        "clientHTTPVersionMap": [],
+        "clientSSLMap": [],
+        "contentTypeMap": [],
+        "responseStatusMap": [],
+    }
+
+
+class FakeClient(CloudflareClient):
+    """
+    Answers the hourly, daily and uniques queries with constant traffic.
+    """
+
+    def query(self, query, variables, timeout=None, use_cache=True):
+        self.calls.append((query, variables))
+        zones = []
+        for zone_tag in variables["zoneTags"]:
+            if query is ZONE_UNIQUES_QUERY:
+                groups = [
+                    {"dimensions": {"date": date}, "uniq": {"uniques": DAILY_UNIQUES}}
+                    for date in date_range(variables["since"], variables["until"])
+                ]
+            elif "T" in variables["since"]:
+                hour = datetime.strptime(variables["since"], "%Y-%m-%dT%H:%M:%SZ")
+                end = datetime.strptime(variables["until"][:19], "%Y-%m-%dT%H:%M:%S")
+                groups = []
+                while hour < end:
+                    groups.append(
+                        {
+                            "dimensions": {
+                                "datetime": hour.strftime("%Y-%m-%dT%H:00:00Z")
+                            },
+                            "sum": _sum(HOURLY_REQUESTS),
+                            "uniq": {"uniques": HOURLY_UNIQUES},
+                        }
+                    )
+                    hour += timedelta(hours=1)
+            else:
+                groups = [
+                    {
+                        "dimensions": {"date": date},
+                        "sum": _sum(24 * HOURLY_REQUESTS),
+                        "uniq": {"uniques": DAILY_UNIQUES},
+                    }
+                    for date in date_range(variables["since"], variables["until"])
+                ]
+            zones.append(
+                {
+                    "zoneTag": zone_tag,
+                    "httpRequests1dGroups": groups,
+                    "httpRequests1hGroups": groups,
+                }
+            )
+        return {"data": {"viewer": {"zones": zones}}}
+
+
+@pytest.fixture
+def client():
+    fake = FakeClient("token")
+    object.__setattr__(fake, "calls", [])
+    set_cloudflare_client(fake)
+    yield fake
+    set_cloudflare_client(None)
+
+
+@pytest.fixture
+def today(monkeypatch):
+    def set_today(date: str) -> None:
+        monkeypatch.setattr(db_utils, "utc_today", lambda: date)
+
+    return set_today
+
+
+@pytest.fixture
+def store():
+    store = MetricStore(":memory:")
+    yield store
+    store.close()
+
+
+def _final_days(store: MetricStore, zone_tag: str) -> dict:
+    rows = store.conn.execute(
+        "SELECT date, final FROM collected_days WHERE zone_tag = ?", (zone_tag,)
+    )
+    return dict(rows.fetchall())
+
+
+def test_yesterday_is_not_final_after_midnight(client, store):
+    collector_utils.collect_hourly(["z"], now=datetime(2025, 3, 5, 1, 30), store=store)
+
+    final = _final_days(store, "z")
+    assert final["2025-03-04"] == 0
+    assert final["2025-03-05"] == 0
+    assert "2025-03-04" in store.missing_dates("z", "2025-03-04", "2025-03-05")
+
+
+def test_day_is_finalized_once_the_daily_collector_would(client, store):
+    collector_utils.collect_hourly(["z"], now=datetime(2025, 3, 5, 1, 30), store=store)
+    collector_utils.collect_hourly(["z"], now=datetime(2025, 3, 6, 0, 30), store=store)
+
+    assert _final_days(store, "z")["2025-03-04"] == 1
+    metrics, _ = store.read_days("z", "2025-03-04", "2025-03-04")["2025-03-04"]
+    assert metrics["uniques"] == DAILY_UNIQUES
+    assert metrics["requests"] == 24 * HOURLY_REQUESTS
+
+
+def test_hourly_rollup_equals_the_daily_fetch(client, store, today):
+    today("2025-03-06")
+    collector_utils.collect_hourly(
+        ["z"], now=datetime(2025, 3, 6, 0, 30), store=store, backfill_hours=72
+    )
+    daily = MetricStore(":memory:")
+    collector_utils.collect_incremental(["z"], today="2025-03-06", store=daily)
+
+    rolled = store.read_days("z", "2025-03-03", "2025-03-04")
+    fetched = daily.read_days("z", "2025-03-03", "2025-03-04")
+    assert rolled == fetched
+    assert (
+        _final_days(store, "z")["2025-03-04"] == _final_days(daily, "z")["2025-03-04"]
+    )
+    daily.close()
+
+
+def test_finalization_follows_final_before(client, store, today):
+    today("2025-03-06")
+    collector_utils.collect_incremental(["z"], today="2025-03-06", store=store)
+
+    final = _final_days(store, "z")
+    assert final_before("2025-03-06") == "2025-03-05"
+    assert [date for date, done in sorted(final.items()) if not done] == [
+        "2025-03-05",
+        "2025-03-06",
+    ]
+    assert store.high_water_mark("z") == "2025-03-04"
+
+
+def test_hourly_collection_resumes_at_the_watermark(client, store):
+    collector_utils.collect_hourly(["z"], now=datetime(2025, 3, 5, 10, 30), store=store)
+    assert store.hourly_high_water_mark("z") == "2025-03-05T09:00:00Z"
+
+    client.calls.clear()
+    starts = collector_utils.collect_hourly(
+        ["z"], now=datetime(2025, 3, 5, 12, 15), store=store
+    )
+
+    assert starts == {"z": "2025-03-05T09:00:00Z"}
+    hourly = [v for _, v in client.calls if "T" in v["since"]]
+    assert [(v["since"], v["until"]) for v in hourly] == [
+        ("2025-03-05T09:00:00Z", "2025-03-05T12:15:00Z")
+    ]
+    assert store.hourly_high_water_mark("z") == "2025-03-05T11:00:00Z"
+    assert len(store.read_hours("z", "2025-03-05", "2025-03-06")) == 13
+
+
+def test_daily_collection_resumes_after_the_last_final_day(client, store, today):
+    today("2025-03-06")
+    collector_utils.collect_incremental(["z"], today="2025-03-06", store=store)
+    client.calls.clear()
+    today("2025-03-08")
+
+    starts = collector_utils.collect_incremental(["z"], today="2025-03-08", store=store)
+
+    assert starts == {"z": "2025-03-05"}
+    assert [(v["since"], v["until"]) for _, v in client.calls] == [
+        ("2025-03-05", "2025-03-08")
+    ]
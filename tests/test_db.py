@@ -0,0 +1,68 @@
+from db_utils import MetricStore, final_before
+
+
+def _row(requests: int, countries: dict) -> tuple:
+    return {"requests": requests}, {"country_requests": countries}
+
+
+def test_upsert_days_replaces_the_breakdowns_of_a_day():
+    store = MetricStore(":memory:")
+    store.upsert_days(
+        "z", {"2025-03-01": _row(10, {"MX": 6, "US": 4})}, ["2025-03-01"], "2025-03-01"
+    )
+    store.upsert_days(
+        "z", {"2025-03-01": _row(12, {"MX": 12})}, ["2025-03-01"], "2025-03-02"
+    )
+
+    metrics, breakdowns = store.read_days("z", "2025-03-01", "2025-03-01")["2025-03-01"]
+    assert metrics == {"requests": 12}
+    assert breakdowns == {"country_requests": {"MX": 12}}
+    assert store.missing_dates("z", "2025-03-01", "2025-03-01") == []
+
+
+def test_collected_day_without_data_clears_its_breakdowns():
+    store = MetricStore(":memory:")
+    store.upsert_days("z", {"2025-03-01": _row(10, {"MX": 10})}, ["2025-03-01"])
+    store.upsert_days("z", {}, ["2025-03-01"])
+
+    _, breakdowns = store.read_days("z", "2025-03-01", "2025-03-01")["2025-03-01"]
+    assert breakdowns == {}
+
+
+def test_days_are_final_strictly_before_the_final_date():
+    store = MetricStore(":memory:")
+    store.upsert_days(
+        "z", {}, ["2025-03-03", "2025-03-04", "2025-03-05"], final_before("2025-03-05")
+    )
+
+    assert store.missing_dates("z", "2025-03-03", "2025-03-05") == [
+        "2025-03-04",
+        "2025-03-05",
+    ]
+    assert store.missing_dates("z", "2025-03-03", "2025-03-05", final_only=False) == []
+    assert store.high_water_mark("z") == "2025-03-03"
+
+
+def test_hours_without_distinct_counts_are_not_final():
+    store = MetricStore(":memory:")
+    hours = {
+        f"2025-03-01T{hour:02d}:00:00Z": ({"requests": 1, "uniques": hour}, {})
+        for hour in range(24)
+    }
+    store.upsert_hours(
+        "z",
+        hours,
+        "2025-03-01T00:00:00Z",
+        "2025-03-02T00:00:00Z",
+        "2025-03-02T00:00:00Z",
+    )
+
+    days = store.rollup_hours("z", ["2025-03-01"], "2025-03-05")
+    assert days["2025-03-01"][0] == {"requests": 24, "uniques": 23}
+    assert store.missing_dates("z", "2025-03-01", "2025-03-01") == ["2025-03-01"]
+
+    days = store.rollup_hours(
+        "z", ["2025-03-01"], "2025-03-05", {"2025-03-01": {"uniques": 30}}
+    )
+    assert days["2025-03-01"][0]["uniques"] == 30
+    assert store.missing_dates("z", "2025-03-01", "2025-03-01") == []
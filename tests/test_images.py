@@ -0,0 +1,37 @@
+import os
+import pickle
+
+import image_utils
+import pytest
+
+WORLD = {"codes": ["MX"], "paths": [], "segments": [], "bounds": (0, 0, 1, 1)}
+
+
+@pytest.fixture
+def world_files(tmp_path, monkeypatch):
+    shapefile, cache = tmp_path / "world.shp", tmp_path / "world.pkl"
+    shapefile.write_bytes(b"")
+    os.utime(shapefile, (0, 0))
+    monkeypatch.setattr(image_utils, "WORLD_SHAPEFILE", str(shapefile))
+    monkeypatch.setattr(image_utils, "WORLD_CACHE", str(cache))
+    monkeypatch.setattr(image_utils, "_build_world", lambda: dict(WORLD))
+    image_utils.load_world.cache_clear()
+    yield cache
+    image_utils.load_world.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "stale",
+    [
+        b"cno_such_module\nWorld\n.",  # ModuleNotFoundError
+        b"cimage_utils\nNoSuchClass\n.",  # AttributeError
+        b"not a pickle",
+        b"",
+    ],
+)
+def test_unreadable_world_cache_is_rebuilt(world_files, stale):
+    world_files.write_bytes(stale)
+
+    assert image_utils.load_world() == WORLD
+    with open(world_files, "rb") as f:
+        assert pickle.load(f) == WORLD
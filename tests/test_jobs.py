@@ -0,0 +1,59 @@
+import threading
+import time
+
+from job_utils import JobQueue
+
+
+def test_enqueue_returns_pending_job(tmp_path):
+    release = threading.Event()
+    queue = JobQueue(str(tmp_path / "jobs.db"), runner=lambda job: release.wait(5))
+
+    first = queue.enqueue("acme", "zoneA", "2025-02-28", 7)
+    assert queue.enqueue("acme", "zoneA", "2025-02-28", 7) == first
+    assert queue.enqueue("acme", "zoneA", "2025-02-28", 30) != first
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while queue.get(first)["status"] != "done" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.get(first)["status"] == "done"
+    assert queue.enqueue("acme", "zoneA", "2025-02-28", 7) != first
+
+
+def _wait_for(queue: JobQueue, job_id: str, status: str) -> dict:
+    deadline = time.monotonic() + 5
+    while queue.get(job_id)["status"] != status and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return queue.get(job_id)
+
+
+def test_restart_leaves_jobs_of_live_queues_alone(tmp_path):
+    release = threading.Event()
+    runs = []
+
+    def runner(job):
+        runs.append(job["id"])
+        release.wait(5)
+
+    live = JobQueue(str(tmp_path / "jobs.db"), runner=runner)
+    job_id = live.enqueue("acme", "zoneA", "2025-02-28", 7)
+    _wait_for(live, job_id, "running")
+
+    other = JobQueue(str(tmp_path / "jobs.db"), runner=runner)
+    assert other._reclaim() == []
+    release.set()
+    assert _wait_for(live, job_id, "done")["status"] == "done"
+    assert runs == [job_id]
+
+
+def test_jobs_of_stale_queues_are_taken_over(tmp_path):
+    hung = threading.Event()
+    crashed = JobQueue(str(tmp_path / "jobs.db"), runner=lambda job: hung.wait(5))
+    job_id = crashed.enqueue("acme", "zoneA", "2025-02-28", 7)
+    _wait_for(crashed, job_id, "running")
+    with crashed.conn:
+        crashed.conn.execute("UPDATE job_owners SET heartbeat = '2000-01-01T00:00:00Z'")
+
+    restarted = JobQueue(str(tmp_path / "jobs.db"), runner=lambda job: "report.pdf")
+    assert _wait_for(restarted, job_id, "done")["result_path"] == "report.pdf"
+    hung.set()
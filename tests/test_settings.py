@@ -0,0 +1,65 @@
+import importlib
+import os
+import shutil
+
+import pytest
+
+from conftest import ROOT
+
+
+def test_zone_tag_read_from_dotenv(tmp_path, monkeypatch, environ):
+    for name in ("ATDAC_ID", "FLEX_ID", "CF_CLIENTS_FILE"):
+        environ.pop(name, None)
+    shutil.copy(os.path.join(ROOT, "clients.json"), tmp_path)
+    (tmp_path / ".env").write_text("ATDAC_ID=zoneA\n")
+    monkeypatch.chdir(tmp_path)
+
+    app = importlib.import_module("app")
+    import cloudflare_utils
+
+    assert app.load_clients()["acme"]["zone_tag"] == "zoneA"
+    assert app.get_client("acme")["zone_tag"] == "zoneA"
+    assert cloudflare_utils.ATDAC_ID == "zoneA"
+    assert cloudflare_utils.FLEX_ID is None
+
+
+def test_dotenv_does_not_override_environment(tmp_path, monkeypatch, environ):
+    environ["ATDAC_ID"] = "zoneB"
+    (tmp_path / ".env").write_text("ATDAC_ID=zoneA\n")
+    monkeypatch.chdir(tmp_path)
+    import cloudflare_utils
+
+    assert cloudflare_utils.ATDAC_ID == "zoneB"
+
+
+@pytest.mark.parametrize("token", ["CF_API_TOKEN=t\n", ""])
+def test_api_url_read_from_dotenv(tmp_path, monkeypatch, environ, token):
+    import general_utils
+    from config_utils import set_cloudflare_client
+
+    for name in ("CF_API_TOKEN", "CF_API_URL"):
+        environ.pop(name, None)
+    (tmp_path / ".env").write_text(token + "CF_API_URL=http://stand-in.test\n")
+    monkeypatch.chdir(tmp_path)
+    set_cloudflare_client(None)
+    urls = []
+
+    def api_request(method, url, token, timeout, **kwargs):
+        urls.append(url)
+        return _Response({"data": {}})
+
+    monkeypatch.setattr(general_utils, "api_request", api_request)
+    try:
+        general_utils.execute_query("t", "query {}", {}, use_cache=False)
+    finally:
+        set_cloudflare_client(None)
+
+    assert urls == ["http://stand-in.test/graphql"]
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
@@ -0,0 +1,237 @@
+"""
+V1 streaming fetcher for the adaptive datasets: security events and DNS analytics
+"""
+
+__version__ = "1.3.0"
+from datetime import datetime, timedelta
+
+from aggregate_utils import TOP_N, StreamingTopN
+from config_utils import CloudflareClient, get_cloudflare_client
+from general_utils import TruncatedResultError, range_generator
+
+# Rows an adaptive groups query can return
+ADAPTIVE_LIMIT = 10000
+# Slices a range is split into before any bisection, and the smallest one allowed
+INITIAL_SLICE = timedelta(days=1)
+MIN_SLICE = timedelta(minutes=1)
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+SECURITY_DIMENSIONS = (
+    "action",
+    "clientCountryName",
+    "clientIP",
+    "ruleId",
+    "clientRequestHTTPHost",
+    "clientRequestPath",
+)
+DNS_DIMENSIONS = (
+    "queryName",
+    "responseCode",
+    "queryType",
+    "sourceIP",
+    "destinationIP",
+)
+# Dataset key: (GraphQL node, default dimensions)
+DATASETS = {
+    "firewall": ("firewallEventsAdaptiveGroups", SECURITY_DIMENSIONS),
+    "dns": ("dnsAnalyticsAdaptiveGroups", DNS_DIMENSIONS),
+}
+
+ADAPTIVE_QUERY = """
+    query GetAdaptiveGroups($zoneTag: String!, $since: Time!, $until: Time!, $limit: Int!) {
+        viewer {
+            zones(filter: {zoneTag: $zoneTag}) {
+                %s(
+                    limit: $limit,
+                    filter: {datetime_geq: $since, datetime_lt: $until}
+                ) {
+                    count
+                    dimensions {
+                        %s
+                    }
+                }
+            }
+        }
+    }
+"""
+
+
+def adaptive_query(dataset: str, dimensions: tuple) -> str:
+    """
+    Query text of an adaptive groups dataset.
+    Args:
+        dataset (str): GraphQL node, e.g. "firewallEventsAdaptiveGroups".
+        dimensions (tuple): Dimensions to group by.
+    Returns:
+        str: The query.
+    """
+    return ADAPTIVE_QUERY % (dataset, "\n".join(dimensions))
+
+
+def _slices(since: datetime, until: datetime, size: timedelta) -> list:
+    slices = []
+    while since < until:
+        end = min(until, since + size)
+        slices.append((since, end))
+        since = end
+    return slices
+
+
+def iter_adaptive_rows(
+    zone_tag: str,
+    since: str,
+    until: str,
+    dataset: str = "firewall",
+    dimensions: tuple = None,
+    limit: int = ADAPTIVE_LIMIT,
+    slice_size: timedelta = INITIAL_SLICE,
+    min_slice: timedelta = MIN_SLICE,
+    client: CloudflareClient = None,
+):
+    """
+    Stream the groups of an adaptive dataset, slice by slice in time order.
+    A slice that comes back full is split in two and fetched again, so rows
+    are never dropped at the limit.
+    Args:
+        zone_tag (str): Unique identifier for the Cloudflare zone.
+        since (str): Start of the range (inclusive) as YYYY-MM-DDTHH:MM:SSZ.
+        until (str): End of the range (exclusive) as YYYY-MM-DDTHH:MM:SSZ.
+        dataset (str): Key of DATASETS, "firewall" or "dns".
+        dimensions (tuple): Dimensions to group by, defaults to the dataset ones.
+        limit (int): Rows per query.
+        slice_size (timedelta): Size of the first slices.
+        min_slice (timedelta): Smallest slice before giving up.
+        client (CloudflareClient): API client, defaults to get_cloudflare_client().
+    Yields:
+        dict: The dimensions of a group and its "count".
+    Raises:
+        TruncatedResultError: If a slice of min_slice still hits the limit.
+    """
+    client = client or get_cloudflare_client()
+    node, default_dimensions = DATASETS[dataset]
+    query = adaptive_query(node, dimensions or default_dimensions)
+    pending = _slices(
+        datetime.strptime(since, TIME_FORMAT),
+        datetime.strptime(until, TIME_FORMAT),
+        slice_size,
+    )
+    pending.reverse()
+    while pending:
+        start, end = pending.pop()
+        response = client.query(
+            query,
+            {
+                "zoneTag": zone_tag,
+                "since": start.strftime(TIME_FORMAT),
+                "until": end.strftime(TIME_FORMAT),
+                "limit": limit,
+            },
+        )
+        try:
+            zones = response["data"]["viewer"]["zones"] or []
+            rows = (zones[0].get(node) or []) if zones else []
+        except (KeyError, IndexError, TypeError) as e:
+            raise Exception(f"Error processing response: {e}")
+        if len(rows) >= limit:
+            if end - start <= min_slice:
+                raise TruncatedResultError(
+                    f"{node} returned {len(rows)} rows between {start} and {end}."
+                )
+            middle = start + timedelta(seconds=(end - start).total_seconds() // 2)
+            pending.append((middle, end))
+            pending.append((start, middle))
+            continue
+        for row in rows:
+            yield {**row["dimensions"], "count": row["count"]}
+
+
+def _top_rows(rows, dimensions: tuple, n: int) -> dict:
+    counters = {dimension: StreamingTopN(n) for dimension in dimensions}
+    total = 0
+    for row in rows:
+        total += row["count"]
+        for dimension, counter in counters.items():
+            counter.add(row[dimension], row["count"])
+    return {
+        "total": total,
+        **{dimension: counter.top() for dimension, counter in counters.items()},
+    }
+
+
+def top_adaptive(
+    zone_tag: str,
+    since: str,
+    until: str,
+    dataset: str = "firewall",
+    dimensions: tuple = None,
+    n: int = TOP_N,
+) -> dict:
+    """
+    Top values of every dimension of an adaptive dataset, aggregated while the
+    rows stream in, so memory does not grow with the number of rows.
+    By default every dimension of the dataset is fetched by a query grouped by
+    it alone: grouping by all of them at once returns about one row per event.
+    Args:
+        zone_tag (str): Unique identifier for the Cloudflare zone.
+        since (str): Start of the range (inclusive) as YYYY-MM-DDTHH:MM:SSZ.
+        until (str): End of the range (exclusive) as YYYY-MM-DDTHH:MM:SSZ.
+        dataset (str): Key of DATASETS, "firewall" or "dns".
+        dimensions (tuple): Dimensions to group by together in a single query,
+            defaults to one query per dataset dimension.
+        n (int): Values kept per dimension.
+    Returns:
+        dict: "total" with the number of events, and the dimensions as keys
+        with their top values and counts as values.
+    """
+    if dimensions:
+        rows = iter_adaptive_rows(zone_tag, since, until, dataset, dimensions)
+        return _top_rows(rows, dimensions, n)
+    top = {}
+    for dimension in DATASETS[dataset][1]:
+        rows = iter_adaptive_rows(zone_tag, since, until, dataset, (dimension,))
+        result = _top_rows(rows, (dimension,), n)
+        top.setdefault("total", result["total"])
+        top[dimension] = result[dimension]
+    return top
+
+
+def _window(leq_date: str, periods: int) -> tuple:
+    range_generated = range_generator(leq_date, periods)
+    until = datetime.strptime(range_generated["leq_date"][:10], "%Y-%m-%d")
+    return range_generated["geq_date"], (until + timedelta(days=1)).strftime(
+        TIME_FORMAT
+    )
+
+
+def get_security_events(
+    zone_tag: str, leq_date: str, periods: int, n: int = TOP_N
+) -> dict:
+    """
+    Security events of a zone: top actions, countries, IPs, rules, hosts and paths.
+    Args:
+        zone_tag (str): Unique identifier for the Cloudflare zone.
+        leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+        periods (int): Number of days before the end date to include in the range.
+        n (int): Values kept per dimension.
+    Returns:
+        dict: See top_adaptive.
+    """
+    since, until = _window(leq_date, periods)
+    return top_adaptive(zone_tag, since, until, "firewall", n=n)
+
+
+def get_dns_analytics(
+    zone_tag: str, leq_date: str, periods: int, n: int = TOP_N
+) -> dict:
+    """
+    DNS queries of a zone: top query names, response codes, record types and IPs.
+    Args:
+        zone_tag (str): Unique identifier for the Cloudflare zone.
+        leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+        periods (int): Number of days before the end date to include in the range.
+        n (int): Values kept per dimension.
+    Returns:
+        dict: See top_adaptive.
+    """
+    since, until = _window(leq_date, periods)
+    return top_adaptive(zone_tag, since, until, "dns", n=n)
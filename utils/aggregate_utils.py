@@ -0,0 +1,208 @@
+"""
+V1 mergeable aggregates for the map dimensions: countries, content types, protocols...
+"""
+
+__version__ = "1.1.0"
+import heapq
+from operator import itemgetter
+
+TOP_N = 10
+# Key of the bucket summing the values left out of a top, shown as is in the reports
+OTHER_LABEL = "Otros"
+# Counters kept per StreamingTopN, the more the closer the counts are to the exact ones
+CAPACITY_FACTOR = 20
+
+
+def top_k(counts: dict, k: int = TOP_N, other_label: str = None) -> dict:
+    """
+    The k largest entries of a {key: value} dict, picked with a heap instead of
+    sorting the whole dict. Ties keep their insertion order.
+    Args:
+        counts (dict): Keys and their totals.
+        k (int): Entries to keep.
+        other_label (str): If set, the rest is summed under this key, usually
+            OTHER_LABEL.
+    Returns:
+        dict: The top entries, largest first, then the other_label bucket if any.
+    """
+    top = dict(heapq.nlargest(k, counts.items(), key=itemgetter(1)))
+    if other_label is not None and len(counts) > len(top):
+        top[other_label] = sum(counts.values()) - sum(top.values())
+    return top
+
+
+class MapAggregate:
+    """
+    Totals of a map dimension, e.g. requests per country. Built from the *Map
+    arrays of a response or from plain dicts, and merged with other aggregates
+    of the same dimension, so days and zones are combined without going back
+    to the raw data.
+    """
+
+    def __init__(self, counts: dict = None):
+        self.counts = dict(counts) if counts else {}
+
+    @classmethod
+    def from_entries(cls, entries: list, key_field: str, value_field: str):
+        """
+        Aggregate a *Map array of a GraphQL response.
+        Args:
+            entries (list): Map entries, e.g. the clientCountryMap of a day.
+            key_field (str): Field with the key, e.g. "clientCountryName".
+            value_field (str): Field with the value, e.g. "requests".
+        Returns:
+            MapAggregate: Totals per key, entries repeated in the array are summed.
+        """
+        return cls().add_entries(entries, key_field, value_field)
+
+    @classmethod
+    def merge_all(cls, aggregates):
+        """
+        Merge many partial aggregates.
+        Args:
+            aggregates: MapAggregate instances or {key: value} dicts.
+        Returns:
+            MapAggregate: A new aggregate with the totals of all of them.
+        """
+        merged = cls()
+        for aggregate in aggregates:
+            merged.merge(aggregate)
+        return merged
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, MapAggregate) and self.counts == other.counts
+
+    def __repr__(self) -> str:
+        return f"MapAggregate(keys={len(self)}, total={self.total})"
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def add(self, key, value) -> None:
+        self.counts[key] = self.counts.get(key, 0) + value
+
+    def add_entries(self, entries: list, key_field: str, value_field: str):
+        """
+        Add a *Map array of a GraphQL response.
+        Args:
+            entries (list): Map entries, None is treated as empty.
+            key_field (str): Field with the key.
+            value_field (str): Field with the value.
+        Returns:
+            MapAggregate: Self, to chain calls.
+        """
+        counts = self.counts
+        for entry in entries or []:
+            key = entry[key_field]
+            counts[key] = counts.get(key, 0) + entry[value_field]
+        return self
+
+    def merge(self, other):
+        """
+        Add the totals of another aggregate of the same dimension.
+        Args:
+            other: MapAggregate or {key: value} dict.
+        Returns:
+            MapAggregate: Self, to chain calls.
+        """
+        counts = self.counts
+        for key, value in getattr(other, "counts", other).items():
+            counts[key] = counts.get(key, 0) + value
+        return self
+
+    def top(self, k: int = TOP_N, other_label: str = None) -> dict:
+        """
+        The k largest keys, see top_k.
+        Args:
+            k (int): Keys to keep.
+            other_label (str): If set, the rest is summed under this key.
+        Returns:
+            dict: The top keys and their totals, largest first.
+        """
+        return top_k(self.counts, k, other_label)
+
+    def to_dict(self) -> dict:
+        return dict(self.counts)
+
+
+class StreamingTopN:
+    """
+    Heaviest keys of a weighted stream in bounded memory (Space-Saving): at most
+    n * CAPACITY_FACTOR counters are kept, a new key replaces the smallest one
+    and inherits its count, which becomes its maximum overestimation. Used when
+    the keys are unbounded (IPs, paths) and a MapAggregate could grow too much.
+    """
+
+    def __init__(self, n: int = TOP_N, capacity: int = None):
+        self.n = n
+        self.capacity = capacity or n * CAPACITY_FACTOR
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+
+    def add(self, key, count: int = 1) -> None:
+        self.total += count
+        if key in self.counts:
+            self.counts[key] += count
+            return
+        floor = 0
+        if len(self.counts) >= self.capacity:
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            del self.errors[victim]
+        self.counts[key] = floor + count
+        self.errors[key] = floor
+
+    def _floor(self) -> int:
+        # A key missing from a full summary may have been counted up to its smallest counter
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values(), default=0)
+
+    def merge(self, other):
+        """
+        Add the summary of another stream, e.g. the same dimension of another
+        day or zone. The result keeps the Space-Saving guarantee: counts never
+        underestimate and errors bound the overestimation.
+        Args:
+            other (StreamingTopN): Summary to merge.
+        Returns:
+            StreamingTopN: Self, to chain calls.
+        """
+        floors = (self._floor(), other._floor())
+        counts, errors = {}, {}
+        for key in self.counts.keys() | other.counts.keys():
+            counts[key], errors[key] = 0, 0
+            for summary, floor in zip((self, other), floors):
+                if key in summary.counts:
+                    counts[key] += summary.counts[key]
+                    errors[key] += summary.errors[key]
+                else:
+                    counts[key] += floor
+                    errors[key] += floor
+        kept = heapq.nlargest(self.capacity, counts, key=counts.get)
+        self.counts = {key: counts[key] for key in kept}
+        self.errors = {key: errors[key] for key in kept}
+        self.total += other.total
+        return self
+
+    @property
+    def exact(self) -> bool:
+        return not any(self.errors.values())
+
+    def top(self, other_label: str = None) -> dict:
+        """
+        The n heaviest keys.
+        Args:
+            other_label (str): If set, the rest of the total is put under this key.
+        Returns:
+            dict: Keys and their counts, highest first.
+        """
+        top = dict(heapq.nlargest(self.n, self.counts.items(), key=itemgetter(1)))
+        if other_label is not None and self.total > sum(top.values()):
+            top[other_label] = self.total - sum(top.values())
+        return top
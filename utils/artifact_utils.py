@@ -0,0 +1,173 @@
+"""
+V1 artifact cache for the generated reports and charts
+"""
+
+__version__ = "1.1.0"
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+ARTIFACTS_DIR = os.getenv("CF_ARTIFACTS_DIR", "data/artifacts")
+DISK_MAX_BYTES = 1024 * 1024 * 1024
+EVICT_EVERY = 50
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _json_default(value):
+    return value.digest() if hasattr(value, "digest") else str(value)
+
+
+def digest(*parts) -> str:
+    """
+    Hash of JSON serializable parts, used as artifact key. Objects with a
+    digest method (snapshots, frames) contribute their own hash.
+    Args:
+        *parts: Every input the artifact depends on.
+    Returns:
+        str: Hex digest.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=_json_default)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """
+    Hash of the content of a file.
+    Args:
+        path (str): Path to the file.
+    Returns:
+        str: Hex digest.
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class ArtifactStore:
+    """
+    Directory of immutable files named after the hash of their inputs, so an
+    artifact is built once and served as is until one of its inputs changes.
+    Reads refresh the file mtime and the directory is trimmed by size, least
+    recently used first.
+    """
+
+    def __init__(
+        self, directory: str = ARTIFACTS_DIR, disk_max_bytes: int = DISK_MAX_BYTES
+    ):
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self.lock = threading.Lock()
+        self.writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str, ext: str) -> str:
+        """
+        Location of an artifact, whether it exists or not.
+        Args:
+            key (str): Key from digest.
+            ext (str): File extension, e.g. "pdf".
+        Returns:
+            str: Path to the artifact.
+        """
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    def get(self, key: str, ext: str):
+        """
+        Path to a stored artifact.
+        Args:
+            key (str): Key from digest.
+            ext (str): File extension, e.g. "pdf".
+        Returns:
+            str | None: Path to the artifact, None if it is not stored.
+        """
+        path = self.path(key, ext)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def read(self, key: str, ext: str):
+        """
+        Content of a stored artifact.
+        Args:
+            key (str): Key from digest.
+            ext (str): File extension, e.g. "png".
+        Returns:
+            bytes | None: The artifact, None if it is not stored.
+        """
+        path = self.get(key, ext)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, data: bytes, ext: str) -> str:
+        """
+        Store an artifact, the write is atomic so readers never see partial files.
+        Args:
+            key (str): Key from digest.
+            data (bytes): Content of the artifact.
+            ext (str): File extension, e.g. "pdf".
+        Returns:
+            str: Path to the artifact.
+        """
+        path = self.path(key, ext)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.writes += 1
+            evict = self.writes % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+        return path
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used artifacts until the directory is under disk_max_bytes.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self) -> None:
+        for entry in os.scandir(self.directory):
+            os.remove(entry.path)
+
+
+def get_artifact_store(directory: str = None) -> ArtifactStore:
+    """
+    Process wide artifact store for a directory.
+    Args:
+        directory (str): Artifacts directory, defaults to CF_ARTIFACTS_DIR or data/artifacts.
+    Returns:
+        ArtifactStore: The shared store.
+    """
+    directory = directory or ARTIFACTS_DIR
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = ArtifactStore(directory)
+        return _stores[directory]
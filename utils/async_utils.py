@@ -0,0 +1,254 @@
+"""
+V1 asynchronous functions to collect every client concurrently
+"""
+
+__version__ = "1.5.0"
+import asyncio
+import threading
+import time
+
+from cache_utils import get_response_cache
+from cloudflare_utils import (
+    ZONE_SNAPSHOT_QUERY,
+    build_zone_snapshots,
+    plan_window_queries,
+)
+from config_utils import default_api_url, get_cloudflare_client
+from db_utils import MetricStore, get_metric_store
+from general_utils import (
+    DEFAULT_TIMEOUT,
+    MAX_RETRIES,
+    POOL_SIZE,
+    RETRY_STATUSES,
+    CloudflareError,
+    CloudflareHTTPError,
+    CloudflareRateLimitError,
+    GraphQLError,
+    backoff_delay,
+    retry_after_seconds,
+)
+
+# aiohttp is imported inside the coroutines, only the collectors use it
+
+DEFAULT_CONCURRENCY = 8
+# The GraphQL API allows 300 queries per 5 minutes for each user token
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 5
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every request sent with the same API token, see
+    get_rate_limiter. It is not bound to an event loop, so consecutive
+    asyncio.run calls and other threads share the same bucket.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Wait until a request can be sent without exceeding the rate.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+
+def get_rate_limiter(
+    token: str, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST
+) -> RateLimiter:
+    """
+    Process wide rate limiter of an API token, created on its first use.
+    Args:
+        token (str): API token.
+        rate (float): Maximum queries per second, only used when it is created.
+        burst (int): Bucket size, only used when it is created.
+    Returns:
+        RateLimiter: The limiter shared by every call with this token.
+    """
+    with _limiters_lock:
+        if token not in _limiters:
+            _limiters[token] = RateLimiter(rate, burst)
+        return _limiters[token]
+
+
+async def execute_query_async(
+    session: "aiohttp.ClientSession",
+    token: str,
+    query: str,
+    variables: dict,
+    limiter: RateLimiter,
+    retries: int = MAX_RETRIES,
+    api_url: str = None,
+) -> dict:
+    """
+    Execute GraphQL query, same cache, retry and error policy as
+    general_utils.execute_query.
+    Args:
+        session (aiohttp.ClientSession): Pooled session.
+        token (str): API token for authorization.
+        query (str): GraphQL query string.
+        variables (dict): Variables for the query.
+        limiter (RateLimiter): Rate limiter of the token.
+        retries (int): Retries after the first attempt.
+        api_url (str): API base URL, defaults to config_utils.default_api_url().
+    Returns:
+        dict: The decoded response.
+    Raises:
+        CloudflareRateLimitError: If the API still answers 429 after every retry.
+        CloudflareHTTPError: If the API answers any other non-200 status.
+        GraphQLError: If the response carries an errors payload.
+    """
+    import aiohttp
+
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+    }
+    cache = get_response_cache()
+    key = cache.key(token, query, variables)
+    # The cache reads and writes files, kept off the event loop
+    cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None:
+        return cached
+    payload = {"query": query, "variables": variables}
+    for attempt in range(retries + 1):
+        await limiter.acquire()
+        try:
+            async with session.post(
+                f"{api_url or default_api_url()}/graphql", headers=headers, json=payload
+            ) as response:
+                if response.status == 200:
+                    data = await response.json(content_type=None)
+                    if data.get("errors"):
+                        raise GraphQLError(data["errors"])
+                    await asyncio.to_thread(cache.set, key, data, cache.ttl(variables))
+                    return data
+                status, body = response.status, await response.text()
+                retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt == retries:
+                raise CloudflareError(f"Connection Error: {e}") from e
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        if status not in RETRY_STATUSES or attempt == retries:
+            break
+        await asyncio.sleep(backoff_delay(attempt, retry_after))
+    if status == 429:
+        raise CloudflareRateLimitError(status, body)
+    raise CloudflareHTTPError(status, body)
+
+
+async def collect_snapshots_async(
+    zone_tags: list,
+    windows: list,
+    token: str = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    limiter: RateLimiter = None,
+    store: MetricStore = None,
+) -> dict:
+    """
+    Fetch the snapshots of every zone for every window concurrently.
+    Only the days missing from the local store are queried, once however many
+    windows need them.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        windows (list): (leq_date, periods) tuples.
+        token (str): API token for authorization, defaults to the one of
+            get_cloudflare_client().
+        concurrency (int): Maximum number of queries in flight.
+        limiter (RateLimiter): Rate limiter, defaults to the shared one of the token.
+        store (MetricStore): Local store, defaults to get_metric_store().
+    Returns:
+        dict: (leq_date, periods) tuples as keys, {zone_tag: ZoneSnapshot} as values.
+    """
+    import aiohttp
+
+    api_url = None
+    if token is None:
+        client = get_cloudflare_client()
+        token, api_url = client.token, client.api_url
+    limiter = limiter or get_rate_limiter(token)
+    store = store or get_metric_store()
+    semaphore = asyncio.Semaphore(concurrency)
+    connect, read = DEFAULT_TIMEOUT
+    timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+    connector = aiohttp.TCPConnector(limit=max(concurrency, POOL_SIZE))
+
+    async def run(session, variables):
+        async with semaphore:
+            return await execute_query_async(
+                session,
+                token,
+                ZONE_SNAPSHOT_QUERY,
+                variables,
+                limiter,
+                api_url=api_url,
+            )
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        plan = plan_window_queries(zone_tags, windows, store)
+        tasks = [asyncio.ensure_future(run(session, v)) for v in plan]
+        try:
+            responses = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+    results = {}
+    for leq_date, periods in dict.fromkeys(windows):
+        results[(leq_date, periods)] = build_zone_snapshots(
+            zone_tags, leq_date, periods, plan, responses, store
+        )
+        # Saved with the first window, the other ones read them back from the store
+        plan, responses = [], []
+    return results
+
+
+def collect_snapshots(
+    zone_tags: list,
+    windows: list,
+    token: str = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    rate: float = DEFAULT_RATE,
+) -> dict:
+    """
+    Synchronous facade of collect_snapshots_async.
+    The snapshots are memoized, so the cloudflare_utils get_* functions called
+    afterwards for the same zones and windows do not query the API again.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        windows (list): (leq_date, periods) tuples.
+        token (str): API token for authorization, defaults to the one of
+            get_cloudflare_client().
+        concurrency (int): Maximum number of queries in flight.
+        rate (float): Maximum queries per second for the token, when its shared
+            limiter is created.
+    Returns:
+        dict: (leq_date, periods) tuples as keys, {zone_tag: ZoneSnapshot} as values.
+    """
+    limiter = get_rate_limiter(token or get_cloudflare_client().token, rate)
+
+    async def main():
+        return await collect_snapshots_async(
+            zone_tags, windows, token, concurrency, limiter
+        )
+
+    return asyncio.run(main())
@@ -0,0 +1,207 @@
+"""
+V1 response cache for the GraphQL queries
+"""
+
+__version__ = "1.0.0"
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from db_utils import final_before
+
+CACHE_DIR = os.getenv("CF_CACHE_DIR", "data/cache")
+# Complete days never change, the ones still being filled expire quickly
+PAST_TTL = 30 * 24 * 3600
+RECENT_TTL = 5 * 60
+MEMORY_ENTRIES = 256
+DISK_MAX_BYTES = 256 * 1024 * 1024
+EVICT_EVERY = 50
+
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _dates(value) -> list:
+    if isinstance(value, str):
+        return [value[:10]] if _DATE.match(value) else []
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        return [date for item in value for date in _dates(item)]
+    return []
+
+
+class ResponseCache:
+    """
+    Two tier cache for decoded responses: an in-memory LRU in front of a directory
+    of JSON files. Entries expire by TTL, the directory is trimmed by size.
+    """
+
+    def __init__(
+        self,
+        directory: str = CACHE_DIR,
+        memory_entries: int = MEMORY_ENTRIES,
+        disk_max_bytes: int = DISK_MAX_BYTES,
+        past_ttl: int = PAST_TTL,
+        recent_ttl: int = RECENT_TTL,
+    ):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+        self.past_ttl = past_ttl
+        self.recent_ttl = recent_ttl
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(token: str, query: str, variables: dict) -> str:
+        """
+        Hash of the token, the query text (whitespace insensitive) and the variables.
+        Args:
+            token (str): API token for authorization.
+            query (str): GraphQL query string.
+            variables (dict): Variables for the query.
+        Returns:
+            str: Hex digest.
+        """
+        payload = json.dumps(
+            [
+                hashlib.sha256(token.encode()).hexdigest(),
+                " ".join(query.split()),
+                variables,
+            ],
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def ttl(self, variables: dict) -> int:
+        """
+        Seconds a response can be reused: long if every date of the query is final.
+        Args:
+            variables (dict): Variables for the query.
+        Returns:
+            int: TTL in seconds.
+        """
+        dates = _dates(variables)
+        if dates and max(dates) < final_before():
+            return self.past_ttl
+        return self.recent_ttl
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        """
+        Cached response for a key.
+        Args:
+            key (str): Key from ResponseCache.key.
+        Returns:
+            dict | None: The response, None if missing or expired.
+        """
+        now = time.time()
+        with self.lock:
+            if key in self.memory:
+                expires, response = self.memory[key]
+                if expires > now:
+                    self.memory.move_to_end(key)
+                    return response
+                del self.memory[key]
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["expires"] <= now:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+        self._remember(key, entry["expires"], entry["response"])
+        return entry["response"]
+
+    def set(self, key: str, response: dict, ttl: int) -> None:
+        """
+        Cache a response in both tiers.
+        Args:
+            key (str): Key from ResponseCache.key.
+            response (dict): Decoded response.
+            ttl (int): Seconds the response can be reused.
+        """
+        expires = time.time() + ttl
+        self._remember(key, expires, response)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"expires": expires, "response": response}, f)
+        os.utime(tmp_path, (time.time(), expires))
+        os.replace(tmp_path, self._path(key))
+        with self.lock:
+            self.writes += 1
+            evict = self.writes % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def _remember(self, key: str, expires: float, response: dict) -> None:
+        with self.lock:
+            self.memory[key] = (expires, response)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def evict(self) -> None:
+        """
+        Remove the expired files, then the ones closest to expiring until the
+        directory is under disk_max_bytes. File mtimes hold the expiry time.
+        """
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+                if stat.st_mtime <= now:
+                    os.remove(entry.path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self) -> None:
+        with self.lock:
+            self.memory.clear()
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                os.remove(entry.path)
+
+
+def get_response_cache(directory: str = None) -> ResponseCache:
+    """
+    Process wide cache for a directory.
+    Args:
+        directory (str): Cache directory, defaults to CF_CACHE_DIR or data/cache.
+    Returns:
+        ResponseCache: The shared cache.
+    """
+    directory = directory or CACHE_DIR
+    with _caches_lock:
+        if directory not in _caches:
+            _caches[directory] = ResponseCache(directory)
+        return _caches[directory]
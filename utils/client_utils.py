@@ -0,0 +1,55 @@
+"""
+V1 client registry
+"""
+
+__version__ = "1.2.0"
+import json
+import os
+
+from config_utils import load_settings
+from layout_utils import DEFAULT_LAYOUT
+
+CLIENTS_FILE = "clients.json"
+
+
+def load_clients(path: str = None) -> dict:
+    """
+    Read the client registry.
+    Every client has a display "name", its Cloudflare "zone_tag" (or "zone_env",
+    the environment variable holding it), its "logo", its report window "periods"
+    and the "layout" of its PDF (a file of layouts/).
+    Args:
+        path (str): JSON file, defaults to CF_CLIENTS_FILE or clients.json.
+    Returns:
+        dict: Client keys (as used by the web pages) as keys and their settings as values.
+    """
+    load_settings()
+    path = path or os.getenv("CF_CLIENTS_FILE", CLIENTS_FILE)
+    try:
+        with open(path) as f:
+            clients = json.load(f)
+    except FileNotFoundError:
+        return {}
+    for client in clients.values():
+        if not client.get("zone_tag") and client.get("zone_env"):
+            client["zone_tag"] = os.getenv(client["zone_env"])
+        client.setdefault("periods", 7)
+        client.setdefault("layout", DEFAULT_LAYOUT)
+    return clients
+
+
+def get_client(key: str, path: str = None) -> dict:
+    """
+    Settings of one client.
+    Args:
+        key (str): Client key, e.g. "acme".
+        path (str): JSON file, defaults to CF_CLIENTS_FILE or clients.json.
+    Returns:
+        dict: The client settings.
+    Raises:
+        KeyError: If the client is not registered.
+    """
+    clients = load_clients(path)
+    if key not in clients:
+        raise KeyError(f"Unknown client: '{key}'.")
+    return clients[key]
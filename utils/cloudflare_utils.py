@@ -3,6 +3,12 @@ V3 functions neccesary to run the Cloudflare API
 """
 
 # TODO: Revisar que el leq date si contenga todos los datos del ultimo dia
+# Snapshot Module
+#   get_zone_snapshot() ✅
+#   get_zone_snapshots() ✅
+#   plan_snapshot_queries() ✅
+#   plan_window_queries() ✅
+#   build_zone_snapshots() ✅
 # Stats Module
 #   get_requests_per_location() ✅
 #   get_requests() ✅
@@ -23,117 +29,734 @@ V3 functions neccesary to run the Cloudflare API
 #   get_fourxx_errors() ✅
 #   get_fivexx_errors() ✅
 #
-__version__ = "3.0.0"
+__version__ = "3.12.0"
+import hashlib
+import json
 import os
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from functools import cached_property
+
+from aggregate_utils import TOP_N, MapAggregate, top_k
+from config_utils import CloudflareClient, get_cloudflare_client, load_settings
+from db_utils import MetricStore, date_range, final_before, get_metric_store
+from frame_utils import MetricFrame
+from general_utils import range_generator
+
+
+def _setting(name: str) -> str:
+    load_settings()
+    return os.getenv(name)
+
+
+# Settings read from the environment (and .env) on first access, not at import time
+_LAZY_SETTINGS = {
+    "TOKEN": lambda: get_cloudflare_client().token,
+    "ID": lambda: get_cloudflare_client().account_id,
+    "ATDAC_ID": lambda: _setting("ATDAC_ID"),
+    "FLEX_ID": lambda: _setting("FLEX_ID"),
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_SETTINGS:
+        return _LAZY_SETTINGS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Snapshot Module
+ZONE_METRIC_FIELDS = """
+    sum {
+        requests
+        bytes
+        cachedRequests
+        cachedBytes
+        encryptedRequests
+        encryptedBytes
+        pageViews
+        countryMap {
+            clientCountryName
+            requests
+            bytes
+        }
+        clientHTTPVersionMap {
+            clientHTTPProtocol
+            requests
+        }
+        clientSSLMap {
+            clientSSLProtocol
+            requests
+        }
+        contentTypeMap {
+            edgeResponseContentTypeName
+            requests
+        }
+        responseStatusMap {
+            edgeResponseStatus
+            requests
+        }
+    }
+    uniq {
+        uniques
+    }
+"""
+ZONE_SNAPSHOT_FIELDS = """
+    dimensions {
+        date
+    }
+""" + ZONE_METRIC_FIELDS
+ZONE_HOURLY_FIELDS = """
+    dimensions {
+        datetime
+    }
+""" + ZONE_METRIC_FIELDS
+
+ZONE_SNAPSHOT_QUERY = """
+    query GetZoneSnapshots($zoneTags: [String!], $since: String!, $until: String!) {
+        viewer {
+            zones(filter: {zoneTag_in: $zoneTags}) {
+                zoneTag
+                httpRequests1dGroups(
+                    limit: 1000,
+                    filter: {date_geq: $since, date_leq: $until}
+                ) {
+                    %s
+                }
+            }
+        }
+    }
+""" % ZONE_SNAPSHOT_FIELDS
+
+ZONE_HOURLY_QUERY = """
+    query GetZoneHours($zoneTags: [String!], $since: Time!, $until: Time!) {
+        viewer {
+            zones(filter: {zoneTag_in: $zoneTags}) {
+                zoneTag
+                httpRequests1hGroups(
+                    limit: 1000,
+                    filter: {datetime_geq: $since, datetime_lt: $until}
+                ) {
+                    %s
+                }
+            }
+        }
+    }
+""" % ZONE_HOURLY_FIELDS
+# Distinct visitors of whole days, which cannot be added up from the hours
+ZONE_UNIQUES_QUERY = """
+    query GetZoneUniques($zoneTags: [String!], $since: String!, $until: String!) {
+        viewer {
+            zones(filter: {zoneTag_in: $zoneTags}) {
+                zoneTag
+                httpRequests1dGroups(
+                    limit: 1000,
+                    filter: {date_geq: $since, date_leq: $until}
+                ) {
+                    dimensions {
+                        date
+                    }
+                    uniq {
+                        uniques
+                    }
+                }
+            }
+        }
+    }
+"""
+HOUR_FORMAT = "%Y-%m-%dT%H:00:00Z"
+# API limits: zones accepted by zoneTag_in and rows returned by a single query
+MAX_ZONES_PER_QUERY = 10
+MAX_ROWS_PER_QUERY = 1000
+SNAPSHOT_MEMO_SIZE = 256
+SCALAR_METRICS = (
+    "requests",
+    "bytes",
+    "cached_requests",
+    "cached_bytes",
+    "encrypted_requests",
+    "encrypted_bytes",
+    "page_views",
+    "uniques",
+)
+MAP_METRICS = (
+    "country_requests",
+    "country_bytes",
+    "http_versions",
+    "ssl_protocols",
+    "content_types",
+    "status_codes",
+)
+# Frame columns with the requests per day of each range of status codes
+STATUS_CLASSES = {"status_4xx": (400, 500), "status_5xx": (500, 600)}
+_snapshot_memo = OrderedDict()
+
+
+@dataclass
+class DailyMetrics:
+    """
+    Every httpRequests1dGroups metric for one zone and one day.
+    Scalar fields are totals for the day, the map fields are {dimension: count} dicts.
+    """
 
-# Temporary settings and imports
-import dotenv as env
-from general_utils import execute_query, range_generator
+    date: str
+    requests: int = 0
+    bytes: int = 0
+    cached_requests: int = 0
+    cached_bytes: int = 0
+    encrypted_requests: int = 0
+    encrypted_bytes: int = 0
+    page_views: int = 0
+    uniques: int = 0
+    country_requests: dict = field(default_factory=dict)
+    country_bytes: dict = field(default_factory=dict)
+    http_versions: dict = field(default_factory=dict)
+    ssl_protocols: dict = field(default_factory=dict)
+    content_types: dict = field(default_factory=dict)
+    status_codes: dict = field(default_factory=dict)
+
+
+@dataclass
+class ZoneSnapshot:
+    """
+    Result of a single consolidated query for a zone and a date window.
+    """
 
-env.load_dotenv()
-TOKEN = os.getenv("CF_API_TOKEN")
-ATDAC_ID = os.getenv("ATDAC_ID")
-FLEX_ID = os.getenv("FLEX_ID")
-ID = os.getenv("ACCOUNT_ID")
-if not TOKEN:
-    raise ValueError("No token found in configuration")
+    zone_tag: str
+    since: str
+    until: str
+    days: list = field(default_factory=list)
+
+    def series(self, metric: str) -> dict:
+        """
+        Project a scalar metric as {date: value}.
+        Args:
+            metric (str): Name of a scalar DailyMetrics field, e.g. "requests".
+        Returns:
+            dict: Dates as keys and the metric for that day as values.
+        """
+        return {day.date: getattr(day, metric) for day in self.days}
+
+    def breakdown(self, dimension: str) -> dict:
+        """
+        Merge a map field over every day of the window.
+        Args:
+            dimension (str): Name of a map DailyMetrics field, e.g. "country_requests".
+        Returns:
+            dict: Dimension values as keys and their totals over the window as values.
+        """
+        return self.aggregate(dimension).counts
+
+    def aggregate(self, dimension: str) -> MapAggregate:
+        """
+        Merge a map field over every day of the window, as a partial aggregate that
+        can be merged with the ones of other windows or zones.
+        Args:
+            dimension (str): Name of a map DailyMetrics field, e.g. "country_requests".
+        Returns:
+            MapAggregate: Totals of the dimension over the window.
+        """
+        return MapAggregate.merge_all(getattr(day, dimension) for day in self.days)
+
+    @cached_property
+    def frame(self) -> MetricFrame:
+        """
+        Scalar metrics and the STATUS_CLASSES totals as columns, one row per day of
+        the window, days without data filled with 0. Built once per snapshot.
+        Returns:
+            MetricFrame: The columnar metrics.
+        """
+        columns = {
+            metric: [getattr(day, metric) for day in self.days]
+            for metric in SCALAR_METRICS
+        }
+        for name, (low, high) in STATUS_CLASSES.items():
+            columns[name] = [
+                sum(
+                    requests
+                    for status, requests in day.status_codes.items()
+                    if low <= int(status) < high
+                )
+                for day in self.days
+            ]
+        frame = MetricFrame([day.date for day in self.days], columns, self.zone_tag)
+        return frame.sorted().fill_gaps(self.since, self.until)
+
+    def digest(self) -> str:
+        """
+        Hash of the zone, the window and every daily metric, changes only when the data does.
+        Returns:
+            str: Hex digest.
+        """
+        payload = json.dumps(
+            [self.zone_tag, self.since, self.until, [asdict(day) for day in self.days]],
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
 
 
-# Stats Module
-def get_requests(zone_tag: str, leq_date: str, periods: int) -> dict:
+def _merge_map(entries: list, key_field: str, value_field: str) -> dict:
+    return MapAggregate.from_entries(entries, key_field, value_field).counts
+
+
+def parse_daily_groups(groups: list) -> list:
     """
-    Retrieve the total number of requests per day for a specific zone within a given time range.
+    Parse raw httpRequests1dGroups rows requested with ZONE_SNAPSHOT_FIELDS.
     Args:
-        zone_tag (str): Unique identifier for the Cloudflare zone.
+        groups (list): The httpRequests1dGroups array of one zone.
+    Returns:
+        list: DailyMetrics sorted by date.
+    Raises:
+        Exception: If a row does not have the expected shape.
+    """
+    return _parse_groups(groups, "date")
+
+
+def parse_hourly_groups(groups: list) -> list:
+    """
+    Parse raw httpRequests1hGroups rows requested with ZONE_HOURLY_FIELDS.
+    Args:
+        groups (list): The httpRequests1hGroups array of one zone.
+    Returns:
+        list: DailyMetrics sorted by hour, their date holds the hour (YYYY-MM-DDTHH:00:00Z).
+    Raises:
+        Exception: If a row does not have the expected shape.
+    """
+    return _parse_groups(groups, "datetime")
+
+
+def _parse_groups(groups: list, dimension: str) -> list:
+    try:
+        days = []
+        for item in groups:
+            sums = item["sum"]
+            countries = sums.get("countryMap") or []
+            days.append(
+                DailyMetrics(
+                    date=item["dimensions"][dimension],
+                    requests=sums["requests"],
+                    bytes=sums["bytes"],
+                    cached_requests=sums["cachedRequests"],
+                    cached_bytes=sums["cachedBytes"],
+                    encrypted_requests=sums["encryptedRequests"],
+                    encrypted_bytes=sums["encryptedBytes"],
+                    page_views=sums["pageViews"],
+                    uniques=item["uniq"]["uniques"],
+                    country_requests=_merge_map(
+                        countries, "clientCountryName", "requests"
+                    ),
+                    country_bytes=_merge_map(countries, "clientCountryName", "bytes"),
+                    http_versions=_merge_map(
+                        sums.get("clientHTTPVersionMap"),
+                        "clientHTTPProtocol",
+                        "requests",
+                    ),
+                    ssl_protocols=_merge_map(
+                        sums.get("clientSSLMap"), "clientSSLProtocol", "requests"
+                    ),
+                    content_types=_merge_map(
+                        sums.get("contentTypeMap"),
+                        "edgeResponseContentTypeName",
+                        "requests",
+                    ),
+                    status_codes=_merge_map(
+                        sums.get("responseStatusMap"), "edgeResponseStatus", "requests"
+                    ),
+                )
+            )
+        days.sort(key=lambda day: day.date)
+        return days
+    except (KeyError, IndexError, TypeError) as e:
+        raise Exception(f"Error processing response: {e}")
+
+
+def _chunk_plan(zone_count: int, periods: int) -> tuple:
+    """
+    Size the zone and day chunks so a query stays under the API limits.
+    Args:
+        zone_count (int): Number of zones to fetch.
+        periods (int): Number of days in the window.
+    Returns:
+        tuple: (zones per query, days per query).
+    """
+    days_per_query = max(1, min(periods, MAX_ROWS_PER_QUERY))
+    zones_per_query = max(
+        1, min(MAX_ZONES_PER_QUERY, zone_count, MAX_ROWS_PER_QUERY // days_per_query)
+    )
+    return zones_per_query, days_per_query
+
+
+def _plan_range(zone_tags: list, since: str, until: str) -> list:
+    zones_per_query, days_per_query = _chunk_plan(
+        len(zone_tags), len(date_range(since, until))
+    )
+    start = datetime.strptime(since, "%Y-%m-%d")
+    end = datetime.strptime(until, "%Y-%m-%d")
+    plan = []
+    while start <= end:
+        window_end = min(end, start + timedelta(days=days_per_query - 1))
+        for i in range(0, len(zone_tags), zones_per_query):
+            plan.append(
+                {
+                    "zoneTags": zone_tags[i : i + zones_per_query],
+                    "since": start.strftime("%Y-%m-%d"),
+                    "until": window_end.strftime("%Y-%m-%d"),
+                }
+            )
+        start = window_end + timedelta(days=1)
+    return plan
+
+
+def _contiguous_spans(dates: list) -> list:
+    spans = []
+    for date in dates:
+        previous = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=1)).strftime(
+            "%Y-%m-%d"
+        )
+        if spans and spans[-1][1] == previous:
+            spans[-1] = (spans[-1][0], date)
+        else:
+            spans.append((date, date))
+    return spans
+
+
+def plan_snapshot_queries(
+    zone_tags: list, leq_date: str, periods: int, store: MetricStore = None
+) -> list:
+    """
+    Split a multi-zone snapshot into the variables of every query it needs.
+    With a store, only the runs of days it is missing are planned, zones missing
+    the same days share their queries.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
         leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
         periods (int): Number of days before the end date to include in the range.
+        store (MetricStore): Local store with the days already collected.
     Returns:
-        dict: A dictionary containing dates as keys and their respective request counts as values.
+        list: One variables dict per ZONE_SNAPSHOT_QUERY call.
     """
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetZoneRequests($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        limit: 1000
-                        filter: {date_geq: $since, date_leq: $until}
-                    ) {
-                        dimensions {
-                            date
-                        }
-                        sum {
-                            requests
-                        }
-                    }
-                }
-            }
-        }
+    return plan_window_queries(zone_tags, [(leq_date, periods)], store)
+
+
+def plan_window_queries(
+    zone_tags: list, windows: list, store: MetricStore = None
+) -> list:
     """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
+    Same as plan_snapshot_queries for many windows at once, a day missing from
+    several overlapping windows, e.g. the last 7 and 30 days, is planned once.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        windows (list): (leq_date, periods) tuples.
+        store (MetricStore): Local store with the days already collected.
+    Returns:
+        list: One variables dict per ZONE_SNAPSHOT_QUERY call.
+    """
+    zone_tags = list(dict.fromkeys(zone_tags))
+    missing = {zone_tag: set() for zone_tag in zone_tags}
+    for leq_date, periods in windows:
+        range_generated = range_generator(leq_date, periods)
+        since = range_generated["geq_date"][:10]
+        until = range_generated["leq_date"][:10]
+        if since > until:
+            continue
+        for zone_tag in zone_tags:
+            if store is None:
+                missing[zone_tag].update(date_range(since, until))
+            else:
+                missing[zone_tag].update(store.missing_dates(zone_tag, since, until))
+    spans = {}
+    for zone_tag, dates in missing.items():
+        for span in _contiguous_spans(sorted(dates)):
+            spans.setdefault(span, []).append(zone_tag)
+    plan = []
+    for (span_since, span_until), span_zones in spans.items():
+        plan.extend(_plan_range(span_zones, span_since, span_until))
+    return plan
+
+
+def to_store_row(day: DailyMetrics) -> tuple:
+    """
+    Split a DailyMetrics into the (metrics, breakdowns) row of the MetricStore.
+    Args:
+        day (DailyMetrics): Metrics of a day or an hour.
+    Returns:
+        tuple: {metric: value} and {dimension: {key: value}} dicts.
+    """
+    return (
+        {metric: getattr(day, metric) for metric in SCALAR_METRICS},
+        {dimension: getattr(day, dimension) for dimension in MAP_METRICS},
+    )
+
+
+def _from_store_row(date: str, row: tuple) -> DailyMetrics:
+    metrics, breakdowns = row
+    return DailyMetrics(
+        date=date,
+        **{metric: metrics.get(metric, 0) for metric in SCALAR_METRICS},
+        **{dimension: breakdowns.get(dimension, {}) for dimension in MAP_METRICS},
+    )
+
+
+def build_zone_snapshots(
+    zone_tags: list,
+    leq_date: str,
+    periods: int,
+    plan: list,
+    responses: list,
+    store: MetricStore = None,
+) -> dict:
+    """
+    Assemble (and memoize) the snapshots from the responses of a query plan.
+    With a store, the responses are saved first and the full range is read back.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+        periods (int): Number of days before the end date to include in the range.
+        plan (list): Variables of every query, as returned by plan_snapshot_queries.
+        responses (list): Decoded responses of every planned query, in plan order.
+        store (MetricStore): Local store used to plan the queries.
+    Returns:
+        dict: Zone tags as keys and their ZoneSnapshot as values.
+    """
+    range_generated = range_generator(leq_date, periods)
+    since = range_generated["geq_date"][:10]
+    until = range_generated["leq_date"][:10]
+    zone_tags = list(dict.fromkeys(zone_tags))
+    groups = {zone_tag: [] for zone_tag in zone_tags}
+    covered = {zone_tag: set() for zone_tag in zone_tags}
     try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No request data available in the response.")
-        request_totals = zones[0]["httpRequests1dGroups"]
-        results = {
-            item["dimensions"]["date"]: item["sum"]["requests"]
-            for item in request_totals
-        }
-        return results
-    except (KeyError, IndexError) as e:
+        for variables, response in zip(plan, responses):
+            for zone_tag in variables["zoneTags"]:
+                covered.setdefault(zone_tag, set()).update(
+                    date_range(variables["since"], variables["until"])
+                )
+            for zone in response["data"]["viewer"]["zones"] or []:
+                groups.setdefault(zone["zoneTag"], []).extend(
+                    zone.get("httpRequests1dGroups") or []
+                )
+    except (KeyError, IndexError, TypeError) as e:
         raise Exception(f"Error processing response: {e}")
+    snapshots = {}
+    for zone_tag in zone_tags:
+        days = parse_daily_groups(groups[zone_tag])
+        if store is not None:
+            if covered[zone_tag]:
+                store.upsert_days(
+                    zone_tag,
+                    {day.date: to_store_row(day) for day in days},
+                    sorted(covered[zone_tag]),
+                )
+            days = [
+                _from_store_row(date, row)
+                for date, row in sorted(store.read_days(zone_tag, since, until).items())
+            ]
+        snapshot = ZoneSnapshot(zone_tag=zone_tag, since=since, until=until, days=days)
+        # Windows with days still being filled are read again on the next call
+        if until < final_before():
+            _snapshot_memo[(zone_tag, since, until)] = snapshot
+            _snapshot_memo.move_to_end((zone_tag, since, until))
+        snapshots[zone_tag] = snapshot
+    while len(_snapshot_memo) > SNAPSHOT_MEMO_SIZE:
+        _snapshot_memo.popitem(last=False)
+    return snapshots
+
+
+def get_zone_snapshots(
+    zone_tags: list,
+    leq_date: str,
+    periods: int,
+    store: MetricStore = None,
+    client: CloudflareClient = None,
+) -> dict:
+    """
+    Retrieve every daily metric of many zones within a given time range.
+    Days already saved in the local store are read from it, the API is only
+    queried for the missing ones. Zones are packed into zoneTag_in filters and
+    split into as few queries as the zone and row limits allow.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+        periods (int): Number of days before the end date to include in the range.
+        store (MetricStore): Local store, defaults to get_metric_store().
+        client (CloudflareClient): API client, defaults to get_cloudflare_client().
+    Returns:
+        dict: Zone tags as keys and their ZoneSnapshot as values.
+    """
+    store = store or get_metric_store()
+    client = client or get_cloudflare_client()
+    plan = plan_snapshot_queries(zone_tags, leq_date, periods, store)
+    responses = [client.query(ZONE_SNAPSHOT_QUERY, variables) for variables in plan]
+    return build_zone_snapshots(zone_tags, leq_date, periods, plan, responses, store)
 
 
-def get_requests_per_location(zone_tag: str, leq_date: str, periods: int) -> dict:
+def get_zone_snapshot(
+    zone_tag: str, leq_date: str, periods: int, store_only: bool = False
+):
+    """
+    Retrieve every daily metric of a zone within a given time range in one query.
+    Results of complete windows are memoized per zone and window, including the ones
+    fetched by get_zone_snapshots, so the get_* projections below share a single network
+    call. Recent windows are rebuilt from the store and the response cache.
+    Args:
+        zone_tag (str): Unique identifier for the Cloudflare zone.
+        leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+        periods (int): Number of days before the end date to include in the range.
+        store_only (bool): Never query the API, read the days as the local store
+            has them, even if they are not complete yet.
+    Returns:
+        ZoneSnapshot | None: Daily metrics of the zone for the range, with
+        store_only None when some day of the range was never collected.
+    """
     range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetRequestsLocations($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        filter: {date_geq: $since, date_leq: $until},
-                        limit: 1000
-                    ) {
-                        sum {
-                            countryMap {
-                                clientCountryName
-                                requests
-                            }
-                        }
-                    }
+    key = (zone_tag, range_generated["geq_date"][:10], range_generated["leq_date"][:10])
+    if key in _snapshot_memo:
+        _snapshot_memo.move_to_end(key)
+        return _snapshot_memo[key]
+    if store_only:
+        store = get_metric_store()
+        if store.missing_dates(*key, final_only=False):
+            return None
+        days = [
+            _from_store_row(date, row)
+            for date, row in sorted(store.read_days(*key).items())
+        ]
+        return ZoneSnapshot(zone_tag=zone_tag, since=key[1], until=key[2], days=days)
+    return get_zone_snapshots([zone_tag], leq_date, periods)[zone_tag]
+
+
+def plan_hourly_queries(zone_tags: list, since: str, until: str) -> list:
+    """
+    Variables of the ZONE_HOURLY_QUERY calls for many zones and an hour range,
+    chunked to the zone and row limits like the daily plan.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        since (str): First hour (inclusive) as YYYY-MM-DDTHH:00:00Z.
+        until (str): End of the range (exclusive), any ISO 8601 UTC time.
+    Returns:
+        list: Variables dicts with zoneTags, since and until.
+    """
+    start = datetime.strptime(since, HOUR_FORMAT)
+    end = datetime.strptime(until[:19], "%Y-%m-%dT%H:%M:%S")
+    hours = max(1, -(-int((end - start).total_seconds()) // 3600))
+    zones_per_query, hours_per_query = _chunk_plan(len(zone_tags), hours)
+    plan = []
+    while start < end:
+        window_end = min(end, start + timedelta(hours=hours_per_query))
+        for i in range(0, len(zone_tags), zones_per_query):
+            plan.append(
+                {
+                    "zoneTags": zone_tags[i : i + zones_per_query],
+                    "since": start.strftime(HOUR_FORMAT),
+                    "until": window_end.strftime("%Y-%m-%dT%H:%M:%SZ"),
                 }
-            }
-        }
+            )
+        start = window_end
+    return plan
+
+
+def get_zone_hours(
+    zone_tags: list, since: str, until: str, client: CloudflareClient = None
+) -> dict:
+    """
+    Retrieve every hourly metric of many zones within an hour range.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        since (str): First hour (inclusive) as YYYY-MM-DDTHH:00:00Z.
+        until (str): End of the range (exclusive), any ISO 8601 UTC time.
+        client (CloudflareClient): API client, defaults to get_cloudflare_client().
+    Returns:
+        dict: Zone tags as keys and their DailyMetrics per hour as values.
+    """
+    client = client or get_cloudflare_client()
+    hours = {zone_tag: [] for zone_tag in zone_tags}
+    for variables in plan_hourly_queries(list(hours), since, until):
+        response = client.query(ZONE_HOURLY_QUERY, variables)
+        try:
+            zones = response["data"]["viewer"]["zones"] or []
+        except (KeyError, TypeError) as e:
+            raise Exception(f"Error processing response: {e}")
+        for zone in zones:
+            if zone["zoneTag"] in hours:
+                hours[zone["zoneTag"]].extend(
+                    parse_hourly_groups(zone.get("httpRequests1hGroups") or [])
+                )
+    return hours
+
+
+def get_zone_uniques(
+    zone_tags: list, since: str, until: str, client: CloudflareClient = None
+) -> dict:
+    """
+    Retrieve only the daily distinct visitors of many zones, for the days rolled
+    up from hourly data.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        since (str): First date (YYYY-MM-DD).
+        until (str): Last date (YYYY-MM-DD), inclusive.
+        client (CloudflareClient): API client, defaults to get_cloudflare_client().
+    Returns:
+        dict: Zone tags as keys and {date: uniques} dicts as values, every date of
+        the range is present, 0 when the zone had no traffic.
     """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
+    client = client or get_cloudflare_client()
+    zone_tags = list(dict.fromkeys(zone_tags))
+    uniques = {
+        zone_tag: dict.fromkeys(date_range(since, until), 0) for zone_tag in zone_tags
     }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No location data available in the response.")
-        location_totals = zones[0]["httpRequests1dGroups"]
-        results = {}
-        for daily in location_totals:
-            for country in daily["sum"]["countryMap"]:
-                country_name = country["clientCountryName"]
-                requests = country["requests"]
-                results[country_name] = results.get(country_name, 0) + requests
-        sorted_results = dict(
-            sorted(results.items(), key=lambda item: item[1], reverse=True)[:10]
-        )
-        return sorted_results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    if since > until:
+        return uniques
+    for variables in _plan_range(zone_tags, since, until):
+        response = client.query(ZONE_UNIQUES_QUERY, variables)
+        try:
+            zones = response["data"]["viewer"]["zones"] or []
+        except (KeyError, TypeError) as e:
+            raise Exception(f"Error processing response: {e}")
+        for zone in zones:
+            for item in zone.get("httpRequests1dGroups") or []:
+                uniques[zone["zoneTag"]][item["dimensions"]["date"]] = item["uniq"][
+                    "uniques"
+                ]
+    return uniques
+
+
+def _require_days(snapshot: ZoneSnapshot, message: str) -> ZoneSnapshot:
+    if not snapshot.days:
+        raise ValueError(message)
+    return snapshot
+
+
+def top_n(results: dict, n: int = TOP_N, other_label: str = None) -> dict:
+    """
+    Keep the n largest entries of a {key: value} dict, largest first.
+    With other_label the rest is summed under that key, see aggregate_utils.top_k.
+    """
+    return top_k(results, n, other_label)
+
+
+# Stats Module
+def get_requests(zone_tag: str, leq_date: str, periods: int) -> dict:
+    """
+    Retrieve the total number of requests per day for a specific zone within a given time range.
+    Args:
+        zone_tag (str): Unique identifier for the Cloudflare zone.
+        leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+        periods (int): Number of days before the end date to include in the range.
+    Returns:
+        dict: A dictionary containing dates as keys and their respective request counts as values.
+    """
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No request data available in the response.",
+    )
+    return snapshot.series("requests")
+
+
+def get_requests_per_location(zone_tag: str, leq_date: str, periods: int) -> dict:
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No location data available in the response.",
+    )
+    return top_n(snapshot.breakdown("country_requests"))
 
 
 def get_bandwidth(zone_tag: str, leq_date: str, periods: int) -> dict:
@@ -146,44 +769,11 @@ def get_bandwidth(zone_tag: str, leq_date: str, periods: int) -> dict:
     Returns:
         dict: A dictionary containing dates as keys and their respective bandwidth (in bytes) as values.
     """
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetZoneBandwidth($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        limit: 1000,
-                        filter: {date_geq: $since, date_leq: $until}
-                    ) {
-                        dimensions {
-                            date
-                        }
-                        sum {
-                            bytes
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No bandwidth data available in the response.")
-        bandwidth_totals = zones[0]["httpRequests1dGroups"]
-        results = {
-            item["dimensions"]["date"]: item["sum"]["bytes"]
-            for item in bandwidth_totals
-        }
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No bandwidth data available in the response.",
+    )
+    return snapshot.series("bytes")
 
 
 def get_bandwidth_per_location(zone_tag: str, leq_date: str, periods: int) -> dict:
@@ -196,49 +786,11 @@ def get_bandwidth_per_location(zone_tag: str, leq_date: str, periods: int) -> di
     Returns:
         dict: A dictionary containing countries as keys and their respective bandwidth (in bytes) as values.
     """
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetBandwidthLocations($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        filter: {date_geq: $since, date_leq: $until},
-                        limit: 1000
-                    ) {
-                        sum {
-                            countryMap {
-                                clientCountryName
-                                bytes
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No bandwidth data available in the response.")
-        location_totals = zones[0]["httpRequests1dGroups"]
-        results = {}
-        for daily in location_totals:
-            for country in daily["sum"]["countryMap"]:
-                country_name = country["clientCountryName"]
-                bandwidth = country["bytes"]
-                results[country_name] = results.get(country_name, 0) + bandwidth
-        sorted_results = dict(
-            sorted(results.items(), key=lambda item: item[1], reverse=True)[:10]
-        )
-        return sorted_results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No bandwidth data available in the response.",
+    )
+    return top_n(snapshot.breakdown("country_bytes"))
 
 
 def get_visits(zone_tag: str, leq_date: str, periods: int) -> dict:
@@ -251,478 +803,108 @@ def get_visits(zone_tag: str, leq_date: str, periods: int) -> dict:
     Returns:
         dict: A dictionary containing dates as keys and their respective visit counts as values.
     """
-    range_generated = range_generator(leq_date, periods)
-
-    query = """
-        query GetZoneVisits($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        limit: 1000,
-                        filter: {date_geq: $since, date_leq: $until}
-                    ) {
-                        dimensions {
-                            date
-                        }
-                        uniq {
-                            uniques
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No visit data available in the response.")
-        visit_totals = zones[0]["httpRequests1dGroups"]
-        results = {
-            item["dimensions"]["date"]: item["uniq"]["uniques"] for item in visit_totals
-        }
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No visit data available in the response.",
+    )
+    return snapshot.series("uniques")
 
 
 def get_views(zone_tag: str, leq_date: str, periods: int) -> dict:
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetZonePageViews($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        limit: 1000,
-                        filter: {date_geq: $since, date_leq: $until}
-                    ) {
-                        dimensions {
-                            date
-                        }
-                        sum {
-                            pageViews
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No page view data available in the response.")
-        view_totals = zones[0]["httpRequests1dGroups"]
-        results = {
-            item["dimensions"]["date"]: item["sum"]["pageViews"] for item in view_totals
-        }
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No page view data available in the response.",
+    )
+    return snapshot.series("page_views")
 
 
 # Network Module
 def get_http_versions(zone_tag: str, leq_date: str, periods: int) -> dict:
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetHttpProtocols($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        filter: {date_geq: $since, date_leq: $until},
-                        limit: 1000
-                    ) {
-                        dimensions {
-                            date
-                        }
-                        sum {
-                            clientHTTPVersionMap {
-                                requests
-                                clientHTTPProtocol
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No HTTP protocols data available in the response.")
-        protocol_totals = zones[0]["httpRequests1dGroups"]
-        results = {}
-        for daily in protocol_totals:
-            for protocol in daily["sum"]["clientHTTPVersionMap"]:
-                proto = protocol["clientHTTPProtocol"]
-                req_count = protocol["requests"]
-                results[proto] = results.get(proto, 0) + req_count
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No HTTP protocols data available in the response.",
+    )
+    return snapshot.breakdown("http_versions")
 
 
 def get_ssl_traffic(zone_tag: str, leq_date: str, periods: int) -> dict:
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetSSLTraffic($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        filter: {date_geq: $since, date_leq: $until},
-                        limit: 1000
-                    ) {
-                        sum {
-                            clientSSLMap {
-                                requests
-                                clientSSLProtocol
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No SSL data available in the response.")
-        ssl_totals = zones[0]["httpRequests1dGroups"]
-        results = {}
-        for daily in ssl_totals:
-            for protocol in daily["sum"]["clientSSLMap"]:
-                ssl_proto = protocol["clientSSLProtocol"]
-                requests = protocol["requests"]
-                results[ssl_proto] = results.get(ssl_proto, 0) + requests
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No SSL data available in the response.",
+    )
+    return snapshot.breakdown("ssl_protocols")
 
 
 def get_content_type(zone_tag: str, leq_date: str, periods: int) -> dict:
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetContentTypes($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        filter: {date_geq: $since, date_leq: $until},
-                        limit: 1000
-                    ) {
-                        sum {
-                            contentTypeMap {
-                                requests
-                                edgeResponseContentTypeName
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No content type data available in the response.")
-        content_totals = zones[0]["httpRequests1dGroups"]
-        results = {}
-        for daily in content_totals:
-            for content in daily["sum"]["contentTypeMap"]:
-                content_type = content["edgeResponseContentTypeName"]
-                requests = content["requests"]
-                results[content_type] = results.get(content_type, 0) + requests
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No content type data available in the response.",
+    )
+    return snapshot.breakdown("content_types")
 
 
 def get_cached_requests(zone_tag: str, leq_date: str, periods: int) -> dict:
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetCachedRequests($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        filter: {date_geq: $since, date_leq: $until},
-                        limit: 1000
-                    ) {
-                        dimensions {
-                            date
-                        }
-                        sum {
-                            cachedRequests
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No cached requests data available in the response.")
-        cached_requests = zones[0]["httpRequests1dGroups"]
-        results = {
-            item["dimensions"]["date"]: item["sum"]["cachedRequests"]
-            for item in cached_requests
-        }
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No cached requests data available in the response.",
+    )
+    return snapshot.series("cached_requests")
 
 
 def get_cached_bandwidth(zone_tag: str, leq_date: str, periods: int) -> dict:
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetCachedBandwidth($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        filter: {date_geq: $since, date_leq: $until},
-                        limit: 1000
-                    ) {
-                        dimensions {
-                            date
-                        }
-                        sum {
-                            cachedBytes
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No cached bandwidth data available in the response.")
-        cached_bandwidth = zones[0]["httpRequests1dGroups"]
-        results = {
-            item["dimensions"]["date"]: item["sum"]["cachedBytes"]
-            for item in cached_bandwidth
-        }
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No cached bandwidth data available in the response.",
+    )
+    return snapshot.series("cached_bytes")
 
 
 # Security Module
 def get_encrypted_bandwidth(zone_tag: str, leq_date: str, periods: int) -> dict:
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetEncryptedBandwidth($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        filter: {date_geq: $since, date_leq: $until},
-                        limit: 1000
-                    ) {
-                        dimensions {
-                            date
-                        }
-                        sum {
-                            encryptedBytes
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No encrypted bandwidth data available in the response.")
-        encrypted_bandwidth = zones[0]["httpRequests1dGroups"]
-        results = {
-            item["dimensions"]["date"]: item["sum"]["encryptedBytes"]
-            for item in encrypted_bandwidth
-        }
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No encrypted bandwidth data available in the response.",
+    )
+    return snapshot.series("encrypted_bytes")
 
 
 def get_encrypted_requests(zone_tag: str, leq_date: str, periods: int) -> dict:
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetEncryptedRequests($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        filter: {date_geq: $since, date_leq: $until},
-                        limit: 1000
-                    ) {
-                        dimensions {
-                            date
-                        }
-                        sum {
-                            encryptedRequests
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No encrypted request data available in the response.")
-        encrypted_requests = zones[0]["httpRequests1dGroups"]
-        results = {
-            item["dimensions"]["date"]: item["sum"]["encryptedRequests"]
-            for item in encrypted_requests
-        }
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No encrypted request data available in the response.",
+    )
+    return snapshot.series("encrypted_requests")
 
 
 # Error Module
-def get_fourxx_errors(zone_tag: str, leq_date: str, periods: int) -> dict:
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetFourXXErrors($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        filter: {date_geq: $since, date_leq: $until},
-                        limit: 1000
-                    ) {
-                        dimensions {
-                            date
-                        }
-                        sum {
-                            responseStatusMap {
-                                requests
-                                edgeResponseStatus
-                            }
-                        }
-                    }
-                }
-            }
-        }
+def status_totals(snapshot: ZoneSnapshot, low: int, high: int) -> dict:
+    """
+    Requests per day whose status code is in [low, high).
     """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
     try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No 4xx error data available in the response.")
-        error_stats = zones[0]["httpRequests1dGroups"]
-        results = {}
-        for daily in error_stats:
-            date = daily["dimensions"]["date"]
-            total_4xx = sum(
-                status["requests"]
-                for status in daily["sum"]["responseStatusMap"]
-                if 400 <= int(status["edgeResponseStatus"]) < 500
+        return {
+            day.date: sum(
+                requests
+                for status, requests in day.status_codes.items()
+                if low <= int(status) < high
             )
-            results[date] = total_4xx
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response for 4xx errors: {e}")
+            for day in snapshot.days
+        }
+    except (ValueError, TypeError) as e:
+        raise Exception(f"Error processing response for {low // 100}xx errors: {e}")
+
+
+def get_fourxx_errors(zone_tag: str, leq_date: str, periods: int) -> dict:
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No 4xx error data available in the response.",
+    )
+    return status_totals(snapshot, 400, 500)
 
 
 def get_fivexx_errors(zone_tag: str, leq_date: str, periods: int) -> dict:
-    range_generated = range_generator(leq_date, periods)
-    query = """
-        query GetFiveXXErrors($zoneTag: String!, $since: String!, $until: String!) {
-            viewer {
-                zones(filter: {zoneTag_in: [$zoneTag]}) {
-                    httpRequests1dGroups(
-                        filter: {date_geq: $since, date_leq: $until},
-                        limit: 1000
-                    ) {
-                        dimensions {
-                            date
-                        }
-                        sum {
-                            responseStatusMap {
-                                requests
-                                edgeResponseStatus
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    """
-    variables = {
-        "zoneTag": zone_tag,
-        "since": range_generated["geq_date"][:10],
-        "until": range_generated["leq_date"][:10],
-    }
-    response = execute_query(TOKEN, query, variables)
-    try:
-        zones = response["data"]["viewer"]["zones"]
-        if not zones or not zones[0].get("httpRequests1dGroups"):
-            raise ValueError("No 5xx error data available in the response.")
-        error_stats = zones[0]["httpRequests1dGroups"]
-        results = {}
-        for daily in error_stats:
-            date = daily["dimensions"]["date"]
-            total_5xx = sum(
-                status["requests"]
-                for status in daily["sum"]["responseStatusMap"]
-                if 500 <= int(status["edgeResponseStatus"]) < 600
-            )
-            results[date] = total_5xx
-        return results
-    except (KeyError, IndexError, TypeError) as e:
-        raise Exception(f"Error processing response for 5xx errors: {e}")
+    snapshot = _require_days(
+        get_zone_snapshot(zone_tag, leq_date, periods),
+        "No 5xx error data available in the response.",
+    )
+    return status_totals(snapshot, 500, 600)
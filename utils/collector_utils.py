@@ -0,0 +1,177 @@
+"""
+V1 incremental collectors, daily for the daily cron and hourly for the hourly one
+"""
+
+__version__ = "1.4.0"
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from cloudflare_utils import (
+    HOUR_FORMAT,
+    get_zone_hours,
+    get_zone_snapshots,
+    get_zone_uniques,
+    to_store_row,
+)
+from config_utils import get_cloudflare_client
+from db_utils import (
+    MetricStore,
+    date_range,
+    final_before,
+    get_metric_store,
+    shift_date,
+    utc_today,
+)
+
+# Free plan: the API only answers for the last 7 days
+BACKFILL_DAYS = 7
+# Hours newer than this are still being filled by Cloudflare and are fetched again
+FINALIZE_HOURS = 2
+# Zones never collected start at midnight this many hours back, so their days are whole
+BACKFILL_HOURS = 24
+
+
+def plan_incremental(
+    zone_tags: list, store: MetricStore, today: str, backfill_days: int = BACKFILL_DAYS
+) -> dict:
+    """
+    Group the zones by the first day they still need.
+    The first day is the one after the zone high-water mark (its last final day),
+    limited to the last backfill_days days for zones never collected.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        store (MetricStore): Local store with the days already collected.
+        today (str): Last day to collect (YYYY-MM-DD).
+        backfill_days (int): How far back a zone can be collected.
+    Returns:
+        dict: First dates as keys and the zone tags starting there as values.
+    """
+    end = datetime.strptime(today, "%Y-%m-%d")
+    oldest = (end - timedelta(days=backfill_days - 1)).strftime("%Y-%m-%d")
+    starts = {}
+    for zone_tag in dict.fromkeys(zone_tags):
+        mark = store.high_water_mark(zone_tag)
+        start = oldest
+        if mark:
+            next_day = datetime.strptime(mark, "%Y-%m-%d") + timedelta(days=1)
+            start = max(oldest, next_day.strftime("%Y-%m-%d"))
+        if start <= today:
+            starts.setdefault(start, []).append(zone_tag)
+    return starts
+
+
+def collect_incremental(
+    zone_tags: list,
+    today: str = None,
+    store: MetricStore = None,
+    backfill_days: int = BACKFILL_DAYS,
+) -> dict:
+    """
+    Fetch only the days after each zone high-water mark, the days that are not
+    final yet (see db_utils.FINALIZE_DAYS) are fetched again on the next run.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        today (str): Last day to collect (YYYY-MM-DD), defaults to today (UTC).
+        store (MetricStore): Local store, defaults to get_metric_store().
+        backfill_days (int): How far back a zone can be collected.
+    Returns:
+        dict: Zone tags as keys and the first date collected for them as values.
+    """
+    today = today or utc_today()
+    store = store or get_metric_store()
+    end = datetime.strptime(today, "%Y-%m-%d")
+    collected = {}
+    for start, zones in plan_incremental(
+        zone_tags, store, today, backfill_days
+    ).items():
+        periods = (end - datetime.strptime(start, "%Y-%m-%d")).days + 1
+        get_zone_snapshots(zones, today, periods, store)
+        for zone_tag in zones:
+            collected[zone_tag] = start
+    return collected
+
+
+def _pending_dates(store: MetricStore, zone_tag: str, since: str, until: str) -> list:
+    # Days rolled up from their hours before they were final, again until they are
+    return [
+        date
+        for date in store.missing_dates(zone_tag, since, until)
+        if store.read_hours(zone_tag, date, shift_date(date, 1))
+    ]
+
+
+def collect_hourly(
+    zone_tags: list,
+    now: datetime = None,
+    store: MetricStore = None,
+    backfill_hours: int = BACKFILL_HOURS,
+) -> dict:
+    """
+    Fetch the hours after each zone hourly high-water mark up to now, including
+    the current partial hour, then roll the touched days up into the daily rows.
+    The last FINALIZE_HOURS hours are fetched again on the next run. Run every
+    hour, this replaces the daily collector: a spike shows up in the dashboards
+    within the hour, the daily dataset is only queried for the distinct visitors
+    of the days that became complete, which cannot be added up from the hours.
+    A day is complete once its hours are and it is final for the daily collector
+    too (see db_utils.final_before), until then it is rolled up on every run.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        now (datetime): End of the range, defaults to the current UTC time.
+        store (MetricStore): Local store, defaults to get_metric_store().
+        backfill_hours (int): How far back a zone never collected starts.
+    Returns:
+        dict: Zone tags as keys and the first hour collected for them as values.
+    """
+    now = (now or datetime.now(timezone.utc)).replace(tzinfo=None)
+    store = store or get_metric_store()
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    final_until = (current_hour - timedelta(hours=FINALIZE_HOURS - 1)).strftime(
+        HOUR_FORMAT
+    )
+    today = now.strftime("%Y-%m-%d")
+    final_date = min(final_until[:10], final_before(today))
+    oldest = (current_hour - timedelta(hours=backfill_hours)).replace(hour=0)
+    starts = {}
+    for zone_tag in dict.fromkeys(zone_tags):
+        start = store.hourly_high_water_mark(zone_tag) or oldest.strftime(HOUR_FORMAT)
+        starts.setdefault(start, []).append(zone_tag)
+    until = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+    collected = {}
+    for start, zones in starts.items():
+        first_pending = shift_date(today, 1 - BACKFILL_DAYS)
+        dates = {}
+        for zone_tag in zones:
+            pending = _pending_dates(store, zone_tag, first_pending, start[:10])
+            dates[zone_tag] = sorted({*pending, *date_range(start[:10], until[:10])})
+        complete = sorted(
+            {date for days in dates.values() for date in days if date < final_date}
+        )
+        uniques = get_zone_uniques(zones, complete[0], complete[-1]) if complete else {}
+        for zone_tag, hours in get_zone_hours(zones, start, until).items():
+            store.upsert_hours(
+                zone_tag,
+                {hour.date: to_store_row(hour) for hour in hours},
+                start,
+                until,
+                final_until,
+            )
+            distinct = {
+                date: {"uniques": value}
+                for date, value in uniques.get(zone_tag, {}).items()
+            }
+            store.rollup_hours(zone_tag, dates[zone_tag], final_date, distinct)
+            collected[zone_tag] = start
+    return collected
+
+
+if __name__ == "__main__":
+    env_zones = os.getenv("CF_ZONE_TAGS")
+    if env_zones:
+        zone_tags = [zone.strip() for zone in env_zones.split(",") if zone.strip()]
+    else:
+        zone_tags = list(get_cloudflare_client().zones().values())
+    collect = collect_hourly if "--hourly" in sys.argv else collect_incremental
+    for zone_tag, start in collect(zone_tags).items():
+        print(f"{zone_tag}: collected from {start}")
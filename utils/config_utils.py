@@ -0,0 +1,143 @@
+"""
+V1 Cloudflare API client, its configuration is read on first use instead of at import time
+"""
+
+__version__ = "1.2.0"
+import os
+import threading
+from dataclasses import dataclass
+
+from general_utils import DEFAULT_TIMEOUT, execute_query, get_accounts, get_zones
+
+DEFAULT_API_URL = "https://api.cloudflare.com/client/v4"
+
+_client = None
+_client_lock = threading.Lock()
+_settings_loaded = False
+_settings_lock = threading.Lock()
+
+
+def load_settings() -> None:
+    """
+    Read the .env file of the working directory into the environment, once per
+    process. Variables already set are not overridden.
+    """
+    global _settings_loaded
+    with _settings_lock:
+        if not _settings_loaded:
+            import dotenv
+
+            dotenv.load_dotenv(dotenv.find_dotenv(usecwd=True))
+            _settings_loaded = True
+
+
+@dataclass(frozen=True)
+class CloudflareClient:
+    """
+    Credentials and endpoint of the Cloudflare API, passed around explicitly
+    instead of module globals, so the utils can be imported without a token.
+    """
+
+    token: str
+    api_url: str = DEFAULT_API_URL
+    account_id: str = None
+
+    def __post_init__(self):
+        if not self.token:
+            raise ValueError("No token found in configuration")
+
+    def __repr__(self) -> str:
+        return f"CloudflareClient(api_url={self.api_url!r}, account_id={self.account_id!r})"
+
+    @classmethod
+    def from_env(cls, load_dotenv: bool = True):
+        """
+        Client configured from the environment: CF_API_TOKEN, CF_API_URL and ACCOUNT_ID.
+        Args:
+            load_dotenv (bool): Read the .env file first, it does not override
+                variables already set.
+        Returns:
+            CloudflareClient: The client.
+        Raises:
+            ValueError: If there is no token.
+        """
+        if load_dotenv:
+            load_settings()
+        return cls(
+            token=os.getenv("CF_API_TOKEN"),
+            api_url=os.getenv("CF_API_URL", DEFAULT_API_URL),
+            account_id=os.getenv("ACCOUNT_ID"),
+        )
+
+    def query(
+        self, query: str, variables: dict, timeout=DEFAULT_TIMEOUT, use_cache=True
+    ) -> dict:
+        """
+        Execute a GraphQL query, see general_utils.execute_query.
+        Args:
+            query (str): GraphQL query string.
+            variables (dict): Variables for the query.
+            timeout (float | tuple): Requests timeout, (connect, read) seconds.
+            use_cache (bool): Serve and store the response in the response cache.
+        Returns:
+            dict: The decoded response.
+        """
+        return execute_query(
+            self.token, query, variables, timeout, use_cache, api_url=self.api_url
+        )
+
+    def zones(self) -> dict:
+        """
+        Zones of the token.
+        Returns:
+            dict: Zone names as keys and their IDs as values.
+        """
+        return get_zones(self.token, self.api_url)
+
+    def accounts(self) -> dict:
+        """
+        Accounts of the token.
+        Returns:
+            dict: Account names as keys and their IDs as values.
+        """
+        return get_accounts(self.token, self.api_url)
+
+
+def get_cloudflare_client() -> CloudflareClient:
+    """
+    Process wide client, configured from the environment on the first call.
+    Returns:
+        CloudflareClient: The shared client.
+    Raises:
+        ValueError: If there is no token.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CloudflareClient.from_env()
+        return _client
+
+
+def default_api_url() -> str:
+    """
+    API base URL of the process wide client, or of the environment (and .env)
+    when there is no token to configure that client.
+    Returns:
+        str: The URL, CF_API_URL or DEFAULT_API_URL.
+    """
+    try:
+        return get_cloudflare_client().api_url
+    except ValueError:
+        load_settings()
+        return os.getenv("CF_API_URL", DEFAULT_API_URL)
+
+
+def set_cloudflare_client(client: CloudflareClient = None) -> None:
+    """
+    Replace the process wide client, e.g. to point it at a stand-in server.
+    Args:
+        client (CloudflareClient): The new client, None to read the environment again.
+    """
+    global _client
+    with _client_lock:
+        _client = client
@@ -0,0 +1,686 @@
+"""
+V1 functions neccesary to persist the daily snapshots
+"""
+
+__version__ = "1.6.0"
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+from aggregate_utils import MapAggregate
+
+DB_PATH = os.getenv("CF_METRICS_DB", "data/metrics.db")
+# Days newer than this are still being filled by Cloudflare and are fetched again
+FINALIZE_DAYS = 2
+# Zone tag of the rollups over every zone
+ALL_ZONES = "*"
+# Distinct counts cannot be added across days or zones
+NON_ADDITIVE_METRICS = ("uniques",)
+# Ingest events kept for the dashboards that reconnect with Last-Event-ID
+EVENTS_KEPT = 10000
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS daily_metrics (
+        zone_tag TEXT NOT NULL,
+        date TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY (zone_tag, metric, date)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS daily_metrics_zone_date
+        ON daily_metrics (zone_tag, date);
+    CREATE TABLE IF NOT EXISTS daily_breakdowns (
+        zone_tag TEXT NOT NULL,
+        date TEXT NOT NULL,
+        dimension TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY (zone_tag, date, dimension, key)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS collected_days (
+        zone_tag TEXT NOT NULL,
+        date TEXT NOT NULL,
+        collected_at TEXT NOT NULL,
+        final INTEGER NOT NULL,
+        PRIMARY KEY (zone_tag, date)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS metric_rollups (
+        period TEXT NOT NULL,
+        zone_tag TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        start TEXT NOT NULL,
+        value INTEGER NOT NULL,
+        PRIMARY KEY (period, zone_tag, metric, start)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS hourly_metrics (
+        zone_tag TEXT NOT NULL,
+        hour TEXT NOT NULL,
+        metrics TEXT NOT NULL,
+        breakdowns TEXT NOT NULL,
+        PRIMARY KEY (zone_tag, hour)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS hourly_marks (
+        zone_tag TEXT PRIMARY KEY,
+        collected_until TEXT NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS ingest_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        zone_tag TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        changes TEXT NOT NULL
+    );
+"""
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def date_range(since: str, until: str) -> list:
+    """
+    Every date between two ISO dates, both included.
+    Args:
+        since (str): First date (YYYY-MM-DD).
+        until (str): Last date (YYYY-MM-DD).
+    Returns:
+        list: ISO dates.
+    """
+    start = datetime.strptime(since, "%Y-%m-%d")
+    end = datetime.strptime(until, "%Y-%m-%d")
+    return [
+        (start + timedelta(days=i)).strftime("%Y-%m-%d")
+        for i in range((end - start).days + 1)
+    ]
+
+
+def utc_today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def week_start(date: str) -> str:
+    """
+    Monday of the ISO week of a date.
+    Args:
+        date (str): ISO date (YYYY-MM-DD).
+    Returns:
+        str: ISO date of the Monday.
+    """
+    day = datetime.strptime(date, "%Y-%m-%d")
+    return (day - timedelta(days=day.weekday())).strftime("%Y-%m-%d")
+
+
+def shift_date(date: str, days: int) -> str:
+    """
+    Add days to an ISO date.
+    Args:
+        date (str): ISO date (YYYY-MM-DD).
+        days (int): Days to add, negative to go back.
+    Returns:
+        str: ISO date.
+    """
+    return (datetime.strptime(date, "%Y-%m-%d") + timedelta(days=days)).strftime(
+        "%Y-%m-%d"
+    )
+
+
+def final_before(today: str = None) -> str:
+    """
+    First date that is not complete yet: the last FINALIZE_DAYS days up to today.
+    Args:
+        today (str): Reference date (YYYY-MM-DD), defaults to today (UTC).
+    Returns:
+        str: ISO date, every date before it is final.
+    """
+    today = datetime.strptime(today or utc_today(), "%Y-%m-%d")
+    return (today - timedelta(days=FINALIZE_DAYS - 1)).strftime("%Y-%m-%d")
+
+
+class MetricStore:
+    """
+    SQLite file holding one row per zone, date and metric, plus the per-day
+    breakdowns (countries, protocols...) and a log of the collected days.
+    The daily totals over every zone and the weekly totals are kept in
+    metric_rollups, refreshed by upsert_days, so the dashboards never add up
+    the daily rows of every client. Every upsert that changes a metric logs
+    the changes in ingest_events, which the dashboards tail. Hourly metrics
+    are kept as one row per zone and hour, with its metrics and breakdowns as
+    JSON, and rolled up into the daily rows by rollup_hours.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        rollups = self.conn.execute("SELECT 1 FROM metric_rollups LIMIT 1").fetchone()
+        metrics = self.conn.execute("SELECT 1 FROM daily_metrics LIMIT 1").fetchone()
+        if metrics and not rollups:
+            self.rebuild_rollups()
+
+    def upsert_days(
+        self, zone_tag: str, days: dict, collected_dates: list, final_date: str = None
+    ) -> None:
+        """
+        Insert or replace the metrics of a zone, idempotently.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+            days (dict): Dates as keys, (metrics, breakdowns) tuples as values where
+                metrics is {metric: value} and breakdowns is {dimension: {key: value}}.
+            collected_dates (list): Every date the query covered, with or without data.
+            final_date (str): Dates before this one are complete, defaults to final_before().
+        """
+        final_date = final_date or final_before()
+        collected_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        with self.lock, self.conn:
+            changes = self._changes(zone_tag, days)
+            for date in collected_dates:
+                self.conn.execute(
+                    "DELETE FROM daily_breakdowns WHERE zone_tag = ? AND date = ?",
+                    (zone_tag, date),
+                )
+            self.conn.executemany(
+                """
+                INSERT INTO daily_metrics (zone_tag, date, metric, value)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (zone_tag, metric, date) DO UPDATE SET value = excluded.value
+                """,
+                [
+                    (zone_tag, date, metric, value)
+                    for date, (metrics, _) in days.items()
+                    for metric, value in metrics.items()
+                ],
+            )
+            self.conn.executemany(
+                """
+                INSERT INTO daily_breakdowns (zone_tag, date, dimension, key, value)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (zone_tag, date, dimension, key)
+                DO UPDATE SET value = excluded.value
+                """,
+                [
+                    (zone_tag, date, dimension, str(key), value)
+                    for date, (_, breakdowns) in days.items()
+                    for dimension, values in breakdowns.items()
+                    for key, value in values.items()
+                ],
+            )
+            self.conn.executemany(
+                """
+                INSERT INTO collected_days (zone_tag, date, collected_at, final)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (zone_tag, date) DO UPDATE SET
+                    collected_at = excluded.collected_at,
+                    final = excluded.final
+                """,
+                [
+                    (zone_tag, date, collected_at, int(date < final_date))
+                    for date in collected_dates
+                ],
+            )
+            self._refresh_rollups(zone_tag, sorted(set(collected_dates) | set(days)))
+            if changes:
+                cursor = self.conn.execute(
+                    "INSERT INTO ingest_events (zone_tag, created_at, changes) VALUES (?, ?, ?)",
+                    (zone_tag, collected_at, json.dumps(changes)),
+                )
+                self.conn.execute(
+                    "DELETE FROM ingest_events WHERE id <= ?",
+                    (cursor.lastrowid - EVENTS_KEPT,),
+                )
+
+    def _changes(self, zone_tag: str, days: dict) -> list:
+        # New value and difference with the stored one of every metric an upsert changes
+        dates = list(days)
+        rows = self.conn.execute(
+            f"""
+            SELECT date, metric, value FROM daily_metrics
+            WHERE zone_tag = ? AND date IN ({", ".join("?" * len(dates))})
+            """,
+            (zone_tag, *dates),
+        ).fetchall()
+        stored = {(date, metric): value for date, metric, value in rows}
+        changes = []
+        for date, (metrics, _) in sorted(days.items()):
+            for metric, value in metrics.items():
+                delta = value - stored.get((date, metric), 0)
+                if delta:
+                    changes.append(
+                        {"date": date, "metric": metric, "value": value, "delta": delta}
+                    )
+        return changes
+
+    def _refresh_rollups(self, zone_tag: str, dates: list) -> None:
+        # Runs inside the upsert transaction, only the touched days and weeks are recomputed
+        excluded = ", ".join("?" * len(NON_ADDITIVE_METRICS))
+        for date in dates:
+            self.conn.execute(
+                "DELETE FROM metric_rollups WHERE period = 'day' AND zone_tag = ? AND start = ?",
+                (ALL_ZONES, date),
+            )
+            self.conn.execute(
+                f"""
+                INSERT INTO metric_rollups (period, zone_tag, metric, start, value)
+                SELECT 'day', ?, metric, date, SUM(value) FROM daily_metrics
+                WHERE date = ? AND metric NOT IN ({excluded})
+                GROUP BY metric
+                """,
+                (ALL_ZONES, date, *NON_ADDITIVE_METRICS),
+            )
+        for week in sorted({week_start(date) for date in dates}):
+            week_end = shift_date(week, 6)
+            self.conn.execute(
+                """
+                DELETE FROM metric_rollups
+                WHERE period = 'week' AND zone_tag IN (?, ?) AND start = ?
+                """,
+                (zone_tag, ALL_ZONES, week),
+            )
+            self.conn.execute(
+                f"""
+                INSERT INTO metric_rollups (period, zone_tag, metric, start, value)
+                SELECT 'week', zone_tag, metric, ?, SUM(value) FROM daily_metrics
+                WHERE zone_tag = ? AND date BETWEEN ? AND ? AND metric NOT IN ({excluded})
+                GROUP BY metric
+                """,
+                (week, zone_tag, week, week_end, *NON_ADDITIVE_METRICS),
+            )
+            self.conn.execute(
+                """
+                INSERT INTO metric_rollups (period, zone_tag, metric, start, value)
+                SELECT 'week', zone_tag, metric, ?, SUM(value) FROM metric_rollups
+                WHERE period = 'day' AND zone_tag = ? AND start BETWEEN ? AND ?
+                GROUP BY metric
+                """,
+                (week, ALL_ZONES, week, week_end),
+            )
+
+    def rebuild_rollups(self) -> None:
+        """
+        Recompute every rollup from the daily rows, for databases filled before the rollups existed.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM metric_rollups")
+            rows = self.conn.execute(
+                "SELECT DISTINCT zone_tag, date FROM daily_metrics"
+            ).fetchall()
+            dates = {}
+            for zone_tag, date in rows:
+                dates.setdefault(zone_tag, []).append(date)
+            for zone_tag, zone_dates in dates.items():
+                self._refresh_rollups(zone_tag, zone_dates)
+
+    def upsert_hours(
+        self,
+        zone_tag: str,
+        hours: dict,
+        since: str,
+        until: str,
+        collected_until: str,
+    ) -> None:
+        """
+        Replace the hours of a zone for a range and move its hourly high-water mark.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+            hours (dict): Hours (YYYY-MM-DDTHH:00:00Z) as keys, (metrics, breakdowns)
+                tuples as values, see upsert_days.
+            since (str): First hour the query covered.
+            until (str): End of the range the query covered (exclusive).
+            collected_until (str): Hours before this one are complete.
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM hourly_metrics WHERE zone_tag = ? AND hour >= ? AND hour < ?",
+                (zone_tag, since, until),
+            )
+            self.conn.executemany(
+                """
+                INSERT INTO hourly_metrics (zone_tag, hour, metrics, breakdowns)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (zone_tag, hour) DO UPDATE SET
+                    metrics = excluded.metrics,
+                    breakdowns = excluded.breakdowns
+                """,
+                [
+                    (zone_tag, hour, json.dumps(metrics), json.dumps(breakdowns))
+                    for hour, (metrics, breakdowns) in hours.items()
+                ],
+            )
+            self.conn.execute(
+                """
+                INSERT INTO hourly_marks (zone_tag, collected_until) VALUES (?, ?)
+                ON CONFLICT (zone_tag) DO UPDATE SET
+                    collected_until = MAX(collected_until, excluded.collected_until)
+                """,
+                (zone_tag, collected_until),
+            )
+
+    def hourly_high_water_mark(self, zone_tag: str):
+        """
+        End of the complete hours collected for a zone.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+        Returns:
+            str | None: Hour (YYYY-MM-DDTHH:00:00Z), None if nothing was collected yet.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT collected_until FROM hourly_marks WHERE zone_tag = ?",
+                (zone_tag,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def read_hours(self, zone_tag: str, since: str, until: str) -> dict:
+        """
+        Read the hourly metrics of a zone.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+            since (str): First hour (inclusive), or a date for its first hour.
+            until (str): End of the range (exclusive), or a date for its first hour.
+        Returns:
+            dict: Hours with data as keys, (metrics, breakdowns) tuples as values.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT hour, metrics, breakdowns FROM hourly_metrics
+                WHERE zone_tag = ? AND hour >= ? AND hour < ?
+                ORDER BY hour
+                """,
+                (zone_tag, since, until),
+            ).fetchall()
+        return {
+            hour: (json.loads(metrics), json.loads(breakdowns))
+            for hour, metrics, breakdowns in rows
+        }
+
+    def hourly_series(self, zone_tag: str, metric: str, since: str, until: str) -> dict:
+        """
+        Read one metric of a zone per hour.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+            metric (str): Metric name, e.g. "requests".
+            since (str): First hour (inclusive).
+            until (str): End of the range (exclusive).
+        Returns:
+            dict: Hours as keys and the metric as values.
+        """
+        return {
+            hour: metrics.get(metric, 0)
+            for hour, (metrics, _) in self.read_hours(zone_tag, since, until).items()
+        }
+
+    def rollup_hours(
+        self,
+        zone_tag: str,
+        dates: list,
+        final_date: str = None,
+        distinct: dict = None,
+    ) -> dict:
+        """
+        Add up the stored hours of some days into their daily rows. Distinct counts
+        (NON_ADDITIVE_METRICS) cannot be added: a day gets its real value from
+        distinct, otherwise the highest of its hours, a lower bound of the real one,
+        and such a day is never marked final, so the daily collection fetches it again.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+            dates (list): Days to roll up (YYYY-MM-DD), every hour of them must be collected.
+            final_date (str): Dates before this one are complete, defaults to final_before().
+            distinct (dict): Dates as keys and {metric: value} dicts of the daily
+                distinct counts as values.
+        Returns:
+            dict: The rolled up days, dates as keys and (metrics, breakdowns) as values.
+        """
+        final_date = final_date or final_before()
+        distinct = distinct or {}
+        for date in sorted(dates):
+            if date < final_date and not set(NON_ADDITIVE_METRICS) <= set(
+                distinct.get(date, ())
+            ):
+                final_date = date
+                break
+        days = {}
+        for date in dates:
+            hours = self.read_hours(zone_tag, date, shift_date(date, 1))
+            if not hours:
+                continue
+            metrics, breakdowns = {}, {}
+            for hour_metrics, hour_breakdowns in hours.values():
+                for metric, value in hour_metrics.items():
+                    if metric in NON_ADDITIVE_METRICS:
+                        metrics[metric] = max(metrics.get(metric, 0), value)
+                    else:
+                        metrics[metric] = metrics.get(metric, 0) + value
+                for dimension, values in hour_breakdowns.items():
+                    breakdowns.setdefault(dimension, MapAggregate()).merge(values)
+            metrics.update(distinct.get(date, {}))
+            days[date] = (
+                metrics,
+                {dimension: merged.counts for dimension, merged in breakdowns.items()},
+            )
+        self.upsert_days(zone_tag, days, dates, final_date)
+        return days
+
+    def missing_dates(
+        self, zone_tag: str, since: str, until: str, final_only: bool = True
+    ) -> list:
+        """
+        Dates of a range that were never collected or were not complete when collected.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+            since (str): First date (YYYY-MM-DD).
+            until (str): Last date (YYYY-MM-DD).
+            final_only (bool): Also count the days collected before they were
+                complete as missing.
+        Returns:
+            list: ISO dates that must be fetched from the API.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT date FROM collected_days
+                WHERE zone_tag = ? AND date BETWEEN ? AND ? AND final >= ?
+                """,
+                (zone_tag, since, until, int(final_only)),
+            ).fetchall()
+        final = {row[0] for row in rows}
+        return [date for date in date_range(since, until) if date not in final]
+
+    def high_water_mark(self, zone_tag: str):
+        """
+        Last final date collected for a zone.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+        Returns:
+            str | None: ISO date, None if nothing was collected yet.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MAX(date) FROM collected_days WHERE zone_tag = ? AND final = 1",
+                (zone_tag,),
+            ).fetchone()
+        return row[0]
+
+    def read_days(self, zone_tag: str, since: str, until: str) -> dict:
+        """
+        Read the metrics of a zone for a range.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+            since (str): First date (YYYY-MM-DD).
+            until (str): Last date (YYYY-MM-DD).
+        Returns:
+            dict: Dates with data as keys, (metrics, breakdowns) tuples as values.
+        """
+        with self.lock:
+            metric_rows = self.conn.execute(
+                """
+                SELECT date, metric, value FROM daily_metrics
+                WHERE zone_tag = ? AND date BETWEEN ? AND ?
+                """,
+                (zone_tag, since, until),
+            ).fetchall()
+            breakdown_rows = self.conn.execute(
+                """
+                SELECT date, dimension, key, value FROM daily_breakdowns
+                WHERE zone_tag = ? AND date BETWEEN ? AND ?
+                """,
+                (zone_tag, since, until),
+            ).fetchall()
+        days = {}
+        for date, metric, value in metric_rows:
+            days.setdefault(date, ({}, {}))[0][metric] = value
+        for date, dimension, key, value in breakdown_rows:
+            if date in days:
+                days[date][1].setdefault(dimension, {})[key] = value
+        return days
+
+    def series(self, zone_tag: str, metric: str, since: str, until: str) -> dict:
+        """
+        Read one metric of a zone for a range.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+            metric (str): Metric name, e.g. "requests".
+            since (str): First date (YYYY-MM-DD).
+            until (str): Last date (YYYY-MM-DD).
+        Returns:
+            dict: Dates as keys and the metric as values.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT date, value FROM daily_metrics
+                WHERE zone_tag = ? AND metric = ? AND date BETWEEN ? AND ?
+                ORDER BY date
+                """,
+                (zone_tag, metric, since, until),
+            ).fetchall()
+        return dict(rows)
+
+    def rollup(
+        self, zone_tag: str, metric: str, since: str, until: str, period: str = "day"
+    ) -> dict:
+        """
+        Read a metric series from the rollups, one row per day or per week.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone, ALL_ZONES for every zone.
+            metric (str): Metric name, e.g. "requests".
+            since (str): First date (YYYY-MM-DD).
+            until (str): Last date (YYYY-MM-DD).
+            period (str): "day" or "week", weeks are keyed by their Monday.
+        Returns:
+            dict: Dates as keys and the metric as values.
+        Raises:
+            ValueError: If the period is not supported.
+        """
+        if period not in ("day", "week"):
+            raise ValueError(f"Unsupported period: '{period}'.")
+        if period == "day" and zone_tag != ALL_ZONES:
+            return self.series(zone_tag, metric, since, until)
+        if period == "week":
+            since = week_start(since)
+        with self.lock:
+            rows = self.conn.execute(
+                """
+                SELECT start, value FROM metric_rollups
+                WHERE period = ? AND zone_tag = ? AND metric = ? AND start BETWEEN ? AND ?
+                ORDER BY start
+                """,
+                (period, zone_tag, metric, since, until),
+            ).fetchall()
+        return dict(rows)
+
+    def totals(self, zone_tag: str, since: str, until: str) -> dict:
+        """
+        Sum of every additive metric over a range.
+        Args:
+            zone_tag (str): Unique identifier for the Cloudflare zone, ALL_ZONES for every zone.
+            since (str): First date (YYYY-MM-DD).
+            until (str): Last date (YYYY-MM-DD).
+        Returns:
+            dict: Metric names as keys and their totals as values.
+        """
+        excluded = ", ".join("?" * len(NON_ADDITIVE_METRICS))
+        if zone_tag == ALL_ZONES:
+            query = """
+                SELECT metric, SUM(value) FROM metric_rollups
+                WHERE period = 'day' AND zone_tag = ? AND start BETWEEN ? AND ?
+            """
+        else:
+            query = """
+                SELECT metric, SUM(value) FROM daily_metrics
+                WHERE zone_tag = ? AND date BETWEEN ? AND ?
+            """
+        with self.lock:
+            rows = self.conn.execute(
+                f"{query} AND metric NOT IN ({excluded}) GROUP BY metric",
+                (zone_tag, since, until, *NON_ADDITIVE_METRICS),
+            ).fetchall()
+        return dict(rows)
+
+    def events_after(
+        self, last_id: int, zone_tags: list = None, limit: int = 500
+    ) -> list:
+        """
+        Ingest events newer than an id, oldest first.
+        Args:
+            last_id (int): Id of the last event already seen, 0 for every event kept.
+            zone_tags (list): Only the events of these zones, every zone if None.
+            limit (int): Maximum number of events.
+        Returns:
+            list: Dicts with the event id, zone_tag, created_at and its changes,
+            each one {"date", "metric", "value", "delta"}.
+        """
+        query = (
+            "SELECT id, zone_tag, created_at, changes FROM ingest_events WHERE id > ?"
+        )
+        params = (last_id,)
+        if zone_tags is not None:
+            query += f" AND zone_tag IN ({', '.join('?' * len(zone_tags))})"
+            params += tuple(zone_tags)
+        with self.lock:
+            rows = self.conn.execute(
+                f"{query} ORDER BY id LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [
+            {
+                "id": event_id,
+                "zone_tag": zone_tag,
+                "created_at": created_at,
+                "changes": json.loads(changes),
+            }
+            for event_id, zone_tag, created_at, changes in rows
+        ]
+
+    def last_event_id(self) -> int:
+        """
+        Id of the newest ingest event.
+        Returns:
+            int: Event id, 0 if there are none.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(id) FROM ingest_events").fetchone()
+        return row[0] or 0
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+def get_metric_store(path: str = None) -> MetricStore:
+    """
+    Process wide store for a database file.
+    Args:
+        path (str): Database file, defaults to CF_METRICS_DB or data/metrics.db.
+    Returns:
+        MetricStore: The shared store.
+    """
+    path = path or DB_PATH
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = MetricStore(path)
+        return _stores[path]
@@ -0,0 +1,169 @@
+"""
+V1 server-sent events for the dashboards
+"""
+
+__version__ = "1.0.0"
+import json
+import queue
+import threading
+import time
+
+from db_utils import MetricStore, get_metric_store
+
+# Seconds between two reads of the ingest_events table
+POLL_INTERVAL = 1.0
+# Seconds without events before a keep-alive comment is sent
+HEARTBEAT = 15.0
+# Events buffered per dashboard, a slower one is disconnected and resumes with Last-Event-ID
+SUBSCRIBER_BUFFER = 256
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def format_event(event: dict) -> str:
+    """
+    Serialize an ingest event as a text/event-stream message.
+    Args:
+        event (dict): Event from MetricStore.events_after.
+    Returns:
+        str: The SSE message.
+    """
+    data = json.dumps(
+        {
+            "zone_tag": event["zone_tag"],
+            "created_at": event["created_at"],
+            "changes": event["changes"],
+        }
+    )
+    return f"id: {event['id']}\nevent: metrics\ndata: {data}\n\n"
+
+
+class Subscription:
+    """
+    Events of some zones (every zone if zone_tags is None) for one open dashboard.
+    """
+
+    def __init__(self, zone_tags: list = None):
+        self.zone_tags = set(zone_tags) if zone_tags is not None else None
+        self.events = queue.Queue(maxsize=SUBSCRIBER_BUFFER)
+        self.overflowed = False
+
+    def offer(self, event: dict) -> None:
+        if self.zone_tags is not None and event["zone_tag"] not in self.zone_tags:
+            return
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+
+class EventBroker:
+    """
+    Tails ingest_events with a single thread and fans the new events out to every
+    subscription, so the cost of the database reads does not grow with the number
+    of open dashboards. The collector can run in another process, the table is the
+    only thing they share.
+    """
+
+    def __init__(self, store: MetricStore = None, poll_interval: float = POLL_INTERVAL):
+        self.store = store or get_metric_store()
+        self.poll_interval = poll_interval
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+        self.last_id = self.store.last_event_id()
+        self.thread = None
+
+    def subscribe(self, zone_tags: list = None) -> Subscription:
+        """
+        Start receiving the events of some zones.
+        Args:
+            zone_tags (list): Unique identifiers for the Cloudflare zones, every zone if None.
+        Returns:
+            Subscription: Its events queue gets the new events.
+        """
+        subscription = Subscription(zone_tags)
+        with self.lock:
+            self.subscriptions.add(subscription)
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._poll, name="event-broker", daemon=True
+                )
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def _poll(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                events = self.store.events_after(self.last_id)
+            except Exception as e:
+                print(f"Error reading ingest events: {e}")
+                continue
+            if not events:
+                continue
+            self.last_id = events[-1]["id"]
+            with self.lock:
+                subscriptions = list(self.subscriptions)
+            for event in events:
+                for subscription in subscriptions:
+                    subscription.offer(event)
+
+    def stream(
+        self,
+        zone_tags: list = None,
+        last_event_id: int = None,
+        heartbeat: float = HEARTBEAT,
+    ):
+        """
+        text/event-stream generator for one dashboard.
+        Args:
+            zone_tags (list): Unique identifiers for the Cloudflare zones, every zone if None.
+            last_event_id (int): Id of the last event the dashboard got, the ones
+                after it are sent first. Only new events are sent if None.
+            heartbeat (float): Seconds without events before a keep-alive comment.
+        Yields:
+            str: SSE messages.
+        """
+        subscription = self.subscribe(zone_tags)
+        try:
+            sent = 0
+            yield f"retry: {int(self.poll_interval * 1000)}\n\n"
+            if last_event_id is not None:
+                # Subscribed first, so nothing falls between the replay and the live events
+                sent = last_event_id
+                while True:
+                    events = self.store.events_after(sent, zone_tags)
+                    if not events:
+                        break
+                    for event in events:
+                        sent = event["id"]
+                        yield format_event(event)
+            while not subscription.overflowed:
+                try:
+                    event = subscription.events.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event["id"] > sent:
+                    sent = event["id"]
+                    yield format_event(event)
+        finally:
+            self.unsubscribe(subscription)
+
+
+def get_event_broker() -> EventBroker:
+    """
+    Process wide event broker, its thread starts with the first subscription.
+    Returns:
+        EventBroker: The shared broker.
+    """
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = EventBroker()
+        return _broker
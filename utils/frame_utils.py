@@ -0,0 +1,287 @@
+"""
+V1 columnar container for the daily metrics
+"""
+
+__version__ = "1.0.0"
+import hashlib
+
+import numpy as np
+
+DAY = np.timedelta64(1, "D")
+
+
+def to_days(dates) -> np.ndarray:
+    """
+    Parse ISO dates in a single vectorized step.
+    Args:
+        dates: ISO date strings (YYYY-MM-DD), or datetime64 values.
+    Returns:
+        np.ndarray: datetime64[D] array.
+    """
+    if isinstance(dates, np.ndarray):
+        return dates.astype("datetime64[D]")
+    return np.array(list(dates), dtype="datetime64[D]")
+
+
+class MetricFrame:
+    """
+    Daily metrics of a zone as columns: a sorted datetime64[D] array of dates
+    and one int64 array per metric, all of the same length. Frames are
+    immutable, every operation returns a new one sharing what it can.
+    """
+
+    def __init__(self, dates, columns: dict, zone_tag: str = None):
+        self.dates = to_days(dates)
+        self.columns = {
+            name: np.asarray(values, dtype=np.int64) for name, values in columns.items()
+        }
+        self.zone_tag = zone_tag
+        for name, values in self.columns.items():
+            if values.shape != self.dates.shape:
+                raise ValueError(
+                    f"Column '{name}' has {len(values)} values for {len(self.dates)} dates."
+                )
+
+    @classmethod
+    def from_rows(cls, dates: list, rows: list, metrics: tuple, zone_tag: str = None):
+        """
+        Build a frame from row oriented data.
+        Args:
+            dates (list): ISO dates, one per row.
+            rows (list): Objects with one attribute per metric (e.g. DailyMetrics) or dicts.
+            metrics (tuple): Names of the metrics to keep.
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+        Returns:
+            MetricFrame: Frame sorted by date.
+        """
+        get = (
+            (lambda row, name: row[name])
+            if rows and isinstance(rows[0], dict)
+            else getattr
+        )
+        frame = cls(
+            dates,
+            {name: [get(row, name) for row in rows] for name in metrics},
+            zone_tag,
+        )
+        return frame.sorted()
+
+    @classmethod
+    def from_series(cls, series: dict, metric: str = "value", zone_tag: str = None):
+        """
+        Build a single column frame from a {date: value} dict.
+        Args:
+            series (dict): ISO dates as keys and the metric as values.
+            metric (str): Name of the column.
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+        Returns:
+            MetricFrame: Frame sorted by date.
+        """
+        return cls(list(series), {metric: list(series.values())}, zone_tag).sorted()
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __contains__(self, metric: str) -> bool:
+        return metric in self.columns
+
+    def __repr__(self) -> str:
+        return (
+            f"MetricFrame(zone_tag={self.zone_tag!r}, days={len(self)}, "
+            f"metrics={list(self.columns)})"
+        )
+
+    @property
+    def metrics(self) -> list:
+        return list(self.columns)
+
+    @property
+    def since(self):
+        return str(self.dates[0]) if len(self) else None
+
+    @property
+    def until(self):
+        return str(self.dates[-1]) if len(self) else None
+
+    def column(self, metric: str) -> np.ndarray:
+        """
+        Values of a metric.
+        Args:
+            metric (str): Column name, e.g. "requests".
+        Returns:
+            np.ndarray: int64 array aligned with dates.
+        Raises:
+            KeyError: If the frame has no such column.
+        """
+        if metric not in self.columns:
+            raise KeyError(f"Unknown metric: '{metric}'.")
+        return self.columns[metric]
+
+    def sum(self, metric: str) -> int:
+        return int(self.column(metric).sum())
+
+    def sums(self) -> dict:
+        """
+        Totals of every column.
+        Returns:
+            dict: Metric names as keys and their totals as values.
+        """
+        return {name: int(values.sum()) for name, values in self.columns.items()}
+
+    def rate(self, numerator: str, denominator: str) -> np.ndarray:
+        """
+        Daily ratio of two columns, 0 on the days the denominator is 0.
+        Args:
+            numerator (str): Column name, e.g. "cached_requests".
+            denominator (str): Column name, e.g. "requests".
+        Returns:
+            np.ndarray: float64 array aligned with dates.
+        """
+        return safe_divide(self.column(numerator), self.column(denominator))
+
+    def total_rate(self, numerator: str, denominator: str) -> float:
+        """
+        Ratio of the totals of two columns over the whole frame, 0 if the denominator is 0.
+        Args:
+            numerator (str): Column name, e.g. "cached_bytes".
+            denominator (str): Column name, e.g. "bytes".
+        Returns:
+            float: The ratio.
+        """
+        return float(safe_divide(self.sum(numerator), self.sum(denominator)))
+
+    def select(self, metrics: list):
+        """
+        Frame with some of the columns.
+        Args:
+            metrics (list): Column names.
+        Returns:
+            MetricFrame: Frame sharing the dates and the selected columns.
+        """
+        return MetricFrame(
+            self.dates, {name: self.column(name) for name in metrics}, self.zone_tag
+        )
+
+    def with_column(self, metric: str, values):
+        """
+        Frame with an extra (or replaced) column.
+        Args:
+            metric (str): Column name.
+            values: Values aligned with dates.
+        Returns:
+            MetricFrame: The new frame.
+        """
+        return MetricFrame(self.dates, {**self.columns, metric: values}, self.zone_tag)
+
+    def sorted(self):
+        """
+        Frame sorted by date.
+        Returns:
+            MetricFrame: Self if it is already sorted.
+        """
+        if len(self) < 2 or bool(np.all(self.dates[1:] > self.dates[:-1])):
+            return self
+        order = np.argsort(self.dates, kind="stable")
+        return MetricFrame(
+            self.dates[order],
+            {name: values[order] for name, values in self.columns.items()},
+            self.zone_tag,
+        )
+
+    def window(self, since: str = None, until: str = None):
+        """
+        Days of a range, both ends included, found by binary search.
+        Args:
+            since (str): First date (YYYY-MM-DD), from the first day if None.
+            until (str): Last date (YYYY-MM-DD), up to the last day if None.
+        Returns:
+            MetricFrame: Frame whose columns are views of this one.
+        """
+        start = (
+            0
+            if since is None
+            else np.searchsorted(self.dates, np.datetime64(since, "D"))
+        )
+        end = (
+            len(self)
+            if until is None
+            else np.searchsorted(self.dates, np.datetime64(until, "D"), side="right")
+        )
+        return MetricFrame(
+            self.dates[start:end],
+            {name: values[start:end] for name, values in self.columns.items()},
+            self.zone_tag,
+        )
+
+    def fill_gaps(self, since: str = None, until: str = None, fill: int = 0):
+        """
+        Frame with one row per day of a range, the missing days get a fill value.
+        Cloudflare returns no group for the days without traffic, so 0 is the default.
+        Args:
+            since (str): First date (YYYY-MM-DD), defaults to the first day.
+            until (str): Last date (YYYY-MM-DD), defaults to the last day.
+            fill (int): Value of the missing days.
+        Returns:
+            MetricFrame: The dense frame.
+        """
+        if since is None and until is None and not len(self):
+            return self
+        start = np.datetime64(since or self.since, "D")
+        end = np.datetime64(until or self.until, "D")
+        dates = np.arange(start, end + DAY, DAY)
+        frame = self.window(str(start), str(end))
+        if len(frame) == len(dates):
+            return frame
+        positions = (frame.dates - start).astype(np.int64)
+        columns = {}
+        for name, values in frame.columns.items():
+            dense = np.full(len(dates), fill, dtype=np.int64)
+            dense[positions] = values
+            columns[name] = dense
+        return MetricFrame(dates, columns, self.zone_tag)
+
+    def date_strings(self) -> list:
+        """
+        Dates as ISO strings.
+        Returns:
+            list: ISO dates (YYYY-MM-DD).
+        """
+        return np.datetime_as_string(self.dates, unit="D").tolist()
+
+    def series(self, metric: str) -> dict:
+        """
+        A column as the {date: value} dict used by the get_* functions.
+        Args:
+            metric (str): Column name, e.g. "requests".
+        Returns:
+            dict: ISO dates as keys and the metric as values.
+        """
+        return dict(zip(self.date_strings(), self.column(metric).tolist()))
+
+    def digest(self) -> str:
+        """
+        Hash of the dates and columns, changes only when the data does.
+        Returns:
+            str: Hex digest.
+        """
+        sha = hashlib.sha256(self.dates.astype(np.int64).tobytes())
+        for name in sorted(self.columns):
+            sha.update(name.encode())
+            sha.update(self.columns[name].tobytes())
+        return sha.hexdigest()
+
+
+def safe_divide(numerator, denominator):
+    """
+    Element-wise division that gives 0 where the denominator is 0.
+    Args:
+        numerator: Scalar or array.
+        denominator: Scalar or array.
+    Returns:
+        np.ndarray | np.float64: The quotient.
+    """
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    out = np.zeros(np.broadcast(numerator, denominator).shape)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out if out.ndim else out[()]
@@ -2,10 +2,74 @@
 V1 General functions
 """
 
-__version__ = "1.0.0"
+__version__ = "1.4.0"
+import random
+import threading
+import time
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
 
-import requests
+from cache_utils import get_response_cache
+
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read) seconds
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+POOL_SIZE = 20
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class CloudflareError(Exception):
+    """
+    Base error for every failed call to the Cloudflare API.
+    """
+
+
+class CloudflareHTTPError(CloudflareError):
+    """
+    The API answered with a non-200 status.
+    """
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"HTTP Error {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class CloudflareRateLimitError(CloudflareHTTPError):
+    """
+    The API kept answering 429 after every retry.
+    """
+
+
+class CloudflareAPIError(CloudflareError):
+    """
+    The REST API answered with success set to false.
+    """
+
+    def __init__(self, errors: list):
+        super().__init__(f"API Error: {errors}")
+        self.errors = errors
+
+
+class TruncatedResultError(CloudflareError):
+    """
+    A query still hit its row limit on the smallest time slice allowed.
+    """
+
+
+class GraphQLError(CloudflareError):
+    """
+    The GraphQL API answered with an errors payload.
+    """
+
+    def __init__(self, errors: list):
+        messages = "; ".join(str(error.get("message", error)) for error in errors)
+        super().__init__(f"GraphQL Error: {messages}")
+        self.errors = errors
 
 
 def range_generator(leq_date: str, periods: int) -> dict:
@@ -37,68 +101,203 @@ def range_generator(leq_date: str, periods: int) -> dict:
         ) from e
 
 
-def execute_query(token: str, query: str, variables: dict) -> None:
+def get_session() -> "requests.Session":
     """
-    Execute GraphQL query.
+    Shared keep-alive session, so every call reuses pooled TCP+TLS connections.
+    requests is imported here, with the first call, not with the module.
+    Returns:
+        requests.Session: The process wide session.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def retry_after_seconds(value: str):
+    """
+    Parse a Retry-After header, given either as seconds or as an HTTP date.
     Args:
+        value (str): Header value.
+    Returns:
+        float | None: Seconds to wait, None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """
+    Seconds to wait before the next attempt: Retry-After when the server sent it,
+    otherwise exponential backoff with full jitter.
+    Args:
+        attempt (int): Zero based number of the failed attempt.
+        retry_after (float): Parsed Retry-After header, if any.
+    Returns:
+        float: Seconds to sleep.
+    """
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+def api_request(
+    method: str,
+    url: str,
+    token: str,
+    timeout=DEFAULT_TIMEOUT,
+    retries: int = MAX_RETRIES,
+    **kwargs,
+) -> "requests.Response":
+    """
+    Send a request through the shared session, retrying rate limits, 5xx answers
+    and connection errors.
+    Args:
+        method (str): HTTP method.
+        url (str): Full URL.
         token (str): API token for authorization.
-        query (str): GraphQL query string.
-        variables (dict): Variables for the query.
+        timeout (float | tuple): Requests timeout, (connect, read) seconds.
+        retries (int): Retries after the first attempt.
+        **kwargs: Passed to requests.Session.request.
+    Returns:
+        requests.Response: The 200 response.
+    Raises:
+        CloudflareRateLimitError: If the API still answers 429 after every retry.
+        CloudflareHTTPError: If the API answers any other non-200 status.
+        CloudflareError: If the connection keeps failing.
     """
-    url = "https://api.cloudflare.com/client/v4/graphql"
+    import requests
+
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
         "Accept": "application/json",
     }
+    session = get_session()
+    for attempt in range(retries + 1):
+        try:
+            response = session.request(
+                method, url, headers=headers, timeout=timeout, **kwargs
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise CloudflareError(f"Connection Error: {e}") from e
+            time.sleep(backoff_delay(attempt))
+            continue
+        if response.status_code == 200:
+            return response
+        if response.status_code not in RETRY_STATUSES or attempt == retries:
+            break
+        time.sleep(
+            backoff_delay(
+                attempt, retry_after_seconds(response.headers.get("Retry-After"))
+            )
+        )
+    if response.status_code == 429:
+        raise CloudflareRateLimitError(response.status_code, response.text)
+    raise CloudflareHTTPError(response.status_code, response.text)
+
+
+def _api_url(api_url: str = None) -> str:
+    if api_url:
+        return api_url
+    # Imported here, config_utils imports this module
+    from config_utils import default_api_url
+
+    return default_api_url()
+
+
+def execute_query(
+    token: str,
+    query: str,
+    variables: dict,
+    timeout=DEFAULT_TIMEOUT,
+    use_cache=True,
+    api_url: str = None,
+) -> dict:
+    """
+    Execute GraphQL query.
+    Args:
+        token (str): API token for authorization.
+        query (str): GraphQL query string.
+        variables (dict): Variables for the query.
+        timeout (float | tuple): Requests timeout, (connect, read) seconds.
+        use_cache (bool): Serve and store the response in the response cache.
+        api_url (str): API base URL, defaults to config_utils.default_api_url().
+    Returns:
+        dict: The decoded response.
+    Raises:
+        GraphQLError: If the response carries an errors payload.
+    """
+    cache = get_response_cache() if use_cache else None
+    if cache is not None:
+        key = cache.key(token, query, variables)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
     payload = {"query": query, "variables": variables}
-    response = requests.post(url, headers=headers, json=payload)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"HTTP Error {response.status_code}: {response.text}")
+    response = api_request(
+        "POST", f"{_api_url(api_url)}/graphql", token, timeout, json=payload
+    )
+    data = response.json()
+    if data.get("errors"):
+        raise GraphQLError(data["errors"])
+    if cache is not None:
+        cache.set(key, data, cache.ttl(variables))
+    return data
 
 
-def get_accounts(token: str) -> dict:
+def get_accounts(token: str, api_url: str = None) -> dict:
     """
     Retrieve basic information for all Cloudflare accounts accessible with the provided token.
     Args:
         token (str): API token for authorization.
+        api_url (str): API base URL, defaults to config_utils.default_api_url().
     Returns:
         dict: A dictionary containing account names as keys and their respective IDs as values.
     Raises:
-        Exception: If the HTTP request fails or the API returns errors.
+        CloudflareError: If the HTTP request fails or the API returns errors.
     """
-    url = "https://api.cloudflare.com/client/v4/accounts"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        raise Exception(f"HTTP Error {response.status_code}: {response.text}")
-    data = response.json()
+    data = api_request("GET", f"{_api_url(api_url)}/accounts", token).json()
     if not data.get("success"):
-        raise Exception(f"API Error: {data.get('errors')}")
+        raise CloudflareAPIError(data.get("errors"))
     results = {account["name"]: account["id"] for account in data["result"]}
     return results
 
 
-def get_zones(token: str) -> dict:
+def get_zones(token: str, api_url: str = None) -> dict:
     """
     Retrieve zone names and their corresponding IDs from Cloudflare.
     Args:
         token (str): API token for authorization.
+        api_url (str): API base URL, defaults to config_utils.default_api_url().
     Returns:
         dict: A dictionary with zone names as keys and their respective IDs as values.
     Raises:
-        Exception: If the HTTP request fails or the Cloudflare API returns errors.
+        CloudflareError: If the HTTP request fails or the Cloudflare API returns errors.
     """
-    url = "https://api.cloudflare.com/client/v4/zones"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        raise Exception(f"HTTP Error {response.status_code}: {response.text}")
-    data = response.json()
+    data = api_request("GET", f"{_api_url(api_url)}/zones", token).json()
     if not data.get("success"):
-        raise Exception(f"API Error: {data.get('errors')}")
+        raise CloudflareAPIError(data.get("errors"))
     results = {zone["name"]: zone["id"] for zone in data.get("result", [])}
     return results
 
@@ -2,26 +2,83 @@
 V2 functions neccesary to run the graph creation
 """
 
-__version__ = "2.0.0"
+__version__ = "2.10.0"
 # TODO Normalize graph sizes
 
-from datetime import datetime
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from functools import lru_cache
+from io import BytesIO
 
-import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
-from geopandas import gpd
-from matplotlib.table import Table
-from matplotlib.transforms import Bbox
+import numpy as np
+from frame_utils import MetricFrame
 from path import Path
 
+# matplotlib and geopandas take about a second to import, so they are imported
+# inside the functions that draw and only the processes that render pay for them
 
-def graph_line(data: dict, output_path: str, data_type: str = "numeric") -> None:
+WORLD_SHAPEFILE = "./assets/countries/ne_110m_admin_0_countries.shp"
+WORLD_CACHE = "./assets/countries/ne_110m_admin_0_countries.pkl"
+COUNTRY_HEADERS = ("Country", "Requests", "Bandwidth")
+MAP_DPI = 150
+MAP_SIZE = (6, 3)
+MAP_BOUNDARY_WIDTH = 0.1
+MAP_BOUNDARY_COLOR = "black"
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _save_figure(fig: "Figure", output_path: str, to_buffer: bool, **kwargs):
+    if to_buffer:
+        buffer = BytesIO()
+        fig.savefig(buffer, format="png", bbox_inches="tight", **kwargs)
+        return buffer.getvalue()
+    save_path = Path(output_path).with_suffix(".png")
+    fig.savefig(save_path, bbox_inches="tight", **kwargs)
+    return str(save_path)
+
+
+def format_total(total, data_type: str = "numeric") -> str:
     """
-    Generates a minimalistic line graph from a directory of dates and int values:
+    Total shown next to the title of a line chart.
     Args:
-         data (dict): A dictionary where keyas are dates and values are numeric.
+        total (int): Sum of the plotted values.
+        data_type (str): The type of data ("numeric" or "bytes").
+    Returns:
+        str: e.g. "1.50 MB", "2.30M", "4.10k" or "12".
+    """
+    total = int(total)
+    if data_type == "bytes":
+        return f"{total / (1024 * 1024):,.2f} MB"
+    if total >= 1_000_000:
+        return f"{total / 1_000_000:.2f}M"
+    if total >= 1_000:
+        return f"{total / 1_000:.2f}k"
+    return str(total)
+
+
+def graph_line(
+    data,
+    output_path: str,
+    data_type: str = "numeric",
+    to_buffer: bool = False,
+    metric: str = None,
+):
+    """
+    Generates a minimalistic line graph from a MetricFrame column, or a directory of dates and int values:
+    Args:
+         data (MetricFrame | dict): A frame, or a dictionary where keyas are dates and values are numeric.
          output_path (str): Path where the graph image is saved.
          data_type (str): The type of data ("numeric" or "bytes"). Defaults to "numeric".
+         to_buffer (bool): Return the PNG bytes instead of writing output_path.
+         metric (str): Column of the frame to plot, defaults to its first one.
+    Returns:
+        str | bytes: Path of the generated PNG, or its bytes with to_buffer.
     """
     # TODO Add logging and improve errors
     fig_horizontal_size = 7
@@ -33,32 +90,24 @@ def graph_line(data: dict, output_path: str, data_type: str = "numeric") -> None
     fig_facecolor = "white"
     graph_line_color = "#4693ff"
     graph_area_alpha = 0.2
+    import matplotlib.dates as mdates
+    from matplotlib.figure import Figure
+
     try:
-        sort_d = sorted(data.items(), key=lambda x: datetime.strptime(x[0], "%Y-%m-%d"))
-        x_values = mdates.date2num(
-            [datetime.strptime(date, "%Y-%m-%d") for date, _ in sort_d]
-        )
-        y_values = [value for _, value in sort_d]
-        total_display = sum(y_values)
-        if data_type == "bytes":
-            total_display = f"{total_display / (1024 * 1024):,.2f} MB"
-        else:
-            if total_display >= 1_000_000:
-                total_display = f"{total_display / 1_000_000:.2f}M"
-            elif total_display >= 1_000:
-                total_display = f"{total_display / 1_000:.2f}k"
-            else:
-                total_display = str(total_display)
-        plt.figure(
+        frame = data if isinstance(data, MetricFrame) else MetricFrame.from_series(data)
+        x_values = mdates.date2num(frame.dates)
+        y_values = frame.column(metric or frame.metrics[0])
+        total_display = format_total(y_values.sum(), data_type)
+        fig = Figure(
             figsize=(fig_horizontal_size, fig_vertical_size), facecolor=fig_facecolor
         )
-        plt.plot(x_values, y_values, linestyle="-", color=graph_line_color)
-        plt.fill_between(
+        ax = fig.add_subplot()
+        ax.plot(x_values, y_values, linestyle="-", color=graph_line_color)
+        ax.fill_between(
             x_values, y_values, color=graph_line_color, alpha=graph_area_alpha
         )
         graph_title = Path(output_path).stem
-        ax = plt.gca()
-        plt.text(
+        ax.text(
             fig_title_horizontal,
             fig_title_vertical,
             f"{graph_title}: {total_display}",
@@ -74,22 +123,22 @@ def graph_line(data: dict, output_path: str, data_type: str = "numeric") -> None
         ax.spines["bottom"].set_visible(False)
         ax.set_xticks([])
         ax.set_yticks([])
-        plt.subplots_adjust(top=fig_top_space)
-        save_path = Path(output_path).with_suffix(".png")
-        plt.savefig(save_path, dpi=100, bbox_inches="tight")
-        plt.close()
-        print("graph generated")
+        fig.subplots_adjust(top=fig_top_space)
+        return _save_figure(fig, output_path, to_buffer, dpi=100)
     except Exception as e:
         print(f"Error generating graph: {e}")
         raise
 
 
-def graph_bar(data: dict, output_path: str) -> None:
+def graph_bar(data: dict, output_path: str, to_buffer: bool = False):
     """
     Generates a minimalistic bar graph from a directory of str and int values:
     Args:
         data (dict): A dictionary where keyas are dates and values are numeric.
         output_path (str): Path where the graph image is saved.
+        to_buffer (bool): Return the PNG bytes instead of writing output_path.
+    Returns:
+        str | bytes: Path of the generated PNG, or its bytes with to_buffer.
     """
     # TODO Add logging and improve errors
     fig_horizontal_size = 2.5
@@ -105,17 +154,19 @@ def graph_bar(data: dict, output_path: str) -> None:
     graph_bar_height = 0.5
     graph_fill_color = "#0051c3"
     graph_box_color = "#dadad9"
+    from matplotlib.figure import Figure
+
     try:
         sort_d = sorted(data.items(), key=lambda x: x[1])
         x_values = [key for key, _ in sort_d]
         y_values = [value for _, value in sort_d]
         max_value = max(y_values)
-        plt.figure(
+        fig = Figure(
             figsize=(fig_horizontal_size, fig_vertical_size), facecolor=fig_facecolor
         )
-        ax = plt.gca()
+        ax = fig.add_subplot()
         graph_title = Path(output_path).stem
-        plt.text(
+        ax.text(
             fig_title_horizontal,
             fig_title_vertical,
             graph_title,
@@ -155,101 +206,209 @@ def graph_bar(data: dict, output_path: str) -> None:
         ax.spines["left"].set_visible(False)
         ax.spines["bottom"].set_visible(False)
         ax.set_xticks([])
-        plt.subplots_adjust(top=fig_top_space)
-        save_path = Path(output_path).with_suffix(".png")
-        plt.savefig(save_path, dpi=100, bbox_inches="tight")
-        plt.close()
-        print("graph generated")
+        fig.subplots_adjust(top=fig_top_space)
+        return _save_figure(fig, output_path, to_buffer, dpi=100)
     except Exception as e:
         print(f"Error generating graph: {e}")
         raise e
 
 
-def graph_map(data: dict, output_path: str) -> None:
+def _rings(geometry) -> list:
+    polygons = getattr(geometry, "geoms", [geometry])
+    return [
+        np.asarray(ring.coords)
+        for polygon in polygons
+        for ring in [polygon.exterior, *polygon.interiors]
+    ]
+
+
+def _build_world() -> dict:
+    import geopandas as gpd
+    from matplotlib.path import Path as MplPath
+
+    world = gpd.read_file(WORLD_SHAPEFILE)
+    if "ISO_A2" not in world.columns:
+        raise KeyError("Shapefile must contain an ISO_A2 column for ctry codes.")
+    codes, paths, segments = [], [], []
+    for code, geometry in zip(world["ISO_A2"], world.geometry):
+        if geometry is None:
+            continue
+        rings = _rings(geometry)
+        codes.append(code)
+        paths.append(MplPath.make_compound_path(*[MplPath(ring) for ring in rings]))
+        segments.extend(rings)
+    return {
+        "codes": codes,
+        "paths": paths,
+        "segments": segments,
+        "bounds": tuple(world.total_bounds),
+    }
+
+
+@lru_cache(maxsize=1)
+def load_world() -> dict:
+    """
+    Country geometry for graph_map, loaded once per process.
+    The shapefile is converted once into a pickle of matplotlib paths
+    (WORLD_CACHE), which is rebuilt whenever the shapefile is newer.
+    Returns:
+        dict: "codes" (ISO_A2 per country), "paths" (one compound path per
+        country), "segments" (every boundary ring) and "bounds".
+    """
+    try:
+        if os.path.getmtime(WORLD_CACHE) >= os.path.getmtime(WORLD_SHAPEFILE):
+            with open(WORLD_CACHE, "rb") as f:
+                return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+    except (AttributeError, ImportError) as e:
+        # Written by other matplotlib, shapely or geopandas versions
+        print(f"Rebuilding the world geometry cache: {e}")
+    world = _build_world()
+    try:
+        with open(WORLD_CACHE, "wb") as f:
+            pickle.dump(world, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        print(f"Could not cache world geometry: {e}")
+    return world
+
+
+def _map_axes() -> tuple:
+    # Figure and axes of graph_map, the boundary raster must share their geometry
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=MAP_SIZE, facecolor="white")
+    ax = fig.add_subplot()
+    ax.set_aspect("auto")
+    xmin, ymin, xmax, ymax = load_world()["bounds"]
+    ax.update_datalim([(xmin, ymin), (xmax, ymax)])
+    ax.autoscale_view()
+    ax.set_axis_off()
+    return fig, ax
+
+
+@lru_cache(maxsize=1)
+def map_boundaries() -> tuple:
+    """
+    Country boundaries of graph_map, drawn once per process: they are the same
+    on every map, only the fill of the countries changes.
+    Returns:
+        tuple: (RGBA pixels of the boundaries over a transparent background,
+        (left, right, bottom, top) data extent of the pixels).
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection
+
+    fig, ax = _map_axes()
+    fig.patch.set_alpha(0)
+    ax.add_collection(
+        LineCollection(
+            load_world()["segments"],
+            linewidths=MAP_BOUNDARY_WIDTH,
+            colors=MAP_BOUNDARY_COLOR,
+        )
+    )
+    canvas = FigureCanvasAgg(fig)
+    fig.set_dpi(MAP_DPI)
+    canvas.draw()
+    pixels = np.asarray(canvas.buffer_rgba())
+    # Window extent is measured from the bottom, the pixel rows from the top
+    x0, y0, x1, y1 = np.round(ax.get_window_extent().extents).astype(int)
+    height = pixels.shape[0]
+    pixels = pixels[height - y1 : height - y0, x0:x1].copy()
+    (left, bottom), (right, top) = ax.transData.inverted().transform(
+        [(x0, y0), (x1, y1)]
+    )
+    return pixels, (left, right, bottom, top)
+
+
+def graph_map(data: dict, output_path: str, to_buffer: bool = False):
     """
     Generates a minimalistic bar graph from a directory of str and int values:
     Args:
         data (dict): A dict where keys are ISO country codes and values are numeric.
         output_path (str): Path where the graph image is saved.
+        to_buffer (bool): Return the PNG bytes instead of writing output_path.
+    Returns:
+        str | bytes: Path of the generated PNG, or its bytes with to_buffer.
     """
-    # TODO Change the path for the countries using os
-    fig_definition = 150
-    fig_horizontal_size = 6
-    fig_vertical_size = 3
-    fig_facecolor = "white"
-    # fig_legend_shrink = 0.18
-    # fig_legend_padding = 0
-    fig_boundary_linewidth = 0.1
-    fig_boundary_color = "black"
-    # fig_colorbar_fontsize = 10
+    fig_cmap = "Blues"
+    from matplotlib import colormaps
+    from matplotlib.collections import PathCollection
+    from matplotlib.colors import Normalize
+
     try:
-        shapefile_path = "./assets/countries/ne_110m_admin_0_countries.shp"
-        world = gpd.read_file(shapefile_path)
-        if "ISO_A2" not in world.columns:
-            raise KeyError("Shapefile must contain an ISO_A2 column for ctry codes.")
-        world["requests"] = world["ISO_A2"].map(data).fillna(0)
-        plt.figure(
-            figsize=(fig_horizontal_size, fig_vertical_size), facecolor=fig_facecolor
-        )
-        ax = plt.gca()
-        ax.set_aspect("auto")
-        world.plot(
-            column="requests",
-            cmap="Blues",
-            # legend=True,
-            ax=ax,
-            # legend_kwds = {
-            #     "orientation": "vertical",
-            #     "shrink": fig_legend_shrink,
-            #     "pad": fig_legend_padding,
-            #     "fontsize": fig_colorbar_fontsize
-            # }
+        world = load_world()
+        values = np.array([data.get(code, 0) for code in world["codes"]], dtype=float)
+        norm = Normalize(vmin=values.min(), vmax=values.max())
+        fig, ax = _map_axes()
+        ax.add_collection(
+            PathCollection(
+                world["paths"],
+                facecolors=colormaps[fig_cmap](norm(values)),
+                edgecolors="none",
+            )
         )
-        world.boundary.plot(
-            ax=ax, linewidth=fig_boundary_linewidth, color=fig_boundary_color
+        limits = ax.get_xlim(), ax.get_ylim()
+        boundaries, extent = map_boundaries()
+        ax.imshow(
+            boundaries, extent=extent, aspect="auto", interpolation="none", zorder=3
         )
-        ax.spines["top"].set_visible(False)
-        ax.spines["right"].set_visible(False)
-        ax.spines["left"].set_visible(False)
-        ax.spines["bottom"].set_visible(False)
-        ax.set_xticks([])
-        ax.set_yticks([])
-        ax.set_xticklabels([])
-        ax.set_yticklabels([])
-        save_path = Path(output_path).with_suffix(".png")
-        plt.savefig(save_path, dpi=fig_definition, bbox_inches="tight")
-        plt.close()
-        print("graph generated")
+        ax.set_xlim(limits[0])
+        ax.set_ylim(limits[1])
+        return _save_figure(fig, output_path, to_buffer, dpi=MAP_DPI)
     except Exception as e:
         print(f"Error generating graph: {e}")
         raise e
 
 
-def create_table(requests_data: dict, bandwidth_data: dict, output_path: str) -> None:
+def country_rows(requests_data: dict, bandwidth_data: dict) -> list:
+    """
+    Rows of the country table, sorted by requests.
+    Args:
+        requests_data (dict): Countries as keys and requests as values.
+        bandwidth_data (dict): Countries as keys and bandwidth in bytes as values.
+    Returns:
+        list: (country, requests, bandwidth) tuples of formatted strings.
+    """
+    combined_data = [
+        (country, requests_data[country], bandwidth_data.get(country, 0))
+        for country in requests_data
+    ]
+    combined_data.sort(key=lambda x: x[1], reverse=True)
+    return [
+        (country, f"{requests:,}", f"{bandwidth / (1024 * 1024):,.2f} MB")
+        for country, requests, bandwidth in combined_data
+    ]
+
+
+def create_table(
+    requests_data: dict, bandwidth_data: dict, output_path: str, to_buffer: bool = False
+):
     """
     Generates a table image showing Country, Requests, and Bandwidth.
     Args:
         requests_data (dict): Countries as keys and requests as values.
         bandwidth_data (dict): Countries as keys and bandwidth in bytes as values.
         output_path (str): Path (including filename) to save the table image.
+        to_buffer (bool): Return the PNG bytes instead of writing output_path.
+    Returns:
+        str | bytes: Path of the generated PNG, or its bytes with to_buffer.
     """
     fig_width, fig_dpi = 6, 100
     cell_width, cell_height = 0.33, 0.2
     header_color, font_size = "lightgray", 10
+    from matplotlib.figure import Figure
+    from matplotlib.table import Table
+    from matplotlib.transforms import Bbox
+
     try:
-        combined_data = [
-            (country, requests_data[country], bandwidth_data.get(country, 0))
-            for country in requests_data
-        ]
-        combined_data.sort(key=lambda x: x[1], reverse=True)
-        table_rows = [
-            (country, f"{requests:,}", f"{bandwidth / (1024 * 1024):,.2f} MB")
-            for country, requests, bandwidth in combined_data
-        ]
-        fig, ax = plt.subplots(figsize=(fig_width, len(table_rows) * 0.5), dpi=fig_dpi)
+        table_rows = country_rows(requests_data, bandwidth_data)
+        fig = Figure(figsize=(fig_width, len(table_rows) * 0.5), dpi=fig_dpi)
+        ax = fig.add_subplot()
         ax.axis("off")
         table = Table(ax, bbox=Bbox.from_extents(0, 0, 1, 1))
-        headers = ["Country", "Requests", "Bandwidth"]
+        headers = COUNTRY_HEADERS
         for col_idx, header in enumerate(headers):
             table.add_cell(
                 0,
@@ -274,15 +433,109 @@ def create_table(requests_data: dict, bandwidth_data: dict, output_path: str) ->
         table.set_fontsize(font_size)
         table.auto_set_column_width(col=list(range(len(headers))))
         ax.add_table(table)
-        save_path = Path(output_path).with_suffix(".png")
-        plt.savefig(save_path, bbox_inches="tight")
-        plt.close()
-        print(f"Table saved at {save_path}")
+        return _save_figure(fig, output_path, to_buffer)
     except Exception as e:
         print(f"Error creating table: {e}")
         raise e
 
 
+CHART_FUNCTIONS = {
+    "line": graph_line,
+    "bar": graph_bar,
+    "map": graph_map,
+    "table": create_table,
+}
+
+
+@dataclass
+class ChartJob:
+    """
+    One chart of a render plan.
+    kind is a CHART_FUNCTIONS key, args are the positional data arguments of that
+    function (before output_path) and options its keyword arguments.
+    """
+
+    kind: str
+    args: tuple
+    output_path: str
+    options: dict = field(default_factory=dict)
+
+
+def render_job(job: ChartJob, to_buffer: bool = False):
+    """
+    Render one chart job.
+    Args:
+        job (ChartJob): The chart to render.
+        to_buffer (bool): Return the PNG bytes instead of writing job.output_path.
+    Returns:
+        str | bytes: Path of the generated PNG, or its bytes with to_buffer.
+    """
+    if job.kind not in CHART_FUNCTIONS:
+        raise ValueError(f"Unknown chart kind: '{job.kind}'.")
+    return CHART_FUNCTIONS[job.kind](
+        *job.args, job.output_path, to_buffer=to_buffer, **job.options
+    )
+
+
+def _render_job_buffer(job: ChartJob) -> bytes:
+    return render_job(job, to_buffer=True)
+
+
+def _init_worker() -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def get_render_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Process wide render pool, started on first use and shared by every report, so
+    its workers keep matplotlib and the world geometry loaded between clients.
+    Args:
+        max_workers (int): Worker processes of the pool.
+    Returns:
+        ProcessPoolExecutor: The shared pool of that size.
+    """
+    with _pools_lock:
+        if max_workers not in _pools:
+            _pools[max_workers] = ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_init_worker
+            )
+        return _pools[max_workers]
+
+
+def _discard_pool(max_workers: int, pool: ProcessPoolExecutor) -> None:
+    with _pools_lock:
+        if _pools.get(max_workers) is pool:
+            del _pools[max_workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_charts(jobs: list, max_workers: int = None, to_buffer: bool = False) -> list:
+    """
+    Render a plan of chart jobs in the shared process pool.
+    Every chart draws on its own Figure, so there is no shared pyplot state.
+    Args:
+        jobs (list): ChartJob instances.
+        max_workers (int): Worker processes, defaults to the number of CPUs.
+        to_buffer (bool): Return the PNG bytes instead of writing the output paths.
+    Returns:
+        list: Paths of the generated PNGs, or their bytes with to_buffer, in the
+        order of the jobs.
+    """
+    render = _render_job_buffer if to_buffer else render_job
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(jobs) <= 1:
+        return [render(job) for job in jobs]
+    pool = get_render_pool(max_workers)
+    try:
+        return list(pool.map(render, jobs))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory), the next call starts a new pool
+        _discard_pool(max_workers, pool)
+        raise
+
+
 # from test_data import *
 
 # graph_map(
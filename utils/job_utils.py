@@ -0,0 +1,312 @@
+"""
+V1 background job queue for the report generation
+"""
+
+__version__ = "1.5.0"
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from db_utils import DB_PATH
+
+MAX_WORKERS = 2
+# Seconds between two heartbeats of a queue, and without one before another
+# queue (e.g. the same app restarted) takes its jobs over
+HEARTBEAT_INTERVAL = 10.0
+STALE_AFTER = 60.0
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS report_jobs (
+        id TEXT PRIMARY KEY,
+        client TEXT NOT NULL,
+        zone_tag TEXT NOT NULL,
+        leq_date TEXT NOT NULL,
+        periods INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        error TEXT,
+        result_path TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        owner TEXT
+    );
+    CREATE TABLE IF NOT EXISTS job_owners (
+        owner TEXT PRIMARY KEY,
+        heartbeat TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS report_jobs_client
+        ON report_jobs (client, created_at);
+    CREATE INDEX IF NOT EXISTS report_jobs_status
+        ON report_jobs (status, client);
+"""
+COLUMNS = (
+    "id",
+    "client",
+    "zone_tag",
+    "leq_date",
+    "periods",
+    "status",
+    "error",
+    "result_path",
+    "created_at",
+    "updated_at",
+)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def _now(seconds_ago: float = 0) -> str:
+    now = datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)
+    return now.strftime(TIME_FORMAT)
+
+
+def build_client_report(job: dict) -> str:
+    """
+    Default job runner: the report of the job client from the artifact store,
+    built only if its data changed since the last one.
+    Args:
+        job (dict): Job row.
+    Returns:
+        str: Path to the PDF.
+    """
+    from client_utils import get_client
+    from report_utils import get_report
+
+    client = get_client(job["client"])
+    _, path = get_report(
+        client["name"],
+        client["logo"],
+        job["zone_tag"],
+        job["leq_date"],
+        job["periods"],
+        layout=client.get("layout"),
+    )
+    return path
+
+
+class JobQueue:
+    """
+    In-process queue running report jobs on a thread pool.
+    Jobs are persisted in the report_jobs table with the queue that owns them.
+    Every queue records a heartbeat in job_owners, the pending jobs of a queue
+    that stopped beating (a restart or a crash) are queued again by a live
+    one, while the jobs of other live processes sharing the table are left alone.
+    """
+
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        max_workers: int = MAX_WORKERS,
+        runner=build_client_report,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+        stale_after: float = STALE_AFTER,
+    ):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.runner = runner
+        self.owner = uuid.uuid4().hex
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        columns = {
+            row[1] for row in self.conn.execute("PRAGMA table_info(report_jobs)")
+        }
+        if "owner" not in columns:
+            self.conn.execute("ALTER TABLE report_jobs ADD COLUMN owner TEXT")
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="report-job"
+        )
+        self._beat()
+        self._reclaim()
+        threading.Thread(
+            target=self._heartbeat,
+            args=(heartbeat_interval,),
+            name="report-job-heartbeat",
+            daemon=True,
+        ).start()
+
+    def _beat(self) -> None:
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO job_owners (owner, heartbeat) VALUES (?, ?)
+                ON CONFLICT (owner) DO UPDATE SET heartbeat = excluded.heartbeat
+                """,
+                (self.owner, _now()),
+            )
+
+    def _reclaim(self) -> list:
+        # Take over the pending jobs whose owner stopped beating, atomically so two
+        # queues starting together never both run them
+        stale = _now(self.stale_after)
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            job_ids = [
+                row[0]
+                for row in self.conn.execute(
+                    """
+                    SELECT id FROM report_jobs
+                    WHERE status IN ('queued', 'running') AND (
+                        owner IS NULL OR owner NOT IN (
+                            SELECT owner FROM job_owners WHERE heartbeat >= ?
+                        )
+                    )
+                    """,
+                    (stale,),
+                )
+            ]
+            self.conn.executemany(
+                """
+                UPDATE report_jobs SET owner = ?, status = 'queued', updated_at = ?
+                WHERE id = ?
+                """,
+                [(self.owner, _now(), job_id) for job_id in job_ids],
+            )
+            self.conn.execute("DELETE FROM job_owners WHERE heartbeat < ?", (stale,))
+        for job_id in job_ids:
+            self.executor.submit(self._run, job_id)
+        return job_ids
+
+    def _heartbeat(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                self._beat()
+                self._reclaim()
+            except Exception as e:
+                print(f"Error in the report job heartbeat: {e}")
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = _now()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"UPDATE report_jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+
+    def enqueue(self, client: str, zone_tag: str, leq_date: str, periods: int) -> str:
+        """
+        Queue a report, unless the same one is already queued or running.
+        Args:
+            client (str): Client key.
+            zone_tag (str): Unique identifier for the Cloudflare zone.
+            leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+            periods (int): Number of days before the end date to include in the range.
+        Returns:
+            str: Job id, the one of the pending job for the same report if any.
+        """
+        job_id = uuid.uuid4().hex
+        now = _now()
+        with self.lock, self.conn:
+            pending = self.conn.execute(
+                """
+                SELECT id FROM report_jobs
+                WHERE status IN ('queued', 'running') AND client = ?
+                    AND zone_tag = ? AND leq_date = ? AND periods = ?
+                ORDER BY created_at LIMIT 1
+                """,
+                (client, zone_tag, leq_date, periods),
+            ).fetchone()
+            if pending:
+                return pending[0]
+            self.conn.execute(
+                """
+                INSERT INTO report_jobs (
+                    id, client, zone_tag, leq_date, periods, status, created_at,
+                    updated_at, owner
+                )
+                VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)
+                """,
+                (job_id, client, zone_tag, leq_date, periods, now, now, self.owner),
+            )
+        self.executor.submit(self._run, job_id)
+        return job_id
+
+    def _run(self, job_id: str) -> None:
+        with self.lock, self.conn:
+            claimed = self.conn.execute(
+                """
+                UPDATE report_jobs SET status = 'running', updated_at = ?
+                WHERE id = ? AND status = 'queued' AND owner = ?
+                """,
+                (_now(), job_id, self.owner),
+            ).rowcount
+        if not claimed:
+            # Taken over by another queue in the meantime
+            return
+        job = self.get(job_id)
+        try:
+            result_path = self.runner(job)
+            self._update(job_id, status="done", result_path=result_path, error=None)
+        except Exception as e:
+            print(f"Error generating report {job_id}: {e}")
+            self._update(job_id, status="failed", error=str(e))
+
+    def get(self, job_id: str):
+        """
+        Read a job.
+        Args:
+            job_id (str): Job id.
+        Returns:
+            dict | None: The job row, None if it does not exist.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM report_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(zip(COLUMNS, row)) if row else None
+
+    def list_jobs(self, client: str = None, limit: int = 50) -> list:
+        """
+        Most recent jobs, newest first.
+        Args:
+            client (str): Only the jobs of this client.
+            limit (int): Maximum number of jobs.
+        Returns:
+            list: Job rows.
+        """
+        query = f"SELECT {', '.join(COLUMNS)} FROM report_jobs"
+        params = ()
+        if client:
+            query += " WHERE client = ?"
+            params = (client,)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self.lock:
+            rows = self.conn.execute(query, (*params, limit)).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def count(self, client: str = None, status: str = "done") -> int:
+        """
+        Number of jobs in a status.
+        Args:
+            client (str): Only the jobs of this client.
+            status (str): Job status, e.g. "done".
+        Returns:
+            int: Number of jobs.
+        """
+        query = "SELECT COUNT(*) FROM report_jobs WHERE status = ?"
+        params = (status,)
+        if client:
+            query += " AND client = ?"
+            params += (client,)
+        with self.lock:
+            return self.conn.execute(query, params).fetchone()[0]
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Process wide job queue, started on first use.
+    Returns:
+        JobQueue: The shared queue.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
@@ -0,0 +1,336 @@
+"""
+V1 declarative report layouts, compiled once into render plans
+"""
+
+__version__ = "1.1.0"
+import json
+import os
+import string
+import threading
+from dataclasses import dataclass
+
+LAYOUTS_DIR = os.getenv("CF_LAYOUTS_DIR", "layouts")
+DEFAULT_LAYOUT = "default"
+# Bump whenever compile_layout places things differently, so plans and reports are rebuilt
+ENGINE_VERSION = "1"
+# Page formats in mm, portrait
+PAGE_SIZES = {"A4": (210.0, 297.0), "Letter": (215.9, 279.4)}
+# Fields the text templates (and image sources) can use
+TEXT_FIELDS = ("client_name", "date", "logo", "leq_date", "since", "until")
+ALIGNS = ("L", "C", "R")
+
+_layouts = {}
+_plans = {}
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class PlanOp:
+    """
+    One drawing instruction of a render plan, boxes in mm from the top left of its page.
+    kind is "page" (start a new page), "text" (value is a template), "image"
+    (value is a path or a template such as "{logo}") or "chart" (value is a chart key).
+    """
+
+    kind: str
+    page: int
+    x: float = 0.0
+    y: float = 0.0
+    w: float = 0.0
+    h: float = 0.0
+    value: str = None
+    size: int = 0
+    style: str = ""
+    align: str = "L"
+
+
+@dataclass(frozen=True)
+class RenderPlan:
+    """
+    A compiled layout: every position is resolved, rendering a report only binds
+    the client, dates and charts into it.
+    """
+
+    name: str
+    version: int
+    page_format: str
+    orientation: str
+    pages: int
+    ops: tuple
+    charts: tuple
+
+    @property
+    def key(self) -> tuple:
+        return (self.name, self.version, ENGINE_VERSION)
+
+    @property
+    def fields(self) -> set:
+        """
+        Text fields used by the texts and images of the plan, e.g. a plan using
+        "date" (the generation date) renders differently every day.
+        """
+        return {
+            name
+            for op in self.ops
+            if op.kind in ("text", "image")
+            for name in _fields(op.value)
+        }
+
+
+def _fields(template: str) -> set:
+    return {name for _, name, _, _ in string.Formatter().parse(template) if name}
+
+
+def _check_template(template, where: str) -> None:
+    if not isinstance(template, str):
+        raise ValueError(f"{where}: expected a string.")
+    unknown = _fields(template) - set(TEXT_FIELDS)
+    if unknown:
+        raise ValueError(f"{where}: unknown fields {sorted(unknown)}.")
+
+
+def _check_number(value, where: str, minimum: float = 0.0) -> None:
+    if not isinstance(value, (int, float)) or value < minimum:
+        raise ValueError(f"{where}: expected a number >= {minimum}.")
+
+
+def _check_align(item: dict, where: str) -> None:
+    if item.get("align", "L") not in ALIGNS:
+        raise ValueError(f"{where}.align: expected one of {ALIGNS}.")
+
+
+def _page_size(page: dict) -> tuple:
+    width, height = PAGE_SIZES[page.get("format", "A4")]
+    if page.get("orientation", "P") == "L":
+        width, height = height, width
+    return width, height
+
+
+def validate_layout(layout: dict) -> dict:
+    """
+    Check a layout before it is compiled.
+    A layout has a "name", a "version" (bump it on every change), a "page"
+    ({"format", "orientation", "margin", "bottom"}), an optional "header" with
+    absolutely placed "texts" and "images", and "sections" with a "title" and
+    "rows". Each row has a "height" and "slots", each slot a "chart" key and an
+    optional "span" (its share of the row width). Sections are laid out one after
+    the other and a row that does not fit in the page starts a new one.
+    Args:
+        layout (dict): The layout.
+    Returns:
+        dict: The same layout.
+    Raises:
+        ValueError: If a field is missing or invalid, the message tells which one.
+    """
+    for name in ("name", "version", "sections"):
+        if name not in layout:
+            raise ValueError(f"Layout is missing '{name}'.")
+    page = layout.get("page", {})
+    if page.get("format", "A4") not in PAGE_SIZES:
+        raise ValueError(f"page.format: expected one of {list(PAGE_SIZES)}.")
+    if page.get("orientation", "P") not in ("P", "L"):
+        raise ValueError("page.orientation: expected 'P' or 'L'.")
+    _check_number(page.get("margin", 10), "page.margin")
+    _check_number(page.get("bottom", page.get("margin", 10)), "page.bottom")
+    width, height = _page_size(page)
+    margin = page.get("margin", 10)
+    usable = height - margin - page.get("bottom", margin)
+    header = layout.get("header", {})
+    _check_number(header.get("height", margin), "header.height")
+    for i, text in enumerate(header.get("texts", [])):
+        where = f"header.texts[{i}]"
+        _check_template(text.get("text"), f"{where}.text")
+        _check_number(text.get("y"), f"{where}.y")
+        _check_align(text, where)
+    for i, image in enumerate(header.get("images", [])):
+        where = f"header.images[{i}]"
+        _check_template(image.get("src"), f"{where}.src")
+        for name in ("x", "y", "w", "h"):
+            _check_number(image.get(name), f"{where}.{name}")
+        _check_align(image, where)
+    title_height = layout.get("section_title", {}).get("height", 10)
+    _check_number(layout.get("row_gap", 5), "row_gap")
+    _check_number(layout.get("column_gap", 5), "column_gap")
+    for i, section in enumerate(layout["sections"]):
+        where = f"sections[{i}]"
+        if section.get("title") is not None:
+            _check_template(section["title"], f"{where}.title")
+        if not section.get("rows"):
+            raise ValueError(f"{where}.rows: expected at least one row.")
+        for j, row in enumerate(section["rows"]):
+            row_where = f"{where}.rows[{j}]"
+            _check_number(row.get("height"), f"{row_where}.height", 1)
+            if row["height"] + title_height > usable:
+                raise ValueError(f"{row_where}.height: taller than a page.")
+            if not row.get("slots"):
+                raise ValueError(f"{row_where}.slots: expected at least one slot.")
+            gaps = layout.get("column_gap", 5) * (len(row["slots"]) - 1)
+            if gaps >= width - 2 * margin:
+                raise ValueError(f"{row_where}.slots: too many for the page width.")
+            for k, slot in enumerate(row["slots"]):
+                if not isinstance(slot.get("chart"), str):
+                    raise ValueError(f"{row_where}.slots[{k}].chart: expected a key.")
+                _check_number(slot.get("span", 1), f"{row_where}.slots[{k}].span", 1)
+                _check_align(slot, f"{row_where}.slots[{k}]")
+    return layout
+
+
+def compile_layout(layout: dict) -> RenderPlan:
+    """
+    Resolve every position of a layout: the header on the first page, then the
+    sections in flow order, a section title is kept on the page of its first row.
+    Args:
+        layout (dict): A valid layout, see validate_layout.
+    Returns:
+        RenderPlan: The plan, reusable for any number of reports.
+    """
+    page_settings = layout.get("page", {})
+    width, height = _page_size(page_settings)
+    margin = page_settings.get("margin", 10)
+    limit = height - page_settings.get("bottom", margin)
+    content_width = width - 2 * margin
+    title = layout.get("section_title", {})
+    title_height = title.get("height", 10)
+    title_spacing = title.get("spacing", 0)
+    row_gap = layout.get("row_gap", 5)
+    column_gap = layout.get("column_gap", 5)
+
+    page = 0
+    ops = [PlanOp("page", page)]
+    header = layout.get("header", {})
+    for text in header.get("texts", []):
+        ops.append(
+            PlanOp(
+                "text",
+                page,
+                text.get("x", margin),
+                text["y"],
+                text.get("w", content_width),
+                text.get("h", 10),
+                text["text"],
+                text.get("size", 12),
+                text.get("style", ""),
+                text.get("align", "L"),
+            )
+        )
+    for image in header.get("images", []):
+        ops.append(
+            PlanOp(
+                "image",
+                page,
+                image["x"],
+                image["y"],
+                image["w"],
+                image["h"],
+                image["src"],
+                align=image.get("align", "L"),
+            )
+        )
+
+    y = header.get("height", margin)
+    charts = []
+    for section in layout["sections"]:
+        if section.get("break_before") and y > margin:
+            page, y = page + 1, margin
+            ops.append(PlanOp("page", page))
+        for i, row in enumerate(section["rows"]):
+            has_title = i == 0 and section.get("title") is not None
+            needed = row["height"] + (title_height + title_spacing if has_title else 0)
+            if y + needed > limit and y > margin:
+                page, y = page + 1, margin
+                ops.append(PlanOp("page", page))
+            if has_title:
+                ops.append(
+                    PlanOp(
+                        "text",
+                        page,
+                        margin,
+                        y,
+                        content_width,
+                        title_height,
+                        section["title"],
+                        title.get("size", 14),
+                        title.get("style", "B"),
+                        title.get("align", "L"),
+                    )
+                )
+                y += title_height + title_spacing
+            slots = row["slots"]
+            free = content_width - column_gap * (len(slots) - 1)
+            spans = sum(slot.get("span", 1) for slot in slots)
+            x = margin
+            for slot in slots:
+                slot_width = free * slot.get("span", 1) / spans
+                ops.append(
+                    PlanOp(
+                        "chart",
+                        page,
+                        x,
+                        y,
+                        slot_width,
+                        row["height"],
+                        slot["chart"],
+                        align=slot.get("align", "C"),
+                    )
+                )
+                charts.append(slot["chart"])
+                x += slot_width + column_gap
+            y += row["height"] + row_gap
+    return RenderPlan(
+        name=layout["name"],
+        version=layout["version"],
+        page_format=page_settings.get("format", "A4"),
+        orientation=page_settings.get("orientation", "P"),
+        pages=page + 1,
+        ops=tuple(ops),
+        charts=tuple(charts),
+    )
+
+
+def load_layout(name: str = None, directory: str = None) -> dict:
+    """
+    Read and validate a layout file, again only when the file changes.
+    Args:
+        name (str): Layout name, <directory>/<name>.json, defaults to DEFAULT_LAYOUT.
+        directory (str): Layouts directory, defaults to CF_LAYOUTS_DIR or layouts.
+    Returns:
+        dict: The layout.
+    Raises:
+        KeyError: If there is no such layout.
+        ValueError: If the layout is invalid.
+    """
+    path = os.path.join(directory or LAYOUTS_DIR, f"{name or DEFAULT_LAYOUT}.json")
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        raise KeyError(f"Unknown layout: '{name or DEFAULT_LAYOUT}'.")
+    with _lock:
+        cached = _layouts.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(path, encoding="utf-8") as f:
+        layout = validate_layout(json.load(f))
+    with _lock:
+        _layouts[path] = (mtime, layout)
+    return layout
+
+
+def get_render_plan(name: str = None, directory: str = None) -> RenderPlan:
+    """
+    Compiled plan of a layout, shared by every report (and client) using it.
+    Plans are cached by layout name and version, bump the version on every edit.
+    Args:
+        name (str): Layout name, defaults to DEFAULT_LAYOUT.
+        directory (str): Layouts directory, defaults to CF_LAYOUTS_DIR or layouts.
+    Returns:
+        RenderPlan: The plan.
+    """
+    layout = load_layout(name, directory)
+    key = (directory or LAYOUTS_DIR, name or DEFAULT_LAYOUT, layout["version"])
+    with _lock:
+        plan = _plans.get(key)
+    if plan is None:
+        plan = compile_layout(layout)
+        with _lock:
+            _plans[key] = plan
+    return plan
@@ -0,0 +1,177 @@
+"""
+V1 derived metrics: rates and stats computed from the snapshots
+"""
+
+__version__ = "1.2.0"
+import numpy as np
+from aggregate_utils import MapAggregate
+from cloudflare_utils import ZoneSnapshot, get_zone_snapshots
+from db_utils import NON_ADDITIVE_METRICS, MetricStore
+from frame_utils import safe_divide, to_days
+
+# Rate name: (numerator, denominator), both frame columns
+RATES = {
+    "cached_request_rate": ("cached_requests", "requests"),
+    "cached_bandwidth_rate": ("cached_bytes", "bytes"),
+    "encrypted_request_rate": ("encrypted_requests", "requests"),
+    "encrypted_bandwidth_rate": ("encrypted_bytes", "bytes"),
+    "error_4xx_rate": ("status_4xx", "requests"),
+    "error_5xx_rate": ("status_5xx", "requests"),
+}
+# Difference name: (minuend, subtrahend)
+DIFFERENCES = {
+    "uncached_requests": ("requests", "cached_requests"),
+    "uncached_bytes": ("bytes", "cached_bytes"),
+}
+TOP_COUNTRIES = 5
+
+
+def stack_snapshots(snapshots: dict) -> tuple:
+    """
+    Align the frames of many zones into zones x days matrices.
+    Args:
+        snapshots (dict): Zone tags as keys and their ZoneSnapshot (same window) as values.
+    Returns:
+        tuple: Zone tags, datetime64[D] dates, {column: 2D int64 array} and a 2D
+        boolean array telling which days had data. An empty window (periods=0)
+        gives zero columns arrays.
+    Raises:
+        ValueError: If the snapshots do not share the same window.
+    """
+    zone_tags = list(snapshots)
+    windows = {(snapshot.since, snapshot.until) for snapshot in snapshots.values()}
+    if len(windows) > 1:
+        raise ValueError("Snapshots must share the same window.")
+    frames = [snapshots[zone_tag].frame for zone_tag in zone_tags]
+    dates = frames[0].dates if frames else to_days([])
+    columns = {
+        name: np.vstack([frame.column(name) for frame in frames])
+        for name in (frames[0].metrics if frames else ())
+    }
+    present = np.zeros((len(zone_tags), len(dates)), dtype=bool)
+    if not len(dates):
+        return zone_tags, dates, columns, present
+    for row, zone_tag in enumerate(zone_tags):
+        days = to_days([day.date for day in snapshots[zone_tag].days])
+        present[row, (days - dates[0]).astype(np.int64)] = True
+    return zone_tags, dates, columns, present
+
+
+def derive_metrics(snapshots: dict) -> dict:
+    """
+    Window stats of many zones in one pass: totals, uncached totals, the RATES
+    over the whole window, bandwidth saved, max and min unique visitors per day
+    and the top countries. Rates are 0 when the denominator is 0, days without
+    data are left out of the unique visitors max and min.
+    Args:
+        snapshots (dict): Zone tags as keys and their ZoneSnapshot (same window) as values.
+    Returns:
+        dict: Zone tags as keys and a {stat: value} dict as values.
+    """
+    if not snapshots:
+        return {}
+    zone_tags, _, columns, present = stack_snapshots(snapshots)
+    # Distinct visitors cannot be added across days, only their max and min are kept
+    totals = {
+        name: values.sum(axis=1)
+        for name, values in columns.items()
+        if name not in NON_ADDITIVE_METRICS
+    }
+    derived = {
+        name: totals[minuend] - totals[subtrahend]
+        for name, (minuend, subtrahend) in DIFFERENCES.items()
+    }
+    rates = {
+        name: safe_divide(totals[numerator], totals[denominator])
+        for name, (numerator, denominator) in RATES.items()
+    }
+    uniques = columns["uniques"]
+    has_days = present.any(axis=1)
+    lowest, highest = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+    uniques_max = np.where(present, uniques, lowest).max(axis=1, initial=lowest)
+    uniques_min = np.where(present, uniques, highest).min(axis=1, initial=highest)
+    results = {}
+    for row, zone_tag in enumerate(zone_tags):
+        stats = {name: int(values[row]) for name, values in totals.items()}
+        stats.update({name: int(values[row]) for name, values in derived.items()})
+        stats.update({name: float(values[row]) for name, values in rates.items()})
+        stats["bandwidth_saved"] = stats["cached_bytes"]
+        stats["bandwidth_saved_rate"] = stats["cached_bandwidth_rate"]
+        stats["uniques_max"] = int(uniques_max[row]) if has_days[row] else 0
+        stats["uniques_min"] = int(uniques_min[row]) if has_days[row] else 0
+        stats["top_countries"] = (
+            snapshots[zone_tag].aggregate("country_requests").top(TOP_COUNTRIES)
+        )
+        results[zone_tag] = stats
+    return results
+
+
+def merge_breakdowns(snapshots: dict, dimension: str) -> MapAggregate:
+    """
+    Totals of a map dimension over many zones, e.g. the countries of every zone
+    of a client, merged from the per zone aggregates.
+    Args:
+        snapshots (dict): Zone tags as keys and their ZoneSnapshot as values.
+        dimension (str): Name of a map DailyMetrics field, e.g. "country_requests".
+    Returns:
+        MapAggregate: The merged totals, use top() for the heaviest keys.
+    """
+    return MapAggregate.merge_all(
+        snapshot.aggregate(dimension) for snapshot in snapshots.values()
+    )
+
+
+def derive_daily_rates(snapshots: dict) -> dict:
+    """
+    Daily RATES and DIFFERENCES of many zones, 0 on the days without requests.
+    Args:
+        snapshots (dict): Zone tags as keys and their ZoneSnapshot (same window) as values.
+    Returns:
+        dict: "dates" with the ISO dates of the window, and the zone tags as keys
+        with a {name: np.ndarray} dict as values.
+    """
+    if not snapshots:
+        return {"dates": []}
+    zone_tags, dates, columns, _ = stack_snapshots(snapshots)
+    daily = {
+        name: safe_divide(columns[numerator], columns[denominator])
+        for name, (numerator, denominator) in RATES.items()
+    }
+    daily.update(
+        {
+            name: columns[minuend] - columns[subtrahend]
+            for name, (minuend, subtrahend) in DIFFERENCES.items()
+        }
+    )
+    results = {"dates": np.datetime_as_string(dates, unit="D").tolist()}
+    for row, zone_tag in enumerate(zone_tags):
+        results[zone_tag] = {name: values[row] for name, values in daily.items()}
+    return results
+
+
+def get_derived_metrics(
+    zone_tags: list, leq_date: str, periods: int, store: MetricStore = None
+) -> dict:
+    """
+    Derived metrics of many zones from a single consolidated fetch.
+    Args:
+        zone_tags (list): Unique identifiers for the Cloudflare zones.
+        leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+        periods (int): Number of days before the end date to include in the range.
+        store (MetricStore): Local store, defaults to get_metric_store().
+    Returns:
+        dict: Zone tags as keys and their derive_metrics stats as values.
+    """
+    snapshots = get_zone_snapshots(zone_tags, leq_date, periods, store)
+    return derive_metrics(snapshots)
+
+
+def get_zone_derived_metrics(snapshot: ZoneSnapshot) -> dict:
+    """
+    Derived metrics of a single snapshot.
+    Args:
+        snapshot (ZoneSnapshot): Metrics of the zone for a window.
+    Returns:
+        dict: {stat: value}, see derive_metrics.
+    """
+    return derive_metrics({snapshot.zone_tag: snapshot})[snapshot.zone_tag]
@@ -2,99 +2,339 @@
 V3 functions neccesary to run the pdf creation
 """
 
-__version__ = "3.0.0"
+__version__ = "3.9.0"
 
-from datetime import datetime
+import hashlib
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime, timezone
+from functools import lru_cache
+from io import BytesIO
 
-from fpdf import FPDF
+from layout_utils import PlanOp, RenderPlan, get_render_plan
 
+# fpdf, numpy and the vector charts are imported inside the functions that build
+# documents, so importing this module (e.g. from the web app) stays cheap until
+# a report is rendered
 
-def create_pdf_report(client_name: str, client_image_path: str):
+FONT = "Arial"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _png_stream(pixels: "np.ndarray") -> bytes:
+    import numpy as np
+
+    # PNG predictor layout: every row starts with its filter type (0, none)
+    rows = np.hstack([np.zeros((pixels.shape[0], 1), dtype=np.uint8), pixels])
+    return zlib.compress(rows.tobytes())
+
+
+def parse_png_bytes(data: bytes) -> dict:
+    """
+    Decode a PNG held in memory into FPDF image info.
+    Args:
+        data (bytes): PNG file contents.
+    Returns:
+        dict: The info dict FPDF._parsepng returns for a file.
+    """
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(BytesIO(data)) as image:
+        pixels = np.asarray(image.convert("RGBA"))
+    height, width = pixels.shape[:2]
+    info = {
+        "w": width,
+        "h": height,
+        "cs": "DeviceRGB",
+        "bpc": 8,
+        "f": "FlateDecode",
+        "dp": f"/Predictor 15 /Colors 3 /BitsPerComponent 8 /Columns {width}",
+        "pal": "",
+        "trns": "",
+        "data": _png_stream(pixels[:, :, :3].reshape(height, width * 3)),
+    }
+    alpha = pixels[:, :, 3]
+    if alpha.min() < 255:
+        info["smask"] = _png_stream(alpha)
+    return info
+
+
+@lru_cache(maxsize=1)
+def report_pdf_class() -> type:
+    """
+    The ReportPDF class, defined on first use so fpdf is only imported by the
+    processes that render documents.
+    Returns:
+        type: ReportPDF, an FPDF subclass.
+    """
+    from fpdf import FPDF
+
+    class ReportPDF(FPDF):
+        """
+        FPDF that can also place PNG images held in memory.
+        """
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.image_buffers = {}
+
+        def image_buffer(
+            self, name: str, data: bytes, x=None, y=None, w=0, h=0
+        ) -> None:
+            """
+            Put a PNG held in memory on the page.
+            Args:
+                name (str): Unique name of the image inside the document.
+                data (bytes): PNG file contents.
+                x, y, w, h: Same as FPDF.image.
+            """
+            self.image_buffers[name] = data
+            self.image(name, x=x, y=y, w=w, h=h, type="png")
+
+        def image_asset(self, digest: str, info: dict, **place) -> None:
+            """
+            Put a static image from the ImageRegistry on the page, it is embedded once
+            per document however many times it is placed.
+            Args:
+                digest (str): Content hash of the image, from ImageRegistry.get.
+                info (dict): Its FPDF image info, shared: it is copied, never modified.
+                **place: x, y, w, h, same as FPDF.image.
+            """
+            name = f"asset:{digest}"
+            if name not in self.images:
+                # A shallow copy: the streams are shared, but FPDF numbers the image and
+                # deletes its data from the dict once written out
+                self.images[name] = dict(info, i=len(self.images) + 1)
+                if "smask" in info and self.pdf_version < "1.4":
+                    self.pdf_version = "1.4"
+            self.image(name, **place)
+
+        def _parsepng(self, name):
+            if name not in self.image_buffers:
+                return super()._parsepng(name)
+            info = parse_png_bytes(self.image_buffers.pop(name))
+            if "smask" in info and self.pdf_version < "1.4":
+                self.pdf_version = "1.4"
+            return info
+
+    return ReportPDF
+
+
+class ImageRegistry:
+    """
+    Static images (logos, fallback charts) decoded and compressed once per process.
+    Entries are keyed by content hash, so the same logo under assets/,
+    assets_legacy/ or static/ is parsed and embedded only once. A file is read
+    again only when its size or modification time changes.
+    """
+
+    def __init__(self):
+        self._paths = {}
+        self._images = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> tuple:
+        """
+        Parsed image of a file.
+        Args:
+            path (str): Path to a PNG or JPEG file.
+        Returns:
+            tuple: (digest, info), info is the FPDF image info dict, shared by
+                every caller: copy it before handing it to a document.
+        """
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._paths.get(path)
+            if cached is not None and cached[0] == stamp:
+                return cached[1], self._images[cached[1]]
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        with self._lock:
+            info = self._images.get(digest)
+        if info is None:
+            info = self._parse(path)
+            with self._lock:
+                info = self._images.setdefault(digest, info)
+        with self._lock:
+            self._paths[path] = (stamp, digest)
+        return digest, info
+
+    @staticmethod
+    def _parse(path: str) -> dict:
+        from fpdf import FPDF
+
+        parser = FPDF()
+        if path.lower().endswith((".jpg", ".jpeg")):
+            return parser._parsejpg(path)
+        return parser._parsepng(path)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: Number of known paths and of distinct images.
+        """
+        with self._lock:
+            return {"paths": len(self._paths), "images": len(self._images)}
+
+
+def get_image_registry() -> ImageRegistry:
     """
-    Creates a PDF report with sections and manually placed images.
+    Process wide registry of static images.
+    Returns:
+        ImageRegistry: The shared registry.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ImageRegistry()
+        return _registry
+
 
+def image_size(image) -> tuple:
+    """
+    Pixel size of an image, read from the PNG header when possible.
     Args:
-        client_name (str): Name of the client.
-        client_image_path (str): Path to the client's logo.
+        image (bytes | str): PNG bytes or path to an image file.
+    Returns:
+        tuple: (width, height) in pixels.
+    """
+    if isinstance(image, bytes):
+        header = image[:24]
+    else:
+        with open(image, "rb") as f:
+            header = f.read(24)
+    if header[:8] == PNG_SIGNATURE:
+        return struct.unpack(">II", header[16:24])
+    from PIL import Image
+
+    with Image.open(BytesIO(image) if isinstance(image, bytes) else image) as opened:
+        return opened.size
+
+
+def _fit(size: tuple, op: PlanOp) -> dict:
+    # Largest box with the image aspect ratio inside the slot, aligned horizontally
+    width, height = size
+    scale = min(op.w / width, op.h / height)
+    w, h = width * scale, height * scale
+    x = {"L": op.x, "C": op.x + (op.w - w) / 2, "R": op.x + op.w - w}[op.align]
+    return {"x": x, "y": op.y, "w": w, "h": h}
+
+
+def _place_asset(pdf: "ReportPDF", path: str, op: PlanOp) -> None:
+    digest, info = get_image_registry().get(path)
+    pdf.image_asset(digest, info, **_fit((info["w"], info["h"]), op))
+
+
+class _Context(dict):
+    def __missing__(self, key: str) -> str:
+        return ""
 
-    The PDF will be saved with the format "<CLIENT_NAME>_report_<TODAY_DATE>.pdf".
+
+def render_plan(plan: RenderPlan, context: dict, charts: dict = None) -> bytes:
     """
-    # Create the PDF instance
-    pdf = FPDF()
-    pdf.add_page()
-
-    # Set title and date
-    today_date = datetime.today().strftime("%Y-%m-%d")
-    pdf.set_font("Arial", size=16, style="B")
-    # pdf.cell(0, 10, txt=f"Reporte de red: {client_name}", ln=True, align="C")
-    pdf.cell(0, 10, txt="Reporte de red: CLIENTE", ln=True, align="C")
-    pdf.set_font("Arial", size=12)
-    pdf.cell(0, 10, txt=f"Fecha: {today_date}", ln=True, align="C")
-    pdf.ln(10)  # Add space after the title
-
-    # Add header images
-    pdf.image("assets/atdac_logo.png", x=10, y=10, w=30)  # Smaller ATDAC logo
-    pdf.image(client_image_path, x=160, y=10, w=30)  # Upper right corner
-    pdf.ln(10)  # Add space after the logos
-
-    # Section: Estadísticas generales
-    pdf.set_font("Arial", size=14, style="B")
-    pdf.cell(0, 10, txt="Estadísticas generales", ln=True, align="L")
-    pdf.ln(5)  # Add some space after the title
-
-    # Row 1: 4 images horizontally
-    y_position_row1 = pdf.get_y()  # Get current y position after the title
-    pdf.image("assets/general_stats/bandwidth.png", x=10, y=y_position_row1, w=45, h=20)
-    pdf.image("assets/general_stats/requests.png", x=60, y=y_position_row1, w=45, h=20)
-    pdf.image("assets/general_stats/views.png", x=110, y=y_position_row1, w=45, h=20)
-    pdf.image("assets/general_stats/visitas.png", x=160, y=y_position_row1, w=45, h=20)
-
-    # Row 2: 2 larger images horizontally below row 1
-    y_position_row2 = y_position_row1 + 25  # Add space below row 1
-    pdf.image("assets/general_stats/table.png", x=5, y=y_position_row2, w=100, h=60)
-    pdf.image(
-        "assets/general_stats/requests_map.png", x=110, y=y_position_row2, w=100, h=60
-    )
-    pdf.ln(90)  # Add space after this section
-
-    # Section: Network
-    pdf.set_font("Arial", size=14, style="B")
-    pdf.cell(0, 10, txt="Network", ln=True, align="L")
-    pdf.ln(5)  # Add space after the title
-    y_position_network = pdf.get_y()  # Get the current y position for Network images
-    pdf.image("assets/network/content_type.png", x=5, y=y_position_network, w=60, h=30)
-    pdf.image(
-        "assets/network/html_versions.png", x=75, y=y_position_network, w=60, h=30
+    Bind the data of a report into a compiled layout.
+    Args:
+        plan (RenderPlan): Compiled layout, from layout_utils.get_render_plan.
+        context (dict): Values of the text fields (client_name, date, logo...).
+        charts (dict): Chart keys as keys and PNG bytes, paths or VectorChart
+            instances (drawn in their whole slot) as values, missing charts leave
+            their slot empty. Tables longer than their slot continue on pages
+            added after the layout ones. Without it every chart is read from
+            assets/<key>.png.
+    Returns:
+        bytes: The PDF document.
+    """
+    from vector_utils import VectorChart
+
+    context = _Context(context)
+    pdf = report_pdf_class()(
+        orientation=plan.orientation, unit="mm", format=plan.page_format
     )
-    pdf.image("assets/network/ssl_content.png", x=145, y=y_position_network, w=60, h=30)
-    pdf.ln(30)
-
-    # Seguridad
-    pdf.set_font("Arial", size=14, style="B")
-    pdf.cell(0, 10, txt="Seguridad", ln=True, align="L")
-    pdf.image("assets/security/encrypted_bandwidth.png", x=10, y=210, w=90)
-    pdf.image("assets/security/encrypted_requests.png", x=110, y=210, w=90)
-    pdf.ln(20)  # Add space after the title
-
-    # Section: Cache
-    pdf.set_font("Arial", size=14, style="B")
-    pdf.cell(0, 10, txt="Cache", ln=True, align="L")
-    pdf.image("assets/cache/cached_bandwidth.png", x=10, y=240, w=90)
-    pdf.image("assets/cache/cached_requests.png", x=110, y=240, w=90)
-    pdf.ln(15)
-
-    # Section: Errores
-    pdf.set_font("Arial", size=14, style="B")
-    pdf.cell(0, 10, txt="Errores", ln=True, align="L")
-    pdf.image("assets/errors/four_errors.png", x=10, y=270, w=90)
-    pdf.image("assets/errors/five_errors.png", x=110, y=270, w=90)
-
-    # Save the PDF
-    # file_name = f"{client_name}_report_{today_date}.pdf".replace(" ", "_")
-    file_name = "assets/report.pdf"
-    pdf.output(file_name)
-    print(f"PDF report saved as {file_name}")
+    pdf.set_auto_page_break(False)
+    overflow = []
+    for op in plan.ops:
+        if op.kind == "page":
+            pdf.add_page()
+        elif op.kind == "text":
+            pdf.set_font(FONT, size=op.size, style=op.style)
+            pdf.set_xy(op.x, op.y)
+            pdf.cell(op.w, op.h, txt=op.value.format_map(context), align=op.align)
+        elif op.kind == "image":
+            path = op.value.format_map(context)
+            if path:
+                _place_asset(pdf, path, op)
+        elif op.kind == "chart":
+            chart = f"assets/{op.value}.png" if charts is None else charts.get(op.value)
+            if isinstance(chart, VectorChart):
+                rest = chart.draw(pdf, op.x, op.y, op.w, op.h)
+                if rest is not None:
+                    overflow.append(rest)
+            elif isinstance(chart, bytes):
+                pdf.image_buffer(op.value, chart, **_fit(image_size(chart), op))
+            elif chart is not None:
+                _place_asset(pdf, chart, op)
+    # What did not fit in its slot (long tables) continues on pages of its own
+    while overflow:
+        pdf.add_page()
+        box = (pdf.l_margin, pdf.t_margin, pdf.w - pdf.l_margin - pdf.r_margin)
+        rest = overflow.pop(0).draw(pdf, *box, pdf.h - pdf.t_margin - pdf.b_margin)
+        if rest is not None:
+            overflow.append(rest)
+    return pdf.output(dest="S").encode("latin1")
+
+
+def create_pdf_report(
+    client_name: str,
+    client_image_path: str,
+    charts: dict = None,
+    output_path: str = None,
+    layout: str = None,
+    since: str = None,
+    until: str = None,
+) -> bytes:
+    """
+    Creates the PDF report of a client from its layout, see layouts/default.json.
+
+    Args:
+        client_name (str): Name of the client.
+        client_image_path (str): Path to the client's logo.
+        charts (dict): Chart keys (e.g. "general_stats/bandwidth") as keys and PNG
+            bytes, paths or VectorChart instances as values, missing charts are left
+            out. Without it every chart is read from assets/<key>.png.
+        output_path (str): Also save the PDF there, e.g.
+            "<CLIENT_NAME>_report_<TODAY_DATE>.pdf".
+        layout (str): Layout name, defaults to layout_utils.DEFAULT_LAYOUT.
+        since (str): First day of the data (YYYY-MM-DD), defaults to today.
+        until (str): Last day of the data (YYYY-MM-DD), defaults to today.
+    Returns:
+        bytes: The PDF document.
+    """
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    context = {
+        "client_name": client_name,
+        "logo": client_image_path,
+        "date": today,
+        "since": since or today,
+        "until": until or today,
+        "leq_date": until or today,
+    }
+    document = render_plan(get_render_plan(layout), context, charts)
+    if output_path:
+        with open(output_path, "wb") as f:
+            f.write(document)
+        print(f"PDF report saved as {output_path}")
+    return document
 
 
 # Example Usage
-create_pdf_report("ACME Corporation", "assets/ACME_logo.png")
+if __name__ == "__main__":
+    create_pdf_report(
+        "ACME Corporation", "assets/ACME_logo.png", output_path="assets/report.pdf"
+    )
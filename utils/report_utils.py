@@ -0,0 +1,281 @@
+"""
+V1 end to end report pipeline: fetch, render and assemble in memory
+"""
+
+__version__ = "1.10.0"
+from aggregate_utils import OTHER_LABEL
+from artifact_utils import ArtifactStore, digest, file_digest, get_artifact_store
+from cloudflare_utils import ZoneSnapshot, get_zone_snapshot
+from db_utils import utc_today
+from image_utils import ChartJob, render_charts
+from layout_utils import get_render_plan
+from vector_utils import VECTOR_FUNCTIONS, vector_chart
+
+# Bump whenever the charts change, so cached artifacts are rebuilt. The PDF
+# layouts carry their own version, see layout_utils
+LAYOUT_VERSION = "4"
+# Bars per bar chart, the smaller values are summed in one more bar
+BAR_TOP = 5
+
+# Chart key (and title, its last part), kind, snapshot frame column or breakdown, options
+REPORT_CHARTS = (
+    ("general_stats/bandwidth", "line", "bytes", {"data_type": "bytes"}),
+    ("general_stats/requests", "line", "requests", {}),
+    ("general_stats/views", "line", "page_views", {}),
+    ("general_stats/visitas", "line", "uniques", {}),
+    ("general_stats/table", "table", ("country_requests", "country_bytes"), {}),
+    ("general_stats/requests_map", "map", "country_requests", {}),
+    ("network/content_type", "bar", "content_types", {}),
+    ("network/html_versions", "bar", "http_versions", {}),
+    ("network/ssl_content", "bar", "ssl_protocols", {}),
+    ("security/encrypted_bandwidth", "line", "encrypted_bytes", {"data_type": "bytes"}),
+    ("security/encrypted_requests", "line", "encrypted_requests", {}),
+    ("cache/cached_bandwidth", "line", "cached_bytes", {"data_type": "bytes"}),
+    ("cache/cached_requests", "line", "cached_requests", {}),
+    ("errors/four_errors", "line", "status_4xx", {}),
+    ("errors/five_errors", "line", "status_5xx", {}),
+)
+
+
+def chart_jobs(snapshot: ZoneSnapshot) -> list:
+    """
+    Render plan of every chart in the report for a snapshot.
+    Args:
+        snapshot (ZoneSnapshot): Metrics of the zone for the report window.
+    Returns:
+        list: ChartJob instances, output_path holds the chart key.
+    """
+    jobs = []
+    for key, kind, source, options in REPORT_CHARTS:
+        if kind == "table":
+            requests = snapshot.aggregate(source[0]).top()
+            bandwidth = snapshot.breakdown(source[1])
+            args = (
+                requests,
+                {country: bandwidth.get(country, 0) for country in requests},
+            )
+        elif kind == "map":
+            args = (snapshot.aggregate(source).top(),)
+        elif kind == "bar":
+            args = (snapshot.aggregate(source).top(BAR_TOP, OTHER_LABEL),)
+        else:
+            # Line charts get their column of the frame, no dict to parse and sort
+            args = (snapshot.frame.select([source]),)
+        jobs.append(ChartJob(kind, args, key, options))
+    return jobs
+
+
+def chart_key(job: ChartJob) -> str:
+    """
+    Artifact key of a chart: its kind, data, options and the layout version.
+    Args:
+        job (ChartJob): Chart to render.
+    Returns:
+        str: Hex digest.
+    """
+    return digest(
+        "chart", LAYOUT_VERSION, job.kind, job.args, job.output_path, job.options
+    )
+
+
+def render_report_charts(
+    snapshot: ZoneSnapshot,
+    max_workers: int = None,
+    store: ArtifactStore = None,
+    vector: bool = True,
+) -> dict:
+    """
+    Render every chart of a report.
+    Line and bar charts and tables are left to the PDF engine, which draws them
+    natively. The other charts are rendered into PNG bytes, the ones already in the
+    artifact store are read from it, only the ones whose data changed are rendered.
+    Args:
+        snapshot (ZoneSnapshot): Metrics of the zone for the report window.
+        max_workers (int): Worker processes for the render plan.
+        store (ArtifactStore): Artifact store, defaults to get_artifact_store().
+        vector (bool): Draw line and bar charts and tables in the PDF, False
+            renders every chart with matplotlib.
+    Returns:
+        dict: Chart keys as keys and PNG bytes or VectorChart instances as values.
+    """
+    store = store or get_artifact_store()
+    charts = {}
+    missing = []
+    for job in chart_jobs(snapshot):
+        if not job.args[0]:
+            continue
+        if vector and job.kind in VECTOR_FUNCTIONS:
+            charts[job.output_path] = vector_chart(job)
+            continue
+        key = chart_key(job)
+        buffer = store.read(key, "png")
+        if buffer is None:
+            missing.append((key, job))
+        else:
+            charts[job.output_path] = buffer
+    buffers = render_charts([job for _, job in missing], max_workers, to_buffer=True)
+    for (key, job), buffer in zip(missing, buffers):
+        store.put(key, buffer, "png")
+        charts[job.output_path] = buffer
+    return charts
+
+
+def report_key(
+    client_name: str,
+    client_image_path: str,
+    snapshot: ZoneSnapshot,
+    layout: str = None,
+) -> str:
+    """
+    Artifact key of a report: client, logo, window, metric data, chart and layout
+    versions, and today's date when the layout prints the generation date.
+    Args:
+        client_name (str): Name of the client.
+        client_image_path (str): Path to the client's logo.
+        snapshot (ZoneSnapshot): Metrics of the zone for the report window.
+        layout (str): Layout name, defaults to layout_utils.DEFAULT_LAYOUT.
+    Returns:
+        str: Hex digest.
+    """
+    plan = get_render_plan(layout)
+    return digest(
+        "report",
+        LAYOUT_VERSION,
+        plan.key,
+        utc_today() if "date" in plan.fields else None,
+        client_name,
+        file_digest(client_image_path),
+        snapshot.zone_tag,
+        snapshot.since,
+        snapshot.until,
+        snapshot.digest(),
+    )
+
+
+def _fetch(zone_tag: str, leq_date: str, periods: int) -> ZoneSnapshot:
+    snapshot = get_zone_snapshot(zone_tag, leq_date, periods)
+    if not snapshot.days:
+        raise ValueError(f"No data available for zone {zone_tag}.")
+    return snapshot
+
+
+def build_report(
+    client_name: str,
+    client_image_path: str,
+    zone_tag: str,
+    leq_date: str,
+    periods: int,
+    max_workers: int = None,
+    layout: str = None,
+) -> bytes:
+    """
+    Fetch, render and assemble the report of a client without touching the
+    shared assets directory, so reports can be built concurrently.
+    Args:
+        client_name (str): Name of the client.
+        client_image_path (str): Path to the client's logo.
+        zone_tag (str): Unique identifier for the Cloudflare zone.
+        leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+        periods (int): Number of days before the end date to include in the range.
+        max_workers (int): Worker processes for the render plan.
+        layout (str): Layout name, defaults to layout_utils.DEFAULT_LAYOUT.
+    Returns:
+        bytes: The PDF document.
+    """
+    # fpdf is only imported by the processes that assemble reports
+    from pdf_utils import create_pdf_report
+
+    snapshot = _fetch(zone_tag, leq_date, periods)
+    charts = render_report_charts(snapshot, max_workers)
+    return create_pdf_report(
+        client_name,
+        client_image_path,
+        charts,
+        layout=layout,
+        since=snapshot.since,
+        until=snapshot.until,
+    )
+
+
+def find_report(
+    client_name: str,
+    client_image_path: str,
+    zone_tag: str,
+    leq_date: str,
+    periods: int,
+    store: ArtifactStore = None,
+    layout: str = None,
+) -> tuple:
+    """
+    Report of a client if the artifact store already holds it. Its key is computed
+    from the local metric store only: nothing is fetched from the API or rendered.
+    Args:
+        client_name (str): Name of the client.
+        client_image_path (str): Path to the client's logo.
+        zone_tag (str): Unique identifier for the Cloudflare zone.
+        leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+        periods (int): Number of days before the end date to include in the range.
+        store (ArtifactStore): Artifact store, defaults to get_artifact_store().
+        layout (str): Layout name, defaults to layout_utils.DEFAULT_LAYOUT.
+    Returns:
+        tuple: Artifact key and path to the PDF, None when it must be built. The
+        key is None too when the metric store is missing days of the window.
+    Raises:
+        ValueError: If the window is invalid or the zone has no data in it.
+    """
+    store = store or get_artifact_store()
+    snapshot = get_zone_snapshot(zone_tag, leq_date, periods, store_only=True)
+    if snapshot is None:
+        return None, None
+    if not snapshot.days:
+        raise ValueError(f"No data available for zone {zone_tag}.")
+    key = report_key(client_name, client_image_path, snapshot, layout)
+    return key, store.get(key, "pdf")
+
+
+def get_report(
+    client_name: str,
+    client_image_path: str,
+    zone_tag: str,
+    leq_date: str,
+    periods: int,
+    max_workers: int = None,
+    store: ArtifactStore = None,
+    layout: str = None,
+) -> tuple:
+    """
+    Report of a client from the artifact store, built only when its key is missing,
+    that is when the metric data, the client or the layout changed.
+    Args:
+        client_name (str): Name of the client.
+        client_image_path (str): Path to the client's logo.
+        zone_tag (str): Unique identifier for the Cloudflare zone.
+        leq_date (str): End date of the range (inclusive) in ISO 8601 format (YYYY-MM-DD).
+        periods (int): Number of days before the end date to include in the range.
+        max_workers (int): Worker processes for the render plan.
+        store (ArtifactStore): Artifact store, defaults to get_artifact_store().
+        layout (str): Layout name, defaults to layout_utils.DEFAULT_LAYOUT.
+    Returns:
+        tuple: Artifact key (usable as ETag) and path to the PDF.
+    """
+    from pdf_utils import create_pdf_report
+
+    store = store or get_artifact_store()
+    snapshot = _fetch(zone_tag, leq_date, periods)
+    key = report_key(client_name, client_image_path, snapshot, layout)
+    path = store.get(key, "pdf")
+    if path is None:
+        charts = render_report_charts(snapshot, max_workers, store)
+        path = store.put(
+            key,
+            create_pdf_report(
+                client_name,
+                client_image_path,
+                charts,
+                layout=layout,
+                since=snapshot.since,
+                until=snapshot.until,
+            ),
+            "pdf",
+        )
+    return key, path
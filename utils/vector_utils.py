@@ -0,0 +1,298 @@
+"""
+V1 vector charts and tables drawn straight into the PDF page, no figure and no bitmap
+"""
+
+__version__ = "1.1.0"
+from dataclasses import dataclass, field
+
+import numpy as np
+from frame_utils import MetricFrame
+from image_utils import COUNTRY_HEADERS, ChartJob, country_rows, format_total
+from path import Path
+
+# Same look as graph_line and graph_bar, without their matplotlib figure
+CHART_FONT = "Arial"
+TITLE_SIZE = 8  # pt, shrunk when the title does not fit the slot
+LABEL_SIZE = 7  # pt
+LINE_COLOR = "#4693ff"
+# There is no alpha in the PDF engine, the 0.2 alpha fill of graph_line is
+# blended over the white page beforehand
+AREA_ALPHA = 0.2
+LINE_WIDTH = 0.35  # mm
+TOP_MARGIN = 0.05  # share of the plot height left above the highest value
+BAR_FILL_COLOR = "#0051c3"
+BAR_BOX_COLOR = "#dadad9"
+BAR_HEIGHT = 0.5  # share of the row height
+TEXT_PADDING = 1.5  # mm
+TABLE_SIZE = 8  # pt, shrunk when the columns do not fit the slot
+TABLE_ROW_HEIGHT = 1.6  # times the font size
+TABLE_HEADER_COLOR = "#d3d3d3"
+TABLE_LINE_WIDTH = 0.1  # mm
+
+
+def _rgb(color: str, alpha: float = 1.0) -> tuple:
+    # Components in 0..1, blended over white
+    channels = (int(color[i : i + 2], 16) / 255 for i in (1, 3, 5))
+    return tuple(1 - alpha * (1 - channel) for channel in channels)
+
+
+def _fill(color: str, alpha: float = 1.0) -> str:
+    return "%.3f %.3f %.3f rg" % _rgb(color, alpha)
+
+
+def _stroke(color: str) -> str:
+    return "%.3f %.3f %.3f RG" % _rgb(color)
+
+
+def _point(pdf, x: float, y: float) -> str:
+    return "%.2f %.2f" % (x * pdf.k, (pdf.h - y) * pdf.k)
+
+
+def _rect(pdf, x: float, y: float, w: float, h: float, op: str = "f") -> str:
+    return "%s %.2f %.2f re %s" % (_point(pdf, x, y), w * pdf.k, -h * pdf.k, op)
+
+
+def _paint(pdf, ops: list) -> None:
+    # q/Q keeps the colours and line width of the chart out of the FPDF state
+    pdf._out("q\n" + "\n".join(ops) + "\nQ")
+
+
+def _fit_font(pdf, text: str, width: float, size: float, style: str = "") -> None:
+    pdf.set_font(CHART_FONT, style=style, size=size)
+    text_width = pdf.get_string_width(text)
+    if text_width > width > 0:
+        pdf.set_font(CHART_FONT, style=style, size=size * width / text_width)
+
+
+def _title(pdf, text: str, x: float, y: float, w: float) -> float:
+    # Bold title in the top left corner of the slot, returns the height it takes
+    _fit_font(pdf, text, w, TITLE_SIZE, "B")
+    pdf.text(x, y + pdf.font_size, text)
+    return pdf.font_size * 1.5
+
+
+def draw_line(
+    pdf,
+    box: tuple,
+    data,
+    title: str,
+    data_type: str = "numeric",
+    metric: str = None,
+    fill: bool = True,
+) -> None:
+    """
+    Draw a sparkline, with its area filled, as PDF paths: the vector version of graph_line.
+    Args:
+        pdf (FPDF): Document, with its current page open.
+        box (tuple): (x, y, w, h) of the slot in mm from the top left of the page.
+        data (MetricFrame | dict): A frame, or a dictionary where keys are dates and values are numeric.
+        title (str): Title, the total of the values is appended to it.
+        data_type (str): The type of data ("numeric" or "bytes"). Defaults to "numeric".
+        metric (str): Column of the frame to plot, defaults to its first one.
+        fill (bool): Fill the area under the line.
+    """
+    x, y, w, h = box
+    frame = data if isinstance(data, MetricFrame) else MetricFrame.from_series(data)
+    values = frame.column(metric or frame.metrics[0]).astype(float)
+    days = frame.dates.astype(np.int64).astype(float)
+    top = y + _title(pdf, f"{title}: {format_total(values.sum(), data_type)}", x, y, w)
+    height = y + h - top
+    if len(values) == 1:
+        values, days = np.repeat(values, 2), np.array([0.0, 1.0])
+    low = min(0.0, values.min())
+    high = max(values.max(), low + 1.0)
+    bottom = top + height
+    xs = x + (days - days[0]) / ((days[-1] - days[0]) or 1.0) * w
+    ys = bottom - (values - low) / (high - low) * height * (1 - TOP_MARGIN)
+    base = bottom - (0.0 - low) / (high - low) * height * (1 - TOP_MARGIN)
+    line = [_point(pdf, px, py) for px, py in zip(xs, ys)]
+    ops = []
+    if fill:
+        ops.append(_fill(LINE_COLOR, AREA_ALPHA))
+        ops.append(f"{_point(pdf, xs[0], base)} m")
+        ops.extend(f"{point} l" for point in line)
+        ops.append(f"{_point(pdf, xs[-1], base)} l h f")
+    ops.append(_stroke(LINE_COLOR))
+    ops.append("%.2f w 1 j 1 J" % (LINE_WIDTH * pdf.k))
+    ops.append(f"{line[0]} m")
+    ops.extend(f"{point} l" for point in line[1:])
+    ops.append("S")
+    _paint(pdf, ops)
+
+
+def draw_bar(pdf, box: tuple, data: dict, title: str) -> None:
+    """
+    Draw horizontal bars, the largest on top, as PDF rectangles: the vector version of graph_bar.
+    Args:
+        pdf (FPDF): Document, with its current page open.
+        box (tuple): (x, y, w, h) of the slot in mm from the top left of the page.
+        data (dict): Labels as keys and numeric values as values.
+        title (str): Title of the chart.
+    """
+    x, y, w, h = box
+    rows = sorted(data.items(), key=lambda item: item[1], reverse=True)
+    top = y + _title(pdf, title, x, y, w)
+    row_height = (y + h - top) / len(rows)
+    labels = [str(label) for label, _ in rows]
+    numbers = [f"{value:,}" for _, value in rows]
+    pdf.set_font(CHART_FONT, size=min(LABEL_SIZE, row_height * 0.6 * pdf.k))
+    label_width = max(map(pdf.get_string_width, labels)) + TEXT_PADDING
+    value_width = max(map(pdf.get_string_width, numbers)) + TEXT_PADDING
+    bar_width = max(w - label_width - value_width, w * 0.3)
+    max_value = max(value for _, value in rows) or 1
+    bar_x = x + label_width
+    ops = [_fill(BAR_BOX_COLOR)]
+    for i in range(len(rows)):
+        row_y = top + (i + (1 - BAR_HEIGHT) / 2) * row_height
+        ops.append(_rect(pdf, bar_x, row_y, bar_width, row_height * BAR_HEIGHT))
+    ops.append(_fill(BAR_FILL_COLOR))
+    for i, (_, value) in enumerate(rows):
+        row_y = top + (i + (1 - BAR_HEIGHT) / 2) * row_height
+        width = bar_width * max(value, 0) / max_value
+        ops.append(_rect(pdf, bar_x, row_y, width, row_height * BAR_HEIGHT))
+    _paint(pdf, ops)
+    for i, (label, number) in enumerate(zip(labels, numbers)):
+        baseline = top + (i + 0.5) * row_height + pdf.font_size * 0.35
+        pdf.text(x, baseline, label)
+        pdf.text(bar_x + bar_width + TEXT_PADDING, baseline, number)
+
+
+def _table_widths(pdf, headers: tuple, rows: list) -> list:
+    # Widest cell of every column
+    widths = [pdf.get_string_width(str(header)) for header in headers]
+    for row in rows:
+        for i, cell in enumerate(row):
+            widths[i] = max(widths[i], pdf.get_string_width(str(cell)))
+    return [width + 2 * TEXT_PADDING for width in widths]
+
+
+def _table_row(pdf, cells, x: float, y: float, widths: list, height: float) -> None:
+    baseline = y + height / 2 + pdf.font_size * 0.35
+    for cell, width in zip(cells, widths):
+        cell = str(cell)
+        pdf.text(x + (width - pdf.get_string_width(cell)) / 2, baseline, cell)
+        x += width
+
+
+def draw_table(
+    pdf, box: tuple, headers: tuple, rows: list, title: str = None, size: float = None
+):
+    """
+    Draw a table with a header row as PDF text and rectangles: the native version
+    of create_table. Columns are as wide as their widest cell and stretched to the
+    slot, the font shrinks when they do not fit. The rows that do not fit in the
+    slot are returned, render_plan draws them on the following pages under the
+    same header.
+    Args:
+        pdf (FPDF): Document, with its current page open.
+        box (tuple): (x, y, w, h) of the slot in mm from the top left of the page.
+        headers (tuple): Column titles.
+        rows (list): Tuples of cells, one per column.
+        title (str): Title of the table, only on its first slot.
+        size (float): Font size in pt, defaults to TABLE_SIZE shrunk to fit the slot.
+    Returns:
+        VectorChart | None: The rest of the table, None when every row fits.
+    """
+    x, y, w, h = box
+    if title:
+        y += _title(pdf, title, x, y, w)
+    pdf.set_font(CHART_FONT, size=size or TABLE_SIZE)
+    widths = _table_widths(pdf, headers, rows)
+    if size is None and sum(widths) > w:
+        pdf.set_font(CHART_FONT, size=TABLE_SIZE * w / sum(widths))
+        widths = _table_widths(pdf, headers, rows)
+    widths = [width * w / sum(widths) for width in widths]
+    row_height = pdf.font_size * TABLE_ROW_HEIGHT
+    # Rows that fit under the header
+    fit = max(int((box[1] + h - y) / row_height) - 1, 0)
+    shown = rows[:fit]
+    if rows and not shown:
+        # Not even one row fits, the whole table goes to the next page
+        return VectorChart("table_rows", (headers, rows), None, {"size": size})
+    ops = [_fill(TABLE_HEADER_COLOR), _rect(pdf, x, y, w, row_height)]
+    ops.append("0 0 0 RG %.2f w" % (TABLE_LINE_WIDTH * pdf.k))
+    for i in range(len(shown) + 1):
+        cell_x = x
+        for width in widths:
+            ops.append(_rect(pdf, cell_x, y + i * row_height, width, row_height, "S"))
+            cell_x += width
+    _paint(pdf, ops)
+    _table_row(pdf, headers, x, y, widths, row_height)
+    for i, row in enumerate(shown, start=1):
+        _table_row(pdf, row, x, y + i * row_height, widths, row_height)
+    if len(rows) > fit:
+        return VectorChart(
+            "table_rows", (headers, rows[fit:]), None, {"size": pdf.font_size_pt}
+        )
+    return None
+
+
+def draw_country_table(
+    pdf, box: tuple, requests_data: dict, bandwidth_data: dict, title: str = None
+):
+    """
+    Draw the Country, Requests and Bandwidth table, see draw_table.
+    Args:
+        pdf (FPDF): Document, with its current page open.
+        box (tuple): (x, y, w, h) of the slot in mm from the top left of the page.
+        requests_data (dict): Countries as keys and requests as values.
+        bandwidth_data (dict): Countries as keys and bandwidth in bytes as values.
+        title (str): Ignored, the country table has no title, as with create_table.
+    Returns:
+        VectorChart | None: The rest of the table, None when every row fits.
+    """
+    return draw_table(
+        pdf, box, COUNTRY_HEADERS, country_rows(requests_data, bandwidth_data)
+    )
+
+
+VECTOR_FUNCTIONS = {
+    "line": draw_line,
+    "bar": draw_bar,
+    "table": draw_country_table,
+    # Any table: args are (headers, rows)
+    "table_rows": draw_table,
+}
+
+
+@dataclass
+class VectorChart:
+    """
+    A chart drawn by the PDF engine in its slot instead of embedded as a PNG.
+    kind is a VECTOR_FUNCTIONS key, args and options are the ones of its ChartJob.
+    """
+
+    kind: str
+    args: tuple
+    title: str
+    options: dict = field(default_factory=dict)
+
+    def draw(self, pdf, x: float, y: float, w: float, h: float):
+        """
+        Draw the chart on the current page of a document.
+        Args:
+            pdf (FPDF): The document.
+            x, y, w, h: Slot in mm from the top left of the page.
+        Returns:
+            VectorChart | None: What did not fit in the slot (the last rows of a
+            table), to be drawn on a new page.
+        """
+        return VECTOR_FUNCTIONS[self.kind](
+            pdf, (x, y, w, h), *self.args, title=self.title, **self.options
+        )
+
+
+def vector_chart(job: ChartJob) -> VectorChart:
+    """
+    Vector version of a chart job, its title is the last part of the output path
+    as with the PNG charts.
+    Args:
+        job (ChartJob): Chart to draw, its kind must be in VECTOR_FUNCTIONS.
+    Returns:
+        VectorChart: The chart, drawn when the PDF is assembled.
+    Raises:
+        ValueError: If the kind has no vector version.
+    """
+    if job.kind not in VECTOR_FUNCTIONS:
+        raise ValueError(f"No vector version of chart kind: '{job.kind}'.")
+    return VectorChart(job.kind, job.args, Path(job.output_path).stem, job.options)